@@ -0,0 +1,19 @@
+-- PCI DSS Compliance Automation - Incremental Knowledge Base Ingestion
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql
+
+-- Link every ingested chunk back to the file it came from
+ALTER TABLE knowledge_simple ADD COLUMN IF NOT EXISTS source_file VARCHAR(500);
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_source_file ON knowledge_simple(source_file);
+
+-- Ingestion manifest: one row per source file under knowledge_base/
+CREATE TABLE IF NOT EXISTS knowledge_sources (
+    source_file VARCHAR(500) PRIMARY KEY,  -- path relative to knowledge_base/, e.g. 'policies/secure-coding-guidelines.md'
+    doc_type VARCHAR(100),
+    content_hash CHAR(64) NOT NULL,  -- sha256 of the file bytes
+    size_bytes BIGINT NOT NULL,
+    mtime_ns BIGINT NOT NULL,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    ingested_at TIMESTAMP DEFAULT NOW()
+);
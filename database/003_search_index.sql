@@ -0,0 +1,49 @@
+-- PCI DSS Compliance Automation - Index-Backed Knowledge Search
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql
+
+-- array_to_string() is only STABLE; keywords are plain text so this wrapper is safe to mark IMMUTABLE
+CREATE OR REPLACE FUNCTION keywords_to_text(keywords TEXT[])
+RETURNS TEXT AS $$
+    SELECT coalesce(array_to_string(keywords, ' '), '')
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Weighted document vector, computed once on write instead of per candidate on every search
+-- A = title, B = keywords, C = content
+ALTER TABLE knowledge_simple ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', keywords_to_text(keywords)), 'B') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_search_vector ON knowledge_simple USING GIN(search_vector);
+
+-- Serves title ILIKE '%...%' (pg_trgm is enabled in 001_schema.sql)
+CREATE INDEX IF NOT EXISTS idx_knowledge_title_trgm ON knowledge_simple USING GIN(title gin_trgm_ops);
+
+-- Superseded by idx_knowledge_search_vector; nothing queries to_tsvector('english', content) any more
+DROP INDEX IF EXISTS idx_knowledge_content;
+
+-- Single entry point for knowledge search (n8n ChatBot, test_poc.py, demo_quick_test.py)
+-- Each branch of the OR has its own GIN index, so the planner combines them with a BitmapOr
+-- and ranks only the matching rows from the stored vector.
+CREATE OR REPLACE FUNCTION search_knowledge(search_query TEXT, match_count INTEGER DEFAULT 5)
+RETURNS TABLE (
+    id UUID,
+    title VARCHAR,
+    content TEXT,
+    doc_type VARCHAR,
+    source_type VARCHAR,
+    relevance REAL
+) AS $$
+    SELECT k.id, k.title, k.content, k.doc_type, k.source_type,
+           ts_rank(k.search_vector, plainto_tsquery('english', search_query)) AS relevance
+    FROM knowledge_simple k
+    WHERE btrim(search_query) <> ''
+      AND (k.search_vector @@ plainto_tsquery('english', search_query)
+           OR k.keywords && string_to_array(lower(search_query), ' ')
+           OR k.title ILIKE '%' || search_query || '%')
+    ORDER BY relevance DESC, k.created_at DESC
+    LIMIT match_count
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
@@ -0,0 +1,41 @@
+-- PCI DSS Compliance Automation - Knowledge Base Generation Counter
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql
+
+-- Counter advanced by every statement that changes knowledge_simple
+-- (ingestion, n8n evidence inserts, keyword rebuilds). Search result caches
+-- compare it with the generation their entries were computed at.
+--
+-- A sequence rather than a single-row table: nextval() never blocks, so
+-- concurrent writers do not queue on one row lock until they commit. It is
+-- not transactional either, so a reader can see the new value while the
+-- change is still uncommitted; writers that keep a transaction open across
+-- several statements (scripts/ingest_knowledge_base.py, dedup.py scan,
+-- render_evidence.py) advance it once more after COMMIT.
+CREATE SEQUENCE IF NOT EXISTS knowledge_generation_seq;
+
+-- Earlier versions of this file created knowledge_generation as a table
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('knowledge_generation') AND relkind = 'r') THEN
+        DROP TABLE knowledge_generation;
+    END IF;
+END;
+$$;
+
+-- Readers keep using SELECT generation FROM knowledge_generation
+CREATE OR REPLACE VIEW knowledge_generation AS
+    SELECT last_value AS generation FROM knowledge_generation_seq;
+
+CREATE OR REPLACE FUNCTION bump_knowledge_generation()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM nextval('knowledge_generation_seq');
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS knowledge_simple_generation ON knowledge_simple;
+CREATE TRIGGER knowledge_simple_generation
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON knowledge_simple
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_knowledge_generation();
@@ -0,0 +1,99 @@
+-- PCI DSS Compliance Automation - pgvector Embeddings and Hybrid Retrieval
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql, 002_incremental_ingest.sql, 003_search_index.sql, pgvector >= 0.5 (HNSW)
+-- Optional: skip this file on hosts without the vector extension (keyword search keeps working)
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- One embedding per ingested chunk (text-embedding-3-small, 1536 dimensions)
+CREATE TABLE IF NOT EXISTS knowledge_embeddings (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    knowledge_id UUID REFERENCES knowledge_simple(id) ON DELETE CASCADE,  -- chunk row in knowledge_simple
+    text TEXT,
+    embedding vector(1536) NOT NULL,
+    metadata JSONB,
+    doc_type VARCHAR(100),
+    source_file VARCHAR(500),
+    chunk_index INTEGER,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Tables created from the old analysis doc lack the ingestion columns and the id default
+ALTER TABLE knowledge_embeddings ALTER COLUMN id SET DEFAULT uuid_generate_v4();
+ALTER TABLE knowledge_embeddings ADD COLUMN IF NOT EXISTS knowledge_id UUID REFERENCES knowledge_simple(id) ON DELETE CASCADE;
+ALTER TABLE knowledge_embeddings ADD COLUMN IF NOT EXISTS doc_type VARCHAR(100);
+ALTER TABLE knowledge_embeddings ADD COLUMN IF NOT EXISTS source_file VARCHAR(500);
+ALTER TABLE knowledge_embeddings ADD COLUMN IF NOT EXISTS chunk_index INTEGER;
+ALTER TABLE knowledge_embeddings ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT NOW();
+
+-- HNSW graph for cosine kNN: m = 16 links per node, ef_construction = 64 (pgvector defaults,
+-- good recall for 1536-d vectors up to a few million rows; raise ef_search per query instead)
+CREATE INDEX IF NOT EXISTS idx_embeddings_hnsw ON knowledge_embeddings
+    USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+CREATE INDEX IF NOT EXISTS idx_embeddings_knowledge ON knowledge_embeddings(knowledge_id);
+CREATE INDEX IF NOT EXISTS idx_embeddings_source_file ON knowledge_embeddings(source_file);
+
+-- Hybrid retrieval: HNSW kNN + search_knowledge() FTS/keyword/title, fused by reciprocal rank
+-- score = 1 / (rrf_k + vector_rank) + 1 / (rrf_k + text_rank); a NULL embedding gives text-only results
+CREATE OR REPLACE FUNCTION hybrid_search_knowledge(
+    search_query TEXT,
+    query_embedding vector(1536),
+    match_count INTEGER DEFAULT 5,
+    ef_search INTEGER DEFAULT 40,
+    candidate_count INTEGER DEFAULT 50,
+    rrf_k INTEGER DEFAULT 60
+)
+RETURNS TABLE (
+    id UUID,
+    title VARCHAR,
+    content TEXT,
+    doc_type VARCHAR,
+    source_type VARCHAR,
+    relevance REAL,
+    vector_rank INTEGER,
+    text_rank INTEGER,
+    similarity REAL
+) AS $$
+#variable_conflict use_column
+BEGIN
+    -- ef_search must cover the candidates we ask the index for (pgvector caps it at 1000);
+    -- applies to this transaction only
+    PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(ef_search, candidate_count), 1000)::text, true);
+
+    RETURN QUERY
+    WITH semantic AS (
+        SELECT nn.knowledge_id,
+               (row_number() OVER (ORDER BY nn.distance))::INTEGER AS rank,
+               (1 - nn.distance)::REAL AS similarity
+        FROM (
+            SELECT e.knowledge_id, e.embedding <=> query_embedding AS distance
+            FROM knowledge_embeddings e
+            WHERE query_embedding IS NOT NULL
+            ORDER BY e.embedding <=> query_embedding
+            LIMIT candidate_count
+        ) nn
+        WHERE nn.knowledge_id IS NOT NULL
+    ),
+    lexical AS (
+        SELECT s.id AS knowledge_id,
+               (row_number() OVER (ORDER BY s.relevance DESC, s.id))::INTEGER AS rank
+        FROM search_knowledge(search_query, candidate_count) s
+    ),
+    fused AS (
+        SELECT COALESCE(sem.knowledge_id, lex.knowledge_id) AS knowledge_id,
+               (COALESCE(1.0 / (rrf_k + sem.rank), 0) + COALESCE(1.0 / (rrf_k + lex.rank), 0))::REAL AS score,
+               sem.rank AS vector_rank,
+               lex.rank AS text_rank,
+               sem.similarity
+        FROM semantic sem
+        FULL OUTER JOIN lexical lex ON lex.knowledge_id = sem.knowledge_id
+    )
+    SELECT k.id, k.title, k.content, k.doc_type, k.source_type,
+           f.score, f.vector_rank, f.text_rank, f.similarity
+    FROM fused f
+    JOIN knowledge_simple k ON k.id = f.knowledge_id
+    ORDER BY f.score DESC, k.created_at DESC
+    LIMIT match_count;
+END;
+$$ LANGUAGE plpgsql;
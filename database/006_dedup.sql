@@ -0,0 +1,51 @@
+-- PCI DSS Compliance Automation - Near-Duplicate Chunk Detection
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql, 003_search_index.sql
+
+-- MinHash LSH band hashes of the chunk's word shingles (written by scripts/dedup.py and the ingest)
+ALTER TABLE knowledge_simple ADD COLUMN IF NOT EXISTS lsh_bands BIGINT[];
+
+-- Set when a chunk was kept but linked to an earlier near-identical chunk (DEDUP_MODE=link).
+-- Before deleting an original the ingest promotes one duplicate to canonical (with the original's
+-- embedding) and re-links the others to it; SET NULL only covers deletes made outside the ingest
+ALTER TABLE knowledge_simple ADD COLUMN IF NOT EXISTS duplicate_of UUID
+    REFERENCES knowledge_simple(id) ON DELETE SET NULL;
+
+-- Candidate lookup: only canonical chunks are compared against
+CREATE INDEX IF NOT EXISTS idx_knowledge_lsh_bands ON knowledge_simple
+    USING GIN(lsh_bands) WHERE duplicate_of IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_knowledge_duplicate_of ON knowledge_simple(duplicate_of)
+    WHERE duplicate_of IS NOT NULL;
+
+-- DEDUP_MODE=skip: which file dropped a chunk as a copy of which stored chunk, so deleting that
+-- chunk sends the file back to the ingest instead of losing its text
+CREATE TABLE IF NOT EXISTS knowledge_skipped_duplicates (
+    source_file VARCHAR(500) NOT NULL,
+    duplicate_of UUID NOT NULL REFERENCES knowledge_simple(id) ON DELETE CASCADE,
+    PRIMARY KEY (source_file, duplicate_of)
+);
+
+CREATE INDEX IF NOT EXISTS idx_skipped_duplicates_of ON knowledge_skipped_duplicates(duplicate_of);
+
+-- Same as 003_search_index.sql, minus linked duplicates so they do not crowd the top-k
+CREATE OR REPLACE FUNCTION search_knowledge(search_query TEXT, match_count INTEGER DEFAULT 5)
+RETURNS TABLE (
+    id UUID,
+    title VARCHAR,
+    content TEXT,
+    doc_type VARCHAR,
+    source_type VARCHAR,
+    relevance REAL
+) AS $$
+    SELECT k.id, k.title, k.content, k.doc_type, k.source_type,
+           ts_rank(k.search_vector, plainto_tsquery('english', search_query)) AS relevance
+    FROM knowledge_simple k
+    WHERE btrim(search_query) <> ''
+      AND k.duplicate_of IS NULL
+      AND (k.search_vector @@ plainto_tsquery('english', search_query)
+           OR k.keywords && string_to_array(lower(search_query), ' ')
+           OR k.title ILIKE '%' || search_query || '%')
+    ORDER BY relevance DESC, k.created_at DESC
+    LIMIT match_count
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
@@ -0,0 +1,268 @@
+-- PCI DSS Compliance Automation - Incrementally Maintained Compliance Summary
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql (PostgreSQL 11+)
+
+-- Finding counts per creation day and PCI requirement. Statement-level
+-- triggers on findings and evidence_packages apply each change as a delta,
+-- so status questions read at most 30 buckets per requirement instead of
+-- scanning findings JOIN evidence_packages on every chat message.
+-- Counts are by status name (resolved_count = status 'resolved'); the
+-- compliance_summary view keeps its original meaning of "resolved" (= verified).
+--
+-- Compared with the 001_schema.sql view, compliance_summary keeps its
+-- columns and NULL requirement group, but two results differ:
+--   * the window is whole days (today plus the 29 before it) instead of
+--     NOW() - INTERVAL '30 days', so it can include up to one extra day;
+--   * counts are per finding; the old LEFT JOIN counted a finding once per
+--     evidence package, inflating total/severity counts of findings with
+--     several packages.
+CREATE TABLE IF NOT EXISTS compliance_daily (
+    day DATE NOT NULL,  -- findings.created_at::date
+    pci_requirement VARCHAR(50) NOT NULL,  -- 'Unknown' when the finding has none (NULL again in compliance_status)
+    total_findings INTEGER NOT NULL DEFAULT 0,
+    critical_count INTEGER NOT NULL DEFAULT 0,
+    high_count INTEGER NOT NULL DEFAULT 0,
+    medium_count INTEGER NOT NULL DEFAULT 0,
+    low_count INTEGER NOT NULL DEFAULT 0,
+    open_count INTEGER NOT NULL DEFAULT 0,
+    in_progress_count INTEGER NOT NULL DEFAULT 0,
+    resolved_count INTEGER NOT NULL DEFAULT 0,
+    verified_count INTEGER NOT NULL DEFAULT 0,
+    approved_evidence_count INTEGER NOT NULL DEFAULT 0,  -- approved evidence_packages of these findings
+    updated_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (day, pci_requirement)
+);
+
+-- Adds (new_rows) or subtracts (old_rows) the contribution of the changed findings
+CREATE OR REPLACE FUNCTION compliance_daily_apply_findings()
+RETURNS TRIGGER AS $$
+DECLARE
+    source TEXT;
+BEGIN
+    FOREACH source IN ARRAY CASE TG_OP WHEN 'INSERT' THEN ARRAY['new_rows']
+                                       WHEN 'DELETE' THEN ARRAY['old_rows']
+                                       ELSE ARRAY['old_rows', 'new_rows'] END
+    LOOP
+        EXECUTE format($sql$
+            INSERT INTO compliance_daily AS d (
+                day, pci_requirement, total_findings, critical_count, high_count, medium_count, low_count,
+                open_count, in_progress_count, resolved_count, verified_count, approved_evidence_count
+            )
+            SELECT f.created_at::date, COALESCE(f.pci_requirement, 'Unknown'),
+                   %1$s * COUNT(*),
+                   %1$s * COUNT(*) FILTER (WHERE f.severity = 'critical'),
+                   %1$s * COUNT(*) FILTER (WHERE f.severity = 'high'),
+                   %1$s * COUNT(*) FILTER (WHERE f.severity = 'medium'),
+                   %1$s * COUNT(*) FILTER (WHERE f.severity = 'low'),
+                   %1$s * COUNT(*) FILTER (WHERE f.status = 'open'),
+                   %1$s * COUNT(*) FILTER (WHERE f.status = 'in_progress'),
+                   %1$s * COUNT(*) FILTER (WHERE f.status = 'resolved'),
+                   %1$s * COUNT(*) FILTER (WHERE f.status = 'verified'),
+                   %1$s * %3$s
+            FROM %2$I f
+            WHERE f.created_at IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (day, pci_requirement) DO UPDATE SET
+                total_findings = d.total_findings + EXCLUDED.total_findings,
+                critical_count = d.critical_count + EXCLUDED.critical_count,
+                high_count = d.high_count + EXCLUDED.high_count,
+                medium_count = d.medium_count + EXCLUDED.medium_count,
+                low_count = d.low_count + EXCLUDED.low_count,
+                open_count = d.open_count + EXCLUDED.open_count,
+                in_progress_count = d.in_progress_count + EXCLUDED.in_progress_count,
+                resolved_count = d.resolved_count + EXCLUDED.resolved_count,
+                verified_count = d.verified_count + EXCLUDED.verified_count,
+                approved_evidence_count = d.approved_evidence_count + EXCLUDED.approved_evidence_count,
+                updated_at = NOW()
+        $sql$, CASE source WHEN 'new_rows' THEN 1 ELSE -1 END, source,
+           -- An update moves the finding's approved evidence to its new bucket. A new finding
+           -- has none yet; deletes are handled before the cascade by compliance_daily_forget_evidence()
+           CASE TG_OP WHEN 'UPDATE' THEN
+               $expr$COALESCE(SUM((SELECT COUNT(*) FROM evidence_packages ep
+                                   WHERE ep.finding_id = f.finding_id
+                                     AND ep.verification_status = 'approved')), 0)$expr$
+           ELSE '0' END);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION compliance_daily_apply_evidence()
+RETURNS TRIGGER AS $$
+DECLARE
+    source TEXT;
+BEGIN
+    FOREACH source IN ARRAY CASE TG_OP WHEN 'INSERT' THEN ARRAY['new_rows']
+                                       WHEN 'DELETE' THEN ARRAY['old_rows']
+                                       ELSE ARRAY['old_rows', 'new_rows'] END
+    LOOP
+        -- Evidence deleted by the findings cascade no longer joins (already subtracted)
+        EXECUTE format($sql$
+            INSERT INTO compliance_daily AS d (day, pci_requirement, approved_evidence_count)
+            SELECT f.created_at::date, COALESCE(f.pci_requirement, 'Unknown'), %1$s * COUNT(*)
+            FROM %2$I ep
+            JOIN findings f ON f.finding_id = ep.finding_id
+            WHERE ep.verification_status = 'approved' AND f.created_at IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (day, pci_requirement) DO UPDATE SET
+                approved_evidence_count = d.approved_evidence_count + EXCLUDED.approved_evidence_count,
+                updated_at = NOW()
+        $sql$, CASE source WHEN 'new_rows' THEN 1 ELSE -1 END, source);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Runs while the finding's evidence still exists (the ON DELETE CASCADE comes after)
+CREATE OR REPLACE FUNCTION compliance_daily_forget_evidence()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE compliance_daily d
+    SET approved_evidence_count = d.approved_evidence_count - (
+            SELECT COUNT(*) FROM evidence_packages ep
+            WHERE ep.finding_id = OLD.finding_id AND ep.verification_status = 'approved'),
+        updated_at = NOW()
+    WHERE d.day = OLD.created_at::date
+      AND d.pci_requirement = COALESCE(OLD.pci_requirement, 'Unknown');
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+-- Recompute every bucket from scratch (backfill, or after bulk changes made with triggers disabled)
+CREATE OR REPLACE FUNCTION rebuild_compliance_daily()
+RETURNS INTEGER AS $$
+DECLARE
+    buckets INTEGER;
+BEGIN
+    LOCK TABLE findings, evidence_packages IN SHARE MODE;
+    DELETE FROM compliance_daily;
+    INSERT INTO compliance_daily (
+        day, pci_requirement, total_findings, critical_count, high_count, medium_count, low_count,
+        open_count, in_progress_count, resolved_count, verified_count, approved_evidence_count
+    )
+    SELECT f.created_at::date, COALESCE(f.pci_requirement, 'Unknown'),
+           COUNT(*),
+           COUNT(*) FILTER (WHERE f.severity = 'critical'),
+           COUNT(*) FILTER (WHERE f.severity = 'high'),
+           COUNT(*) FILTER (WHERE f.severity = 'medium'),
+           COUNT(*) FILTER (WHERE f.severity = 'low'),
+           COUNT(*) FILTER (WHERE f.status = 'open'),
+           COUNT(*) FILTER (WHERE f.status = 'in_progress'),
+           COUNT(*) FILTER (WHERE f.status = 'resolved'),
+           COUNT(*) FILTER (WHERE f.status = 'verified'),
+           COALESCE(SUM(ep.approved), 0)
+    FROM findings f
+    LEFT JOIN (
+        SELECT finding_id, COUNT(*) AS approved
+        FROM evidence_packages
+        WHERE verification_status = 'approved'
+        GROUP BY finding_id
+    ) ep ON ep.finding_id = f.finding_id
+    WHERE f.created_at IS NOT NULL
+    GROUP BY 1, 2;
+    GET DIAGNOSTICS buckets = ROW_COUNT;
+    RETURN buckets;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION compliance_daily_reset()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM compliance_daily;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Transition tables cannot be shared between events, hence one trigger per event
+DROP TRIGGER IF EXISTS compliance_daily_findings_insert ON findings;
+CREATE TRIGGER compliance_daily_findings_insert
+    AFTER INSERT ON findings REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION compliance_daily_apply_findings();
+
+DROP TRIGGER IF EXISTS compliance_daily_findings_update ON findings;
+CREATE TRIGGER compliance_daily_findings_update
+    AFTER UPDATE ON findings REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION compliance_daily_apply_findings();
+
+DROP TRIGGER IF EXISTS compliance_daily_findings_delete ON findings;
+CREATE TRIGGER compliance_daily_findings_delete
+    AFTER DELETE ON findings REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION compliance_daily_apply_findings();
+
+DROP TRIGGER IF EXISTS compliance_daily_findings_forget_evidence ON findings;
+CREATE TRIGGER compliance_daily_findings_forget_evidence
+    BEFORE DELETE ON findings
+    FOR EACH ROW EXECUTE FUNCTION compliance_daily_forget_evidence();
+
+DROP TRIGGER IF EXISTS compliance_daily_findings_truncate ON findings;
+CREATE TRIGGER compliance_daily_findings_truncate
+    AFTER TRUNCATE ON findings
+    FOR EACH STATEMENT EXECUTE FUNCTION compliance_daily_reset();
+
+DROP TRIGGER IF EXISTS compliance_daily_evidence_insert ON evidence_packages;
+CREATE TRIGGER compliance_daily_evidence_insert
+    AFTER INSERT ON evidence_packages REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION compliance_daily_apply_evidence();
+
+DROP TRIGGER IF EXISTS compliance_daily_evidence_update ON evidence_packages;
+CREATE TRIGGER compliance_daily_evidence_update
+    AFTER UPDATE ON evidence_packages REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION compliance_daily_apply_evidence();
+
+DROP TRIGGER IF EXISTS compliance_daily_evidence_delete ON evidence_packages;
+CREATE TRIGGER compliance_daily_evidence_delete
+    AFTER DELETE ON evidence_packages REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION compliance_daily_apply_evidence();
+
+SELECT rebuild_compliance_daily();
+
+-- Per-requirement totals over the last `window_days` daily buckets (today included):
+-- a primary-key range read of window_days x requirements rows, independent of history size.
+-- Findings without a requirement are reported under NULL, like the original view
+CREATE OR REPLACE FUNCTION compliance_status(window_days INTEGER DEFAULT 30)
+RETURNS TABLE (
+    pci_requirement VARCHAR,
+    total_findings BIGINT,
+    critical_count BIGINT,
+    high_count BIGINT,
+    medium_count BIGINT,
+    low_count BIGINT,
+    open_count BIGINT,
+    in_progress_count BIGINT,
+    resolved_count BIGINT,
+    verified_count BIGINT,
+    approved_evidence_count BIGINT
+) AS $$
+    SELECT NULLIF(d.pci_requirement, 'Unknown')::VARCHAR,
+           SUM(d.total_findings)::BIGINT,
+           SUM(d.critical_count)::BIGINT,
+           SUM(d.high_count)::BIGINT,
+           SUM(d.medium_count)::BIGINT,
+           SUM(d.low_count)::BIGINT,
+           SUM(d.open_count)::BIGINT,
+           SUM(d.in_progress_count)::BIGINT,
+           SUM(d.resolved_count)::BIGINT,
+           SUM(d.verified_count)::BIGINT,
+           SUM(d.approved_evidence_count)::BIGINT
+    FROM compliance_daily d
+    WHERE d.day > CURRENT_DATE - window_days
+    GROUP BY d.pci_requirement
+    HAVING SUM(d.total_findings) > 0
+    ORDER BY 2 DESC
+$$ LANGUAGE sql STABLE PARALLEL SAFE;
+
+-- Same columns as the 001_schema.sql view, now read from the daily buckets
+DROP VIEW IF EXISTS compliance_summary;
+CREATE VIEW compliance_summary AS
+SELECT
+    s.pci_requirement,
+    s.total_findings,
+    s.critical_count,
+    s.high_count,
+    s.medium_count,
+    s.low_count,
+    s.verified_count AS resolved_count,
+    ROUND(s.verified_count::NUMERIC / s.total_findings::NUMERIC * 100, 2) AS resolution_rate,
+    s.approved_evidence_count
+FROM compliance_status(30) s
+ORDER BY s.total_findings DESC;
@@ -0,0 +1,100 @@
+-- PCI DSS Compliance Automation - Monthly Partitions for Append-Only Logs
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql (PostgreSQL 11+)
+--
+-- chatbot_queries and workflow_logs become RANGE partitioned on created_at,
+-- one partition per calendar month named <table>_pYYYYMM. Queries bounded on
+-- created_at only touch the partitions of that range, and expired months are
+-- removed by dropping a partition (scripts/maintain_partitions.py) instead of
+-- DELETE + VACUUM. Existing rows are copied over; run this in a quiet period.
+--
+-- Rows outside every monthly range (a missed maintenance run, a skewed
+-- clock) land in the <table>_default partition instead of failing the
+-- INSERT. ensure_monthly_partitions() moves the rows of a month out of it
+-- before creating that month, since PostgreSQL refuses to add a partition
+-- whose range already has rows in the DEFAULT partition.
+
+BEGIN;
+
+-- Create the missing monthly partitions from `first_month` through `months_ahead` months after the current one,
+-- moving rows that already sit in the DEFAULT partition into the new month
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(parent TEXT, first_month DATE, months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    bucket DATE := date_trunc('month', first_month)::date;
+    last_bucket DATE := (date_trunc('month', NOW()) + make_interval(months => months_ahead))::date;
+    part_name TEXT;
+    created INTEGER := 0;
+    default_name TEXT := parent || '_default';
+    has_default BOOLEAN := to_regclass(default_name) IS NOT NULL;
+    spilled BOOLEAN;
+BEGIN
+    WHILE bucket <= last_bucket LOOP
+        part_name := format('%s_p%s', parent, to_char(bucket, 'YYYYMM'));
+        IF to_regclass(part_name) IS NULL THEN
+            spilled := FALSE;
+            IF has_default THEN
+                -- Block inserts into the DEFAULT partition until the month exists, then park its rows
+                EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', default_name);
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE created_at >= %L AND created_at < %L)',
+                               default_name, bucket, (bucket + INTERVAL '1 month')::date) INTO spilled;
+                IF spilled THEN
+                    EXECUTE format('CREATE TEMP TABLE partition_spill (LIKE %I) ON COMMIT DROP', parent);
+                    EXECUTE format('WITH moved AS (DELETE FROM %I WHERE created_at >= %L AND created_at < %L '
+                                   'RETURNING *) INSERT INTO partition_spill SELECT * FROM moved',
+                                   default_name, bucket, (bucket + INTERVAL '1 month')::date);
+                END IF;
+            END IF;
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           part_name, parent, bucket, (bucket + INTERVAL '1 month')::date);
+            IF spilled THEN
+                EXECUTE format('INSERT INTO %I SELECT * FROM partition_spill', parent);
+                DROP TABLE partition_spill;
+            END IF;
+            created := created + 1;
+        END IF;
+        bucket := (bucket + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+-- Swap a plain table for a partitioned copy with the same columns, defaults and CHECKs
+CREATE OR REPLACE FUNCTION partition_by_month(parent TEXT, months_ahead INTEGER DEFAULT 3)
+RETURNS VOID AS $$
+DECLARE
+    legacy TEXT := parent || '_unpartitioned';
+    first_month DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(parent)) THEN
+        -- Tables partitioned by an earlier version of this file had no DEFAULT partition
+        EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', parent || '_default', parent);
+        RETURN;
+    END IF;
+    EXECUTE format('ALTER TABLE %I RENAME TO %I', parent, legacy);
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                   'PARTITION BY RANGE (created_at)', parent, legacy);
+    EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at SET NOT NULL', parent);
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', parent || '_default', parent);
+
+    EXECUTE format('UPDATE %I SET created_at = NOW() WHERE created_at IS NULL', legacy);
+    EXECUTE format('SELECT COALESCE(MIN(created_at), NOW())::date FROM %I', legacy) INTO first_month;
+    PERFORM ensure_monthly_partitions(parent, first_month, months_ahead);
+    EXECUTE format('INSERT INTO %I SELECT * FROM %I', parent, legacy);
+    EXECUTE format('DROP TABLE %I', legacy);
+
+    -- The primary key of a partitioned table has to include the partition key
+    EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, created_at)', parent);
+END;
+$$ language 'plpgsql';
+
+SELECT partition_by_month('chatbot_queries');
+SELECT partition_by_month('workflow_logs');
+
+-- Partitioned indexes (created on every current and future partition)
+CREATE INDEX IF NOT EXISTS idx_chatbot_created ON chatbot_queries(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_workflow_name ON workflow_logs(workflow_name);
+CREATE INDEX IF NOT EXISTS idx_workflow_status ON workflow_logs(status);
+CREATE INDEX IF NOT EXISTS idx_workflow_created ON workflow_logs(created_at DESC);
+
+COMMIT;
@@ -0,0 +1,86 @@
+-- PCI DSS Compliance Automation - Index-Backed Findings Search
+-- Version: Hackathon MVP
+-- Requires: 001_schema.sql
+--
+-- Replaces the leading-wildcard ILIKE filter of the ChatBot "Search Evidence"
+-- node, which no index can serve, with search_findings(query, n). Every branch
+-- of its WHERE clause has an index, so the planner combines them with a
+-- BitmapOr instead of scanning the whole findings table per chat message.
+
+-- Weighted document vector, computed once on write
+-- A = title, B = description, C = fix_suggestion
+ALTER TABLE findings ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(fix_suggestion, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_findings_search_vector ON findings USING GIN(search_vector);
+
+-- Fuzzy title matching (typos, partial words) through word_similarity / <% (pg_trgm is enabled in 001_schema.sql).
+-- Descriptions are covered by search_vector; a trigram index on them would be several times the table size.
+CREATE INDEX IF NOT EXISTS idx_findings_title_trgm ON findings USING GIN(title gin_trgm_ops);
+
+-- Exact lookups for "CWE-89" / "6.5.1" in the question
+CREATE INDEX IF NOT EXISTS idx_findings_cwe ON findings(cwe_id);
+CREATE INDEX IF NOT EXISTS idx_findings_pci_requirement ON findings(pci_requirement);
+
+-- Sort key of the ChatBot evidence ordering (critical first)
+CREATE OR REPLACE FUNCTION severity_rank(severity TEXT)
+RETURNS INTEGER AS $$
+    SELECT CASE severity
+        WHEN 'critical' THEN 1
+        WHEN 'high' THEN 2
+        WHEN 'medium' THEN 3
+        ELSE 4
+    END
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- Single entry point for evidence search (n8n ChatBot "Search Evidence")
+-- Matches on full text, fuzzy title, or a CWE id / PCI requirement number mentioned in the query;
+-- results are ordered by severity, then relevance, then recency.
+CREATE OR REPLACE FUNCTION search_findings(search_query TEXT, match_count INTEGER DEFAULT 5)
+RETURNS TABLE (
+    finding_id VARCHAR,
+    title VARCHAR,
+    severity VARCHAR,
+    description TEXT,
+    fix_suggestion TEXT,
+    pci_requirement VARCHAR,
+    cwe_id VARCHAR,
+    status VARCHAR,
+    relevance REAL
+) AS $$
+#variable_conflict use_column
+DECLARE
+    query_ts tsquery;
+    cwe_ids TEXT[];
+    requirements TEXT[];
+BEGIN
+    IF btrim(coalesce(search_query, '')) = '' THEN
+        RETURN;
+    END IF;
+    -- Computed up front so the planner sees plain parameters it can push into the index scans
+    query_ts := plainto_tsquery('english', search_query);
+    cwe_ids := ARRAY(SELECT DISTINCT 'CWE-' || m[1]
+                     FROM regexp_matches(search_query, 'cwe[-_ ]?([0-9]+)', 'gi') AS m);
+    requirements := ARRAY(SELECT DISTINCT m[1]
+                          FROM regexp_matches(search_query, '\m([0-9]{1,2}(\.[0-9]+)+)\M', 'g') AS m);
+
+    RETURN QUERY
+    SELECT f.finding_id, f.title, f.severity, f.description, f.fix_suggestion,
+           f.pci_requirement, f.cwe_id, f.status,
+           (ts_rank(f.search_vector, query_ts)
+            + word_similarity(search_query, coalesce(f.title, ''))
+            + CASE WHEN f.cwe_id = ANY(cwe_ids) OR f.pci_requirement = ANY(requirements)
+                   THEN 1 ELSE 0 END)::REAL AS relevance
+    FROM findings f
+    WHERE f.search_vector @@ query_ts
+       OR search_query <% f.title
+       OR f.cwe_id = ANY(cwe_ids)
+       OR f.pci_requirement = ANY(requirements)
+    ORDER BY severity_rank(f.severity), relevance DESC, f.created_at DESC
+    LIMIT match_count;
+END;
+$$ LANGUAGE plpgsql STABLE PARALLEL SAFE;
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Ingestion Throughput Benchmark
+Ingests generated Markdown/PDF documents of controlled sizes and reports per-stage wall/CPU/RSS/throughput
+
+Usage:
+    BENCH_DATABASE_URL=postgresql://localhost/pci_bench DB_SSLMODE=disable \\
+        python3 scripts/bench_ingest.py --md-kb 16,256,2048 --pdf-pages 10,100 --output ingest-bench.json
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Sequence
+
+import ingest_knowledge_base as ingest
+from bench_retrieval import BENCH_DATABASE_URL, BENCH_DIR, FILLER, TOPICS, check_local_target, git_commit
+from bulk_load import LoadStats
+from db import close_pool, configure_pool, connection
+from ingest_manifest import delete_source_chunks
+from keyword_engine import KeywordEngine
+from stage_profiler import enable_profiling, log_workflow_run
+
+WORKFLOW_NAME = 'Ingestion Benchmark'
+SOURCE_PREFIX = 'bench/'  # source_file of benchmark chunks, removed after the run
+PDF_LINES_PER_PAGE = 60
+WORDS_PER_LINE = 12
+
+
+def paragraph(rng: random.Random, words: int) -> str:
+    """PCI/secure-coding flavoured filler text"""
+    vocabulary = rng.choice(TOPICS)[3]
+    return ' '.join(rng.choice(vocabulary) if rng.random() < 0.35 else rng.choice(FILLER) for _ in range(words))
+
+
+def write_markdown(path: Path, size_kb: int, rng: random.Random) -> int:
+    """Markdown document of roughly `size_kb` KB with headings every few paragraphs"""
+    target = size_kb * 1024
+    written = 0
+    section = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < target:
+            if section % 4 == 0:
+                heading = f"## {rng.choice(TOPICS)[2]} {section // 4 + 1}\n\n"
+                f.write(heading)
+                written += len(heading)
+            text = paragraph(rng, rng.randint(60, 160)).capitalize() + '.\n\n'
+            f.write(text)
+            written += len(text)
+            section += 1
+    return path.stat().st_size
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path: Path, pages: int, rng: random.Random) -> int:
+    """Minimal text-only PDF (Helvetica, one content stream per page) that PyPDF2 can extract"""
+    bodies = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    page_ids = []
+    next_id = 4
+    for _ in range(pages):
+        lines = [paragraph(rng, WORDS_PER_LINE) for _ in range(PDF_LINES_PER_PAGE)]
+        stream = ("BT /F1 9 Tf 12 TL 40 760 Td " +
+                  ' '.join(f"({_pdf_escape(line)}) '" for line in lines) + " ET").encode('latin-1')
+        bodies[next_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                           f"/Resources << /Font << /F1 3 0 R >> >> /Contents {next_id + 1} 0 R >>").encode()
+        bodies[next_id + 1] = b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        page_ids.append(next_id)
+        next_id += 2
+    bodies[2] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for object_id in range(1, next_id):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % object_id + bodies[object_id] + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % next_id
+    output += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_id, xref)
+    path.write_bytes(bytes(output))
+    return len(output)
+
+
+def generate_documents(directory: Path, md_kb: Sequence[int], pdf_pages: Sequence[int], copies: int,
+                       seed: int) -> List[dict]:
+    """Write the benchmark documents, returns one descriptor per file"""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    documents = []
+    for copy in range(copies):
+        for size_kb in md_kb:
+            path = directory / f"bench-md-{size_kb}kb-{copy + 1}.md"
+            documents.append({'path': str(path), 'format': 'md', 'size': f"{size_kb}kb",
+                              'bytes': write_markdown(path, size_kb, rng)})
+        for pages in pdf_pages:
+            path = directory / f"bench-pdf-{pages}p-{copy + 1}.pdf"
+            documents.append({'path': str(path), 'format': 'pdf', 'size': f"{pages}p",
+                              'bytes': write_pdf(path, pages, rng)})
+    return documents
+
+
+def _sizes(value: str) -> List[int]:
+    return [int(part) for part in value.split(',') if part.strip()]
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Ingestion throughput benchmark with a per-stage profile")
+    parser.add_argument('--dsn', default=BENCH_DATABASE_URL, help="default BENCH_DATABASE_URL or DATABASE_URL")
+    parser.add_argument('--yes', action='store_true', help="allow running against a non-local database")
+    parser.add_argument('--md-kb', type=_sizes, default=[16, 256, 2048], help="Markdown sizes in KB")
+    parser.add_argument('--pdf-pages', type=_sizes, default=[10, 100], help="PDF sizes in pages")
+    parser.add_argument('--copies', type=int, default=2, help="documents per size")
+    parser.add_argument('--workers', type=int, default=1, help="as ingest_knowledge_base.py --workers")
+    parser.add_argument('--batch-size', type=int, default=ingest.BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--docs-dir', default=str(BENCH_DIR / 'ingest_docs'))
+    parser.add_argument('--keep', action='store_true', help="keep the generated files and ingested chunks")
+    parser.add_argument('--output', help="write the report as JSON")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        print("❌ Set BENCH_DATABASE_URL (or DATABASE_URL) or pass --dsn")
+        return False
+    check_local_target(args.dsn, args.yes)
+
+    directory = Path(args.docs_dir)
+    started = time.perf_counter()
+    documents = generate_documents(directory, args.md_kb, args.pdf_pages, args.copies, args.seed)
+    total_mb = sum(document['bytes'] for document in documents) / (1024 * 1024)
+    print(f"🏭 Generated {len(documents)} documents ({total_mb:.1f} MB) in {time.perf_counter() - started:.1f}s")
+
+    configure_pool(args.dsn, maxconn=2, application_name='pci-compliance-bench')
+    # In-memory TF-IDF statistics so the real KEYWORD_STATS_PATH is left alone
+    ingest.use_keyword_engine(KeywordEngine(path=None) if ingest.KEYWORD_ENGINE == 'tfidf' else None)
+    embedder = ingest.setup_embeddings()
+    with connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass('knowledge_embeddings') IS NOT NULL")
+        vector_table = cur.fetchone()[0]
+        cur.close()
+    if embedder and not vector_table:
+        print("⚠️  knowledge_embeddings not found, benchmarking keyword mode")
+        embedder = None
+
+    profiler = enable_profiling()
+    load_stats = LoadStats()
+    results = []
+    try:
+        jobs = [(SOURCE_PREFIX + Path(document['path']).name, document['path'], 'policy', None)
+                for document in documents]
+        if args.workers > 1:
+            outcomes = ingest.ingest_parallel(jobs, args.workers, embedder, None, args.batch_size, load_stats)
+            for document, ok in zip(documents, outcomes):
+                results.append({**document, 'ok': ok})
+        else:
+            for document, (source_key, path, doc_type, _) in zip(documents, jobs):
+                chunks_before = profiler.totals['chunks']
+                document_started = time.perf_counter()
+                ok = ingest.ingest_document(path, doc_type, embedder, source_key=source_key,
+                                            batch_size=args.batch_size, stats=load_stats)
+                seconds = time.perf_counter() - document_started
+                chunks = profiler.totals['chunks'] - chunks_before
+                results.append({**document, 'ok': ok, 'chunks': chunks, 'wall_s': round(seconds, 4),
+                                'chunks_per_s': round(chunks / seconds, 1) if seconds > 0 else 0.0,
+                                'mb_per_s': round(document['bytes'] / seconds / (1024 * 1024), 3)
+                                if seconds > 0 else 0.0})
+
+        profile = profiler.report()
+        report = {
+            'benchmark': 'ingest',
+            'created_at': datetime.now().isoformat(),
+            'git_commit': git_commit(),
+            'config': {'md_kb': args.md_kb, 'pdf_pages': args.pdf_pages, 'copies': args.copies,
+                       'workers': args.workers, 'batch_size': args.batch_size,
+                       'keyword_engine': ingest.KEYWORD_ENGINE,
+                       'embedding_model': embedder.model if embedder else None},
+            'documents': results,
+            'rows_written': load_stats.rows,
+            'profile': profile
+        }
+
+        print(f"\n⏱️  {profile['docs']} docs, {profile['chunks']} chunks in {profile['wall_s']:.2f}s "
+              f"({profile['docs_per_s']} docs/s, {profile['chunks_per_s']} chunks/s, {profile['mb_per_s']} MB/s)")
+        for line in profiler.summary_lines():
+            print(f"   {line}")
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2))
+            print(f"📄 Report saved to {args.output}")
+
+        failed = sum(1 for result in results if not result['ok'])
+        with connection() as conn:
+            cur = conn.cursor()
+            if not args.keep:
+                for source_key, _, _, _ in jobs:
+                    delete_source_chunks(cur, source_key, vector_table)
+            log_workflow_run(cur, WORKFLOW_NAME, 'success' if not failed else 'partial',
+                             int(profile['wall_s'] * 1000), report)
+            conn.commit()
+            cur.close()
+        return not failed
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+        close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,645 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Retrieval Benchmark Suite
+Synthetic PCI/secure-coding corpus generator plus a latency/QPS/recall runner for every search path
+
+Usage:
+    BENCH_DATABASE_URL=postgresql://localhost/pci_bench DB_SSLMODE=disable \\
+        python3 scripts/bench_retrieval.py generate --size 100k --vectors
+    python3 scripts/bench_retrieval.py run --concurrency 8 --output bench-100k.json
+    python3 scripts/bench_retrieval.py compare bench-before.json bench-after.json
+    python3 scripts/bench_retrieval.py clean
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+from bulk_load import batched, copy_rows
+from db import DATABASE_URL, ConnectionPool
+from embeddings import HashingEmbeddingProvider, format_vector
+
+BENCH_DATABASE_URL = os.getenv('BENCH_DATABASE_URL') or DATABASE_URL
+BENCH_DIR = Path(os.getenv('BENCH_DIR', Path(__file__).parent.parent / '.cache' / 'bench'))
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+LOAD_BATCH_SIZE = 5000  # rows per COPY + commit
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1', '')
+
+# Generated rows are tagged so `clean` (and a re-run of `generate`) only touches them
+SYNTHETIC_SOURCE = 'synthetic'
+SYNTHETIC_FINDING_PREFIX = 'BENCH-'
+
+# (PCI requirement, CWE, topic title, topic vocabulary)
+TOPICS = [
+    ('6.5.1', 'CWE-89', 'SQL Injection Prevention',
+     ['sql', 'injection', 'parameterized', 'queries', 'prepared', 'statements', 'input', 'validation', 'orm',
+      'escaping', 'database', 'bind', 'variables']),
+    ('6.5.7', 'CWE-79', 'Cross Site Scripting',
+     ['xss', 'script', 'output', 'encoding', 'sanitization', 'content', 'security', 'policy', 'dom', 'escaping',
+      'html', 'browser', 'untrusted']),
+    ('3.4', 'CWE-311', 'Cardholder Data Encryption',
+     ['encryption', 'pan', 'cardholder', 'aes', 'storage', 'rest', 'truncation', 'masking', 'hashing',
+      'tokenization', 'unreadable', 'primary', 'account']),
+    ('3.6', 'CWE-320', 'Cryptographic Key Management',
+     ['key', 'rotation', 'hsm', 'custodian', 'split', 'knowledge', 'dual', 'control', 'kms', 'lifecycle',
+      'cryptoperiod', 'retirement', 'generation']),
+    ('4.1', 'CWE-319', 'Transmission Over Public Networks',
+     ['tls', 'cipher', 'certificate', 'https', 'hsts', 'transmission', 'public', 'network', 'pinning',
+      'protocol', 'handshake', 'trusted', 'keys']),
+    ('6.2', 'CWE-1104', 'Security Patch Management',
+     ['patch', 'vulnerability', 'update', 'vendor', 'critical', 'release', 'dependency', 'library', 'version',
+      'upgrade', 'advisory', 'monthly', 'inventory']),
+    ('6.5.8', 'CWE-639', 'Insecure Direct Object References',
+     ['authorization', 'object', 'reference', 'idor', 'ownership', 'check', 'identifier', 'tenant', 'resource',
+      'enumeration', 'access', 'horizontal', 'privilege']),
+    ('6.5.10', 'CWE-287', 'Broken Authentication and Session Management',
+     ['session', 'authentication', 'cookie', 'token', 'timeout', 'fixation', 'logout', 'credential',
+      'secure', 'httponly', 'samesite', 'expiry', 'renewal']),
+    ('7.1', 'CWE-284', 'Need To Know Access Control',
+     ['role', 'least', 'privilege', 'access', 'need', 'know', 'permission', 'approval', 'deny', 'default',
+      'assignment', 'job', 'function']),
+    ('8.2', 'CWE-521', 'Password Policy',
+     ['password', 'complexity', 'length', 'history', 'reuse', 'lockout', 'reset', 'bcrypt', 'salt', 'strength',
+      'expiration', 'temporary', 'change']),
+    ('8.3', 'CWE-308', 'Multi Factor Authentication',
+     ['mfa', 'factor', 'otp', 'totp', 'remote', 'administrative', 'console', 'authenticator', 'push',
+      'hardware', 'token', 'bypass', 'enrollment']),
+    ('10.2', 'CWE-778', 'Audit Logging',
+     ['audit', 'log', 'trail', 'event', 'timestamp', 'siem', 'retention', 'integrity', 'review', 'alert',
+      'tamper', 'centralized', 'monitoring']),
+    ('11.3', 'CWE-693', 'Penetration Testing',
+     ['penetration', 'test', 'segmentation', 'external', 'internal', 'methodology', 'exploitable', 'retest',
+      'scope', 'annual', 'tester', 'findings', 'remediation']),
+    ('2.2', 'CWE-16', 'Secure Configuration Standards',
+     ['configuration', 'hardening', 'baseline', 'default', 'service', 'cis', 'benchmark', 'unnecessary',
+      'disable', 'system', 'component', 'drift', 'standard']),
+    ('12.10', 'CWE-778', 'Incident Response Plan',
+     ['incident', 'response', 'breach', 'containment', 'forensics', 'notification', 'escalation', 'playbook',
+      'tabletop', 'recovery', 'contact', 'brand', 'acquirer']),
+]
+TOPIC_WEIGHTS = [1.0 / (rank + 1) ** 0.6 for rank in range(len(TOPICS))]  # a few topics dominate, like real docs
+FILLER = [
+    'the', 'organization', 'must', 'ensure', 'that', 'all', 'system', 'components', 'are', 'reviewed',
+    'documented', 'process', 'requirement', 'compliance', 'assessor', 'evidence', 'annually', 'personnel',
+    'implemented', 'maintained', 'environment', 'applicable', 'including', 'procedures', 'defined', 'approved',
+    'responsible', 'periodically', 'verify', 'controls', 'in', 'place', 'for', 'with', 'and', 'of', 'to', 'by',
+    'application', 'development', 'team', 'engineering', 'service', 'provider', 'merchant', 'scope', 'data',
+]
+SECTIONS = ['Policy', 'Procedure', 'Standard', 'Guideline', 'Checklist', 'Testing Procedure', 'Guidance']
+SEVERITIES = (['critical'] * 1 + ['high'] * 3 + ['medium'] * 4 + ['low'] * 2)
+STATUSES = (['open'] * 5 + ['in_progress'] * 2 + ['resolved'] * 2 + ['verified'] * 1)
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'to', 'vi', 'ze', 'qua', 'dor', 'fen', 'gil', 'hux', 'jor', 'wex']
+
+KNOWLEDGE_COLUMNS = ('id', 'title', 'content', 'doc_type', 'keywords', 'source_type', 'source_file')
+EMBEDDING_COLUMNS = ('knowledge_id', 'text', 'embedding', 'metadata', 'doc_type', 'source_file', 'chunk_index')
+FINDING_COLUMNS = ('finding_id', 'repo_name', 'severity', 'title', 'description', 'fix_suggestion',
+                   'affected_file', 'line_number', 'cwe_id', 'pci_requirement', 'risk_score', 'status',
+                   'created_at', 'updated_at')
+EVIDENCE_COLUMNS = ('finding_id', 'evidence_document', 'compliance_metadata', 'verification_status', 'created_at')
+
+GENERIC_QUERIES = [
+    'sql injection prevention', 'cross site scripting', 'pci requirement 6', 'PCI requirement 6.5.1',
+    'secure coding practices', 'password policy', 'encryption of cardholder data', 'key rotation',
+    'audit log retention', 'multi factor authentication for remote access', 'incident response plan',
+]
+
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _sentence(rng: random.Random, vocabulary: List[str], words: int) -> str:
+    picked = [rng.choice(vocabulary) if rng.random() < 0.35 else rng.choice(FILLER) for _ in range(words)]
+    return ' '.join(picked).capitalize() + '.'
+
+
+def _marker(rng: random.Random, used: set) -> str:
+    """Made-up word that occurs only in the relevant chunks of one labeled query"""
+    while True:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(4))
+        if word not in used:
+            used.add(word)
+            return word
+
+
+class SyntheticCorpus:
+    """
+    Deterministic corpus of `size` knowledge chunks for one seed.
+
+    `labeled` queries each get `relevant` planted chunks: chunks of the
+    query's topic that also contain a made-up marker word (in the title of
+    half of them, in the content of all). Those chunk ids are the ground
+    truth for recall@k; every other chunk is a same-vocabulary distractor.
+    """
+
+    def __init__(self, size: int, seed: int = 42, labeled: int = 50, relevant: int = 5):
+        self.size = size
+        self.seed = seed
+        rng = random.Random(seed)
+        used: set = set()
+        self.labels: List[Dict] = []
+        slots = rng.sample(range(size), min(size, labeled * relevant))
+        self._planted: Dict[int, tuple] = {}
+        for label_index in range(min(labeled, len(slots) // max(1, relevant))):
+            topic = rng.randrange(len(TOPICS))
+            marker = _marker(rng, used)
+            positions = slots[label_index * relevant:(label_index + 1) * relevant]
+            for rank, position in enumerate(positions):
+                self._planted[position] = (label_index, topic, marker, rank < (relevant + 1) // 2)
+            self.labels.append({'query': f"{TOPICS[topic][2].lower()} {marker}", 'topic': TOPICS[topic][2],
+                                'positions': positions, 'relevant': []})
+
+    def chunks(self) -> Iterator[tuple]:
+        """(position, id, title, content, doc_type, keywords, topic index) in generation order"""
+        rng = random.Random(self.seed + 1)
+        for position in range(self.size):
+            planted = self._planted.get(position)
+            topic = planted[1] if planted else rng.choices(range(len(TOPICS)), TOPIC_WEIGHTS)[0]
+            requirement, _, topic_title, vocabulary = TOPICS[topic]
+            sentences = [_sentence(rng, vocabulary, rng.randint(12, 24)) for _ in range(rng.randint(5, 9))]
+            title = f"PCI DSS {requirement} {topic_title} - {rng.choice(SECTIONS)} {position % 997}"
+            if planted:
+                _, _, marker, in_title = planted
+                sentences.insert(rng.randrange(len(sentences) + 1),
+                                 f"The {marker} control covers {topic_title.lower()}.")
+                if in_title:
+                    title = f"{title} ({marker})"
+            chunk_id = _uuid(rng)
+            if planted:
+                self.labels[planted[0]]['relevant'].append(chunk_id)
+            keywords = sorted(set(rng.sample(vocabulary, 5)))
+            doc_type = 'policy' if rng.random() < 0.4 else 'compliance_doc'
+            yield position, chunk_id, title, ' '.join(sentences), doc_type, keywords, topic
+
+    def findings(self, count: int) -> Iterator[tuple]:
+        """findings rows (FINDING_COLUMNS) spread over the last 90 days"""
+        rng = random.Random(self.seed + 2)
+        now = datetime.now()
+        for index in range(count):
+            requirement, cwe, topic_title, vocabulary = rng.choice(TOPICS)
+            created = now - timedelta(minutes=rng.randrange(90 * 24 * 60))
+            yield (
+                f"{SYNTHETIC_FINDING_PREFIX}{index:07d}",
+                f"synthetic/bench-service-{index % 25}",
+                rng.choice(SEVERITIES),
+                f"{topic_title} issue in {rng.choice(vocabulary)} handler",
+                _sentence(rng, vocabulary, 30),
+                _sentence(rng, vocabulary, 20),
+                f"src/{rng.choice(vocabulary)}/{rng.choice(vocabulary)}_{index % 50}.py",
+                rng.randint(1, 2000),
+                cwe,
+                requirement,
+                rng.randint(1, 10),
+                rng.choice(STATUSES),
+                created,
+                created + timedelta(hours=rng.randrange(240))
+            )
+
+    @staticmethod
+    def evidence(finding: tuple) -> tuple:
+        """evidence_packages row (EVIDENCE_COLUMNS) for a resolved or verified finding"""
+        finding_id, repo, severity, title, _, fix, affected_file, line, cwe, requirement = finding[:10]
+        document = (f"# Evidence: {title}\n\n**Finding:** {finding_id} ({severity})\n"
+                    f"**Repository:** {repo}\n**Location:** {affected_file}:{line}\n\n"
+                    f"## Remediation\n{fix}\n\n## Mapping\nPCI DSS {requirement}, {cwe}\n")
+        metadata = {'pci_requirement': requirement, 'cwe_id': cwe, 'severity': severity, 'synthetic': True}
+        return (finding_id, document, metadata, 'approved' if finding[11] == 'verified' else 'reviewed',
+                finding[13])
+
+    def labels_document(self) -> Dict:
+        return {
+            'size': self.size,
+            'seed': self.seed,
+            'queries': [{'query': label['query'], 'topic': label['topic'], 'relevant': label['relevant']}
+                        for label in self.labels]
+        }
+
+
+def check_local_target(dsn: str, confirmed: bool):
+    """Refuse to write synthetic rows to a non-local database unless --yes was given"""
+    host = parse_dsn(dsn).get('host', '')
+    if host not in LOCAL_HOSTS and not host.startswith('/') and not confirmed:
+        raise SystemExit(f"❌ {host} is not a local database; set BENCH_DATABASE_URL or pass --yes")
+
+
+def _has_table(cur, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+    return cur.fetchone()[0]
+
+
+def clean(conn) -> Dict[str, int]:
+    """Delete every generated row (embeddings and evidence cascade)"""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM findings WHERE finding_id LIKE %s", (SYNTHETIC_FINDING_PREFIX + '%',))
+    findings = cur.rowcount
+    cur.execute("DELETE FROM knowledge_simple WHERE source_type = %s", (SYNTHETIC_SOURCE,))
+    chunks = cur.rowcount
+    conn.commit()
+    cur.close()
+    return {'knowledge_simple': chunks, 'findings': findings}
+
+
+def generate(conn, corpus: SyntheticCorpus, findings: int, vectors: bool = False,
+             batch_size: int = LOAD_BATCH_SIZE) -> Dict:
+    """Replace the synthetic rows with `corpus`, committing every `batch_size` chunks"""
+    removed = clean(conn)
+    if any(removed.values()):
+        print(f"🧹 Removed previous synthetic rows: {removed}")
+
+    cur = conn.cursor()
+    if vectors and not _has_table(cur, 'knowledge_embeddings'):
+        print("⚠️  knowledge_embeddings not found (run database/005_pgvector.sql), skipping vectors")
+        vectors = False
+    embedder = HashingEmbeddingProvider() if vectors else None
+
+    counts = {'knowledge_simple': 0, 'knowledge_embeddings': 0, 'findings': 0, 'evidence_packages': 0}
+    started = time.perf_counter()
+    for batch in batched(corpus.chunks(), batch_size):
+        counts['knowledge_simple'] += copy_rows(cur, 'knowledge_simple', KNOWLEDGE_COLUMNS, (
+            (chunk_id, title, content, doc_type, keywords, SYNTHETIC_SOURCE, f"synthetic/{TOPICS[topic][0]}.md")
+            for _, chunk_id, title, content, doc_type, keywords, topic in batch))
+        if embedder:
+            embeddings = embedder.embed([f"{chunk[2]}\n{chunk[3]}" for chunk in batch])
+            counts['knowledge_embeddings'] += copy_rows(cur, 'knowledge_embeddings', EMBEDDING_COLUMNS, (
+                (chunk_id, None, format_vector(vector),
+                 {'source': 'synthetic', 'embedding_model': embedder.model}, doc_type,
+                 f"synthetic/{TOPICS[topic][0]}.md", position)
+                for (position, chunk_id, _, _, doc_type, _, topic), vector in zip(batch, embeddings)))
+        conn.commit()
+        elapsed = time.perf_counter() - started
+        print(f"   📝 {counts['knowledge_simple']:,}/{corpus.size:,} chunks "
+              f"({counts['knowledge_simple'] / elapsed:,.0f} rows/s)")
+
+    for batch in batched(corpus.findings(findings), batch_size):
+        counts['findings'] += copy_rows(cur, 'findings', FINDING_COLUMNS, batch)
+        counts['evidence_packages'] += copy_rows(cur, 'evidence_packages', EVIDENCE_COLUMNS, (
+            corpus.evidence(row) for row in batch if row[11] in ('resolved', 'verified')))
+        conn.commit()
+
+    for table in counts:
+        cur.execute(f"ANALYZE {table}")
+    conn.commit()
+    cur.close()
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+# Search paths: (cur, query, k, embedding literal, ef_search) -> ranked knowledge_simple ids
+def _keyword(cur, query, k, embedding, ef_search):
+    """Original ad-hoc query from test_poc.py / demo_quick_test.py (before 003_search_index.sql)"""
+    cur.execute("""
+        SELECT id FROM knowledge_simple
+        WHERE (
+            to_tsvector('english', content) @@ plainto_tsquery('english', %s)
+            OR keywords && string_to_array(lower(%s), ' ')
+            OR title ILIKE %s
+        )
+        ORDER BY ts_rank(to_tsvector('english', content), plainto_tsquery('english', %s)) DESC
+        LIMIT %s
+    """, (query, query, f"%{query}%", query, k))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _fts(cur, query, k, embedding, ef_search):
+    cur.execute("SELECT id FROM search_knowledge(%s, %s)", (query, k))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _trigram(cur, query, k, embedding, ef_search):
+    cur.execute("""
+        SELECT id FROM knowledge_simple
+        WHERE title %% %s
+        ORDER BY similarity(title, %s) DESC
+        LIMIT %s
+    """, (query, query, k))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _vector(cur, query, k, embedding, ef_search):
+    cur.execute("""
+        SELECT knowledge_id FROM knowledge_embeddings
+        ORDER BY embedding <=> %s::vector
+        LIMIT %s
+    """, (embedding, k))
+    return [row[0] for row in cur.fetchall()]
+
+
+def _hybrid(cur, query, k, embedding, ef_search):
+    cur.execute("SELECT id FROM hybrid_search_knowledge(%s, %s::vector, %s, %s)", (query, embedding, k, ef_search))
+    return [row[0] for row in cur.fetchall()]
+
+
+SEARCH_PATHS: Dict[str, Callable] = {
+    'keyword': _keyword,
+    'fts': _fts,
+    'trigram': _trigram,
+    'vector': _vector,
+    'hybrid': _hybrid,
+}
+
+
+def available_paths(cur) -> List[str]:
+    """Search paths whose SQL objects exist in this database"""
+    cur.execute("""
+        SELECT to_regproc('search_knowledge') IS NOT NULL,
+               EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'),
+               to_regclass('knowledge_embeddings') IS NOT NULL,
+               to_regproc('hybrid_search_knowledge') IS NOT NULL
+    """)
+    fts, trigram, embeddings, hybrid = cur.fetchone()
+    present = {'keyword': True, 'fts': fts, 'trigram': trigram, 'vector': embeddings, 'hybrid': hybrid}
+    return [path for path in SEARCH_PATHS if present[path]]
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+
+
+def _latency_stats(samples: List[float], wall: float, errors: int) -> Dict:
+    samples = sorted(samples)
+    return {
+        'queries': len(samples),
+        'errors': errors,
+        'qps': round(len(samples) / wall, 1) if wall > 0 else 0.0,
+        'ms_p50': _percentile(samples, 0.50),
+        'ms_p95': _percentile(samples, 0.95),
+        'ms_p99': _percentile(samples, 0.99),
+        'ms_max': round(samples[-1], 3) if samples else 0.0
+    }
+
+
+class RetrievalBenchmark:
+    """
+    Replays a query mix against each search path on a dedicated pool.
+
+    Query embeddings (local hashing provider, same as `generate --vectors`)
+    are computed before timing, so vector numbers are database time only.
+    Recall@k is measured on the labeled queries of the single-threaded run.
+    """
+
+    def __init__(self, pool: ConnectionPool, queries: List[str], labels: List[Dict], k: int = 5,
+                 ef_search: int = 40):
+        self.pool = pool
+        self.queries = queries
+        self.labels = {label['query']: set(label['relevant']) for label in labels if label['relevant']}
+        self.k = k
+        self.ef_search = ef_search
+        embedder = HashingEmbeddingProvider()
+        unique = sorted(set(queries))
+        self.embeddings = dict(zip(unique, (format_vector(vector) for vector in embedder.embed(unique))))
+
+    def _session(self, conn):
+        """Per-connection setup outside the timed loop (hnsw.ef_search for the plain kNN path)"""
+        cur = conn.cursor()
+        cur.execute("SELECT set_config('hnsw.ef_search', %s, false)", (str(max(self.ef_search, self.k)),))
+        conn.commit()
+        return cur
+
+    def _timed(self, cur, path: str, query: str):
+        started = time.perf_counter()
+        try:
+            ids = SEARCH_PATHS[path](cur, query, self.k, self.embeddings[query], self.ef_search)
+        except psycopg2.Error as e:
+            cur.connection.rollback()
+            return None, str(e).strip().splitlines()[0]
+        return (time.perf_counter() - started) * 1000, ids
+
+    def single(self, path: str, repeat: int = 1, warmup: int = 10) -> Dict:
+        latencies, errors, recalls = [], 0, []
+        with self.pool.connection() as conn:
+            cur = self._session(conn)
+            for query in self.queries[:warmup]:
+                self._timed(cur, path, query)
+            started = time.perf_counter()
+            for round_index in range(repeat):
+                for query in self.queries:
+                    elapsed, result = self._timed(cur, path, query)
+                    if elapsed is None:
+                        errors += 1
+                        if not latencies and errors >= 3:
+                            print(f"   ⚠️  {path}: {result}")
+                            break
+                        continue
+                    latencies.append(elapsed)
+                    relevant = self.labels.get(query)
+                    if round_index == 0 and relevant:
+                        found = {str(row_id) for row_id in result}
+                        recalls.append(len(found & relevant) / min(self.k, len(relevant)))
+            wall = time.perf_counter() - started
+            conn.rollback()
+            cur.close()
+        stats = _latency_stats(latencies, wall, errors)
+        stats['recall_at_k'] = round(sum(recalls) / len(recalls), 4) if recalls else None
+        return stats
+
+    def concurrent(self, path: str, workers: int, repeat: int = 1) -> Dict:
+        work = iter([query for _ in range(repeat) for query in self.queries])
+        work_lock = threading.Lock()
+        latencies: List[float] = []
+        errors = [0]
+
+        def worker():
+            with self.pool.connection() as conn:
+                cur = self._session(conn)
+                while True:
+                    with work_lock:
+                        query = next(work, None)
+                    if query is None:
+                        break
+                    elapsed, _ = self._timed(cur, path, query)
+                    with work_lock:
+                        if elapsed is None:
+                            errors[0] += 1
+                        else:
+                            latencies.append(elapsed)
+                conn.rollback()
+                cur.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(worker) for _ in range(workers)]:
+                future.result()
+        stats = _latency_stats(latencies, time.perf_counter() - started, errors[0])
+        stats['workers'] = workers
+        return stats
+
+
+def query_mix(labels: List[Dict], count: int, seed: int = 7) -> List[str]:
+    """Every labeled query plus generic and topic queries up to `count`, shuffled"""
+    rng = random.Random(seed)
+    mix = [label['query'] for label in labels]
+    pool = GENERIC_QUERIES + [topic[2].lower() for topic in TOPICS] + [f"pci requirement {topic[0]}"
+                                                                        for topic in TOPICS]
+    while len(mix) < count:
+        vocabulary = rng.choice(TOPICS)[3]
+        mix.append(rng.choice(pool) if rng.random() < 0.6 else ' '.join(rng.sample(vocabulary, 2)))
+    rng.shuffle(mix)
+    return mix
+
+
+def corpus_counts(cur) -> Dict[str, int]:
+    counts = {}
+    for table in ('knowledge_simple', 'knowledge_embeddings', 'findings', 'evidence_packages'):
+        if _has_table(cur, table):
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*) FROM knowledge_simple WHERE source_type = %s", (SYNTHETIC_SOURCE,))
+    counts['synthetic_chunks'] = cur.fetchone()[0]
+    return counts
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(pool: ConnectionPool, labels: List[Dict], paths: Sequence[str], queries: int, repeat: int,
+        concurrency: int, k: int, ef_search: int) -> Dict:
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        present = available_paths(cur)
+        counts = corpus_counts(cur)
+        cur.execute("SHOW server_version")
+        server_version = cur.fetchone()[0]
+        cur.close()
+
+    mix = query_mix(labels, queries)
+    bench = RetrievalBenchmark(pool, mix, labels, k, ef_search)
+    results = {}
+    for path in paths:
+        if path not in present:
+            print(f"⏭️  {path}: required SQL objects not installed, skipped")
+            continue
+        print(f"⏱️  {path}: {len(mix)} queries x {repeat}, single then {concurrency} workers")
+        results[path] = {'single': bench.single(path, repeat)}
+        if concurrency > 1 and results[path]['single']['queries']:
+            results[path]['concurrent'] = bench.concurrent(path, concurrency, repeat)
+        single = results[path]['single']
+        print(f"   p50 {single['ms_p50']}ms / p95 {single['ms_p95']}ms / p99 {single['ms_p99']}ms, "
+              f"{single['qps']} qps, recall@{k} {single['recall_at_k']}")
+        if 'concurrent' in results[path]:
+            print(f"   concurrent: p50 {results[path]['concurrent']['ms_p50']}ms, "
+                  f"{results[path]['concurrent']['qps']} qps")
+
+    return {
+        'benchmark': 'retrieval',
+        'created_at': datetime.now().isoformat(),
+        'git_commit': git_commit(),
+        'server_version': server_version,
+        'corpus': counts,
+        'config': {'queries': len(mix), 'labeled_queries': len(labels), 'repeat': repeat,
+                   'concurrency': concurrency, 'k': k, 'ef_search': ef_search},
+        'paths': results
+    }
+
+
+def compare(base: Dict, new: Dict):
+    """Print p50/p95/p99/QPS/recall deltas between two run reports"""
+    print(f"📊 {base.get('git_commit')} → {new.get('git_commit')}")
+    for path, modes in new['paths'].items():
+        for mode, stats in modes.items():
+            before = base['paths'].get(path, {}).get(mode)
+            if not before:
+                print(f"   {path}/{mode}: new")
+                continue
+            parts = []
+            for metric in ('ms_p50', 'ms_p95', 'ms_p99', 'qps', 'recall_at_k'):
+                old_value, new_value = before.get(metric), stats.get(metric)
+                if old_value is None or new_value is None:
+                    continue
+                change = f" ({(new_value - old_value) / old_value:+.0%})" if old_value else ''
+                parts.append(f"{metric} {old_value} → {new_value}{change}")
+            print(f"   {path}/{mode}: " + ', '.join(parts))
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Synthetic corpus generator and retrieval benchmark")
+    parser.add_argument('command', choices=('generate', 'run', 'compare', 'clean'))
+    parser.add_argument('reports', nargs='*', help="compare: base.json new.json")
+    parser.add_argument('--dsn', default=BENCH_DATABASE_URL, help="default BENCH_DATABASE_URL or DATABASE_URL")
+    parser.add_argument('--yes', action='store_true', help="allow generate/clean on a non-local database")
+    parser.add_argument('--size', choices=sorted(SIZES), default='10k', help="synthetic knowledge chunks")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--labeled', type=int, default=50, help="labeled queries planted in the corpus")
+    parser.add_argument('--findings', type=int, help="findings rows (default size / 10)")
+    parser.add_argument('--vectors', action='store_true', help="also load local hashing embeddings")
+    parser.add_argument('--labels', help=f"labels file (default {BENCH_DIR / 'labels.json'})")
+    parser.add_argument('--paths', default=','.join(SEARCH_PATHS), help="comma separated search paths")
+    parser.add_argument('--queries', type=int, default=200, help="queries in the replayed mix")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--ef-search', type=int, default=40)
+    parser.add_argument('--timeout-ms', type=int, default=30000, help="statement_timeout per query")
+    parser.add_argument('--output', help="write the run report as JSON")
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        if len(args.reports) != 2:
+            parser.error("compare needs two report files")
+        base, new = (json.loads(Path(report).read_text()) for report in args.reports)
+        compare(base, new)
+        return True
+
+    if not args.dsn:
+        print("❌ Set BENCH_DATABASE_URL (or DATABASE_URL) or pass --dsn")
+        return False
+    labels_path = Path(args.labels) if args.labels else BENCH_DIR / 'labels.json'
+    pool = ConnectionPool(args.dsn, minconn=1, maxconn=args.concurrency + 1, statement_timeout_ms=args.timeout_ms,
+                          application_name='pci-compliance-bench')
+    try:
+        if args.command in ('generate', 'clean'):
+            check_local_target(args.dsn, args.yes)
+        if args.command == 'clean':
+            with pool.connection() as conn:
+                print(f"🧹 Removed synthetic rows: {clean(conn)}")
+            return True
+
+        if args.command == 'generate':
+            size = SIZES[args.size]
+            corpus = SyntheticCorpus(size, args.seed, args.labeled)
+            print(f"🏭 Generating {size:,} chunks (seed {args.seed}, {len(corpus.labels)} labeled queries)")
+            with pool.connection() as conn:
+                counts = generate(conn, corpus, args.findings if args.findings is not None else size // 10,
+                                  args.vectors)
+            labels_path.parent.mkdir(parents=True, exist_ok=True)
+            labels_path.write_text(json.dumps(corpus.labels_document(), indent=2))
+            print(f"✅ Loaded {counts} — labels in {labels_path}")
+            return True
+
+        labels = json.loads(labels_path.read_text())['queries'] if labels_path.exists() else []
+        if not labels:
+            print(f"⚠️  No labels at {labels_path} (run generate first), recall@k will be empty")
+        paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+        unknown = set(paths) - set(SEARCH_PATHS)
+        if unknown:
+            parser.error(f"unknown search paths: {', '.join(sorted(unknown))}")
+        report = run(pool, labels, paths, args.queries, args.repeat, args.concurrency, args.k, args.ef_search)
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2))
+            print(f"📄 Report saved to {args.output}")
+        return True
+    finally:
+        pool.closeall()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
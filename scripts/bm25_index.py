@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - In-Process BM25 Knowledge Index
+Memory-mapped BM25 snapshot of knowledge_simple for retrieval without a database round trip
+
+Usage:
+    python3 scripts/bm25_index.py build
+    python3 scripts/bm25_index.py refresh
+    python3 scripts/bm25_index.py search "sql injection prevention"
+    python3 scripts/bm25_index.py bench --repeat 50
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import time
+from array import array
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import psycopg2
+
+from db import close_pool, connection, get_pool
+from keyword_engine import STOP_WORDS
+
+BM25_INDEX_DIR = os.getenv(
+    'BM25_INDEX_DIR',
+    str(Path(__file__).parent.parent / '.cache' / 'bm25')
+)
+BM25_K1 = float(os.getenv('BM25_K1', '1.2'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+BM25_SEGMENT_DOCS = int(os.getenv('BM25_SEGMENT_DOCS', '100000'))  # rows per segment
+BM25_MAX_SEGMENTS = int(os.getenv('BM25_MAX_SEGMENTS', '8'))  # deltas before a full rebuild
+TITLE_WEIGHT = 2  # title terms count double, keywords once, content once
+FETCH_SIZE = 2000
+
+RESULT_COLUMNS = ('title', 'content', 'doc_type', 'source_type', 'relevance')
+SNAPSHOT_QUERY = """
+    SELECT id::text, title, content, doc_type, source_type, keywords, created_at
+    FROM knowledge_simple
+"""
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def _stem(token: str) -> str:
+    """Plural folding so 'injections' matches 'injection' (a tiny subset of the english stemmer)"""
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith(('ss', 'us', 'is')):
+        return token[:-1]
+    return token
+
+
+def analyze(text: Optional[str]) -> List[str]:
+    """Lowercase, drop stop words, fold plurals; numbers are kept ('6', '5', '1' for '6.5.1')"""
+    return [_stem(token) for token in TOKEN_RE.findall((text or '').lower())
+            if token not in STOP_WORDS and (len(token) > 1 or token.isdigit())]
+
+
+def document_terms(title: Optional[str], content: Optional[str],
+                   keywords: Optional[Sequence[str]]) -> Counter:
+    """Weighted term frequencies of one knowledge_simple row"""
+    counts = Counter(analyze(content))
+    counts.update(analyze(' '.join(keywords or ())))
+    for term in analyze(title):
+        counts[term] += TITLE_WEIGHT
+    return counts
+
+
+def _write_json(path: Path, data):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def write_segment(path: Path, rows: Iterable[tuple], vocab: Dict[str, int], terms: List[str]) -> Dict:
+    """
+    Write one immutable segment and return its summary.
+
+    Layout: postings sorted by term id (`offsets.npy` indexes `docs.npy` /
+    `tfs.npy`), per-document lengths, the content of every row as one UTF-8
+    blob (`text.bin` + `text_offsets.npy`) and the remaining columns in
+    `docs.json`. New terms are added to `vocab`/`terms`.
+    """
+    path.mkdir(parents=True)
+    term_col, doc_col, tf_col = array('i'), array('i'), array('f')
+    doc_len = array('f')
+    text_offsets = array('q', [0])
+    docs = []
+    watermark = None
+    with open(path / 'text.bin', 'wb') as text_file:
+        for local, (row_id, title, content, doc_type, source_type, keywords, created_at) in enumerate(rows):
+            counts = document_terms(title, content, keywords)
+            ids = [vocab.setdefault(term, len(vocab)) for term in counts]
+            if len(vocab) > len(terms):
+                known = len(terms)
+                terms.extend([term for term in counts if vocab[term] >= known])
+            term_col.extend(ids)
+            doc_col.extend([local] * len(ids))
+            tf_col.extend(counts.values())
+            doc_len.append(sum(counts.values()))
+            encoded = (content or '').encode('utf-8')
+            text_file.write(encoded)
+            text_offsets.append(text_offsets[-1] + len(encoded))
+            docs.append([row_id, title, doc_type, source_type])
+            if created_at is not None and (watermark is None or created_at > watermark):
+                watermark = created_at
+
+    term_ids = np.frombuffer(term_col, dtype=np.int32)
+    order = np.argsort(term_ids, kind='stable')  # keeps doc ids ascending within each term
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=offsets[1:])
+    np.save(path / 'offsets.npy', offsets)
+    np.save(path / 'docs.npy', np.frombuffer(doc_col, dtype=np.int32)[order])
+    np.save(path / 'tfs.npy', np.frombuffer(tf_col, dtype=np.float32)[order])
+    np.save(path / 'doc_len.npy', np.frombuffer(doc_len, dtype=np.float32))
+    np.save(path / 'text_offsets.npy', np.frombuffer(text_offsets, dtype=np.int64))
+    _write_json(path / 'docs.json', docs)
+    return {
+        'name': path.name,
+        'n_docs': len(docs),
+        'total_len': float(sum(doc_len)),
+        'watermark': watermark.isoformat() if watermark else None
+    }
+
+
+class Segment:
+    """Read-only view of one segment; arrays are memory-mapped and shared between processes"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offsets = np.load(path / 'offsets.npy', mmap_mode='r')
+        self.docs = np.load(path / 'docs.npy', mmap_mode='r')
+        self.tfs = np.load(path / 'tfs.npy', mmap_mode='r')
+        self.doc_len = np.load(path / 'doc_len.npy', mmap_mode='r')
+        self.text_offsets = np.load(path / 'text_offsets.npy', mmap_mode='r')
+        size = (path / 'text.bin').stat().st_size
+        self.text = np.memmap(path / 'text.bin', dtype=np.uint8, mode='r') if size else np.zeros(0, np.uint8)
+        with open(path / 'docs.json', 'r', encoding='utf-8') as f:
+            self.rows = json.load(f)
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.rows)
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        if term_id >= len(self.offsets) - 1:
+            return self.docs[:0], self.tfs[:0]
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.docs[start:end], self.tfs[start:end]
+
+    def content(self, local: int) -> str:
+        start, end = self.text_offsets[local], self.text_offsets[local + 1]
+        return bytes(self.text[start:end]).decode('utf-8')
+
+
+class BM25Index:
+    """
+    Segmented BM25 index over a knowledge_simple snapshot.
+
+    `build()` writes a new index version (one segment per
+    BM25_SEGMENT_DOCS rows) and switches the CURRENT pointer to it;
+    `refresh()` appends rows created since the last snapshot as a delta
+    segment and falls back to a rebuild when rows were updated or deleted.
+    Readers in other processes pick up a new version or segment on their
+    next search. Only one process should build/refresh at a time.
+    """
+
+    def __init__(self, path: str = BM25_INDEX_DIR, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = Path(path)
+        self.k1 = k1
+        self.b = b
+        self.meta: Dict = {}
+        self.vocab: Dict[str, int] = {}
+        self.segments: List[Segment] = []
+        self.bases = np.zeros(0, dtype=np.int64)
+        self._loaded_stamp = None
+        self.reload()
+
+    # -- loading -------------------------------------------------------------
+
+    def _version_dir(self) -> Optional[Path]:
+        current = self.path / 'CURRENT'
+        if not current.exists():
+            return None
+        return self.path / current.read_text().strip()
+
+    def _stamp(self):
+        version = self._version_dir()
+        if version is None or not (version / 'meta.json').exists():
+            return None
+        return version.name, (version / 'meta.json').stat().st_mtime_ns
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-open the index if another process built or refreshed it"""
+        stamp = self._stamp()
+        if stamp == self._loaded_stamp and not force:
+            return False
+        if stamp is None:
+            self.meta, self.vocab, self.segments = {}, {}, []
+            self.bases = np.zeros(0, dtype=np.int64)
+        else:
+            version = self.path / stamp[0]
+            with open(version / 'meta.json', 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+            with open(version / 'terms.json', 'r', encoding='utf-8') as f:
+                self.vocab = {term: i for i, term in enumerate(json.load(f))}
+            self.segments = [Segment(version / segment['name']) for segment in self.meta['segments']]
+            sizes = [segment.n_docs for segment in self.segments]
+            self.bases = np.cumsum([0] + sizes[:-1]).astype(np.int64) if sizes else np.zeros(0, dtype=np.int64)
+        self._loaded_stamp = stamp
+        return True
+
+    @property
+    def n_docs(self) -> int:
+        return self.meta.get('n_docs', 0)
+
+    @property
+    def avgdl(self) -> float:
+        return self.meta['total_len'] / self.n_docs if self.n_docs else 0.0
+
+    # -- search --------------------------------------------------------------
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """Top `limit` rows by BM25, same columns as search_knowledge()"""
+        self.reload()
+        term_ids = {self.vocab[term] for term in analyze(query) if term in self.vocab}
+        if not term_ids or not self.n_docs:
+            return []
+
+        n_docs, avgdl, k1, b = self.n_docs, self.avgdl, self.k1, self.b
+        doc_parts, score_parts = [], []
+        for term_id in term_ids:
+            postings = [(base, segment) + segment.postings(term_id)
+                        for base, segment in zip(self.bases.tolist(), self.segments)]
+            df = sum(len(docs) for _, _, docs, _ in postings)
+            if not df:
+                continue
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for base, segment, docs, tfs in postings:
+                if not len(docs):
+                    continue
+                norm = k1 * (1.0 - b + b * segment.doc_len[docs] / avgdl)
+                doc_parts.append(docs.astype(np.int64) + base)
+                score_parts.append(idf * tfs * (k1 + 1.0) / (tfs + norm))
+        if not doc_parts:
+            return []
+
+        docs = np.concatenate(doc_parts)
+        unique, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((unique[top], -scores[top]))]  # score, then oldest row first
+
+        results = []
+        for doc, score in zip(unique[top].tolist(), scores[top].tolist()):
+            seg_no = int(np.searchsorted(self.bases, doc, side='right')) - 1
+            segment, local = self.segments[seg_no], doc - int(self.bases[seg_no])
+            _, title, doc_type, source_type = segment.rows[local]
+            results.append(dict(zip(RESULT_COLUMNS, (title, segment.content(local), doc_type,
+                                                     source_type, round(score, 6)))))
+        return results
+
+    # -- build / refresh -----------------------------------------------------
+
+    @staticmethod
+    def _read_generation(cur) -> Optional[int]:
+        cur.execute("SAVEPOINT bm25_generation")
+        try:
+            cur.execute("SELECT generation FROM knowledge_generation")
+            row = cur.fetchone()
+            cur.execute("RELEASE SAVEPOINT bm25_generation")
+            return row[0] if row else None
+        except psycopg2.Error:
+            cur.execute("ROLLBACK TO SAVEPOINT bm25_generation")
+            return None
+
+    @staticmethod
+    def _stream(conn, where: str = '', params: Sequence = ()) -> Iterable[tuple]:
+        cur = conn.cursor(name='bm25_snapshot')
+        cur.itersize = FETCH_SIZE
+        cur.execute(SNAPSHOT_QUERY + where + " ORDER BY created_at, id", tuple(params))
+        try:
+            yield from cur
+        finally:
+            cur.close()
+
+    def _write_segments(self, version: Path, rows: Iterable[tuple], terms: List[str],
+                        first: int = 0) -> List[Dict]:
+        vocab = {term: i for i, term in enumerate(terms)}
+        segments = []
+        rows = iter(rows)
+        for number in itertools.count(first):
+            batch = list(itertools.islice(rows, BM25_SEGMENT_DOCS))
+            if not batch:
+                break
+            segments.append(write_segment(version / f"seg-{number:05d}", batch, vocab, terms))
+        return segments
+
+    def _commit(self, version: Path, terms: List[str], segments: List[Dict], generation: Optional[int]):
+        watermarks = [segment['watermark'] for segment in segments if segment['watermark']]
+        meta = {
+            'k1': self.k1,
+            'b': self.b,
+            'n_docs': sum(segment['n_docs'] for segment in segments),
+            'total_len': sum(segment['total_len'] for segment in segments),
+            'generation': generation,
+            'watermark': max(watermarks) if watermarks else None,
+            'segments': segments,
+            'updated_at': datetime.now().isoformat()
+        }
+        _write_json(version / 'terms.json', terms)
+        _write_json(version / 'meta.json', meta)
+
+    def build(self, conn) -> Dict:
+        """Full snapshot into a new index version"""
+        cur = conn.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        generation = self._read_generation(cur)
+        cur.close()
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        previous = self._version_dir()
+        number = int(previous.name[1:]) + 1 if previous is not None else 1
+        version = self.path / f"v{number:06d}"
+        if version.exists():
+            shutil.rmtree(version)
+        version.mkdir()
+        terms: List[str] = []
+        segments = self._write_segments(version, self._stream(conn), terms)
+        self._commit(version, terms, segments, generation)
+        conn.rollback()
+
+        tmp_current = self.path / 'CURRENT.tmp'
+        tmp_current.write_text(version.name)
+        os.replace(tmp_current, self.path / 'CURRENT')
+        if previous is not None and previous.exists():
+            # Processes that still map the old files keep reading them until they reload
+            shutil.rmtree(previous, ignore_errors=True)
+        self.reload(force=True)
+        return self.meta
+
+    def refresh(self, conn) -> str:
+        """Bring the index up to date: 'unchanged', 'delta' or 'rebuilt'"""
+        if not self.meta:
+            self.build(conn)
+            return 'rebuilt'
+
+        cur = conn.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        generation = self._read_generation(cur)
+        if generation is not None and generation == self.meta.get('generation'):
+            cur.close()
+            conn.rollback()
+            return 'unchanged'
+
+        watermark = self.meta.get('watermark')
+        cur.execute("SELECT COUNT(*) FROM knowledge_simple")
+        total = cur.fetchone()[0]
+        if watermark:
+            cur.execute("SELECT COUNT(*) FROM knowledge_simple WHERE created_at > %s", (watermark,))
+            new_rows = cur.fetchone()[0]
+        else:
+            new_rows = total
+        cur.close()
+
+        # Anything but pure appends (updates, deletes, late commits) needs a rebuild
+        if not new_rows and total == self.n_docs and generation is None:
+            conn.rollback()
+            return 'unchanged'
+        if (not new_rows or total != self.n_docs + new_rows
+                or len(self.segments) >= BM25_MAX_SEGMENTS):
+            conn.rollback()
+            self.build(conn)
+            return 'rebuilt'
+
+        version = self._version_dir()
+        terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            terms[term_id] = term
+        rows = self._stream(conn, " WHERE created_at > %s", (watermark,))
+        added = self._write_segments(version, rows, terms, first=len(self.meta['segments']))
+        self._commit(version, terms, self.meta['segments'] + added, generation)
+        conn.rollback()
+        self.reload(force=True)
+        return 'delta'
+
+    def summary(self) -> str:
+        return (f"{self.n_docs} docs, {len(self.vocab)} terms, {len(self.segments)} segments, "
+                f"generation {self.meta.get('generation')}")
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3) if samples else 0.0
+
+
+def benchmark(index: BM25Index, queries: Sequence[str], repeat: int = 20, limit: int = 5) -> Dict:
+    """Latency of BM25 vs the search_knowledge() SQL path, plus top-k title overlap"""
+    pool = get_pool()
+    bm25_ms, sql_ms, overlap = [], [], []
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        for query in queries:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                local = index.search(query, limit)
+                bm25_ms.append((time.perf_counter() - started) * 1000)
+
+                started = time.perf_counter()
+                pool.execute_prepared(cur, 'knowledge_search', (query, limit))
+                remote = cur.fetchall()
+                sql_ms.append((time.perf_counter() - started) * 1000)
+            sql_titles = {row[0] for row in remote}
+            if sql_titles:
+                overlap.append(len(sql_titles & {row['title'] for row in local}) / len(sql_titles))
+        cur.close()
+    return {
+        'queries': len(queries),
+        'repeat': repeat,
+        'bm25_ms_p50': _percentile(bm25_ms, 0.50),
+        'bm25_ms_p95': _percentile(bm25_ms, 0.95),
+        'sql_ms_p50': _percentile(sql_ms, 0.50),
+        'sql_ms_p95': _percentile(sql_ms, 0.95),
+        'top_k_overlap': round(sum(overlap) / len(overlap), 3) if overlap else None
+    }
+
+
+DEFAULT_QUERIES = [
+    'sql injection prevention', 'cross site scripting', 'pci requirement 6',
+    'PCI requirement 6.5.1', 'secure coding practices', 'secure code review'
+]
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="In-process BM25 index over knowledge_simple")
+    parser.add_argument('command', choices=('build', 'refresh', 'search', 'bench'))
+    parser.add_argument('query', nargs='*', help="search / bench queries")
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20, help="bench iterations per query")
+    parser.add_argument('--output', help="write bench results as JSON")
+    args = parser.parse_args()
+
+    index = BM25Index()
+    try:
+        if args.command in ('build', 'refresh', 'bench'):
+            started = time.perf_counter()
+            with connection() as conn:
+                outcome = 'rebuilt' if args.command == 'build' else None
+                if outcome:
+                    index.build(conn)
+                else:
+                    outcome = index.refresh(conn)
+            print(f"📚 BM25 index {outcome} in {time.perf_counter() - started:.2f}s: {index.summary()}")
+
+        if args.command == 'search':
+            for query in args.query or DEFAULT_QUERIES:
+                started = time.perf_counter()
+                results = index.search(query, args.limit)
+                elapsed = (time.perf_counter() - started) * 1000
+                print(f"\n🔍 '{query}': {len(results)} results in {elapsed:.3f}ms")
+                for result in results:
+                    print(f"   • {result['title'][:60]} ({result['doc_type']}, {result['relevance']:.3f})")
+
+        if args.command == 'bench':
+            results = benchmark(index, args.query or DEFAULT_QUERIES, args.repeat, args.limit)
+            print(f"⏱️  BM25 p50 {results['bm25_ms_p50']}ms / p95 {results['bm25_ms_p95']}ms | "
+                  f"SQL p50 {results['sql_ms_p50']}ms / p95 {results['sql_ms_p95']}ms | "
+                  f"top-{args.limit} overlap {results['top_k_overlap']}")
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump(results, f, indent=2)
+                print(f"📄 Results saved to: {args.output}")
+        return True
+    except Exception as e:
+        print(f"❌ BM25 {args.command} failed: {e}")
+        return False
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Bulk PostgreSQL Loader
+Streams rows through COPY FROM STDIN instead of one INSERT round trip per row
+"""
+
+import json
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+DEFAULT_BATCH_SIZE = 500  # rows per COPY statement
+
+
+def _escape(value: str) -> str:
+    """Escape a string for the COPY text format"""
+    return (value.replace('\x00', '')
+                 .replace('\\', '\\\\')
+                 .replace('\t', '\\t')
+                 .replace('\n', '\\n')
+                 .replace('\r', '\\r'))
+
+
+def _array_literal(values: Sequence) -> str:
+    """Format a Python list as a PostgreSQL array literal"""
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append('NULL')
+        else:
+            text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            elements.append(f'"{text}"')
+    return '{' + ','.join(elements) + '}'
+
+
+def format_value(value) -> str:
+    """Convert one Python value into a COPY text field"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (list, tuple)):
+        return _escape(_array_literal(value))
+    if isinstance(value, dict):
+        return _escape(json.dumps(value, default=str))
+    return _escape(str(value))
+
+
+def format_row(row: Sequence) -> str:
+    """Convert one row into a COPY text line"""
+    return '\t'.join(format_value(value) for value in row) + '\n'
+
+
+class _RowStream:
+    """File-like reader over formatted rows, consumed by cursor.copy_expert()"""
+
+    def __init__(self, rows: Iterable[Sequence]):
+        self._lines = (format_row(row) for row in rows)
+        self._buffer = ''
+        self.rows = 0
+
+    def read(self, size: int = -1) -> str:
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self.rows += 1
+            parts.append(line)
+            length += len(line)
+        data = ''.join(parts)
+        if size < 0 or len(data) <= size:
+            self._buffer = ''
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size: int = -1) -> str:
+        if self._buffer:
+            line, self._buffer = self._buffer, ''
+            return line
+        line = next(self._lines, '')
+        if line:
+            self.rows += 1
+        return line
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """Stream rows into `table` with a single COPY statement, returns rows written"""
+    stream = _RowStream(rows)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT text)",
+        stream
+    )
+    return stream.rows
+
+
+def batched(rows: Iterable, batch_size: int) -> Iterator[List]:
+    """Group an iterable into lists of at most `batch_size` items"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class LoadStats:
+    """Row counts and elapsed COPY time per table"""
+
+    def __init__(self):
+        self.rows: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, table: str, rows: int, seconds: float):
+        self.rows[table] = self.rows.get(table, 0) + rows
+        self.seconds[table] = self.seconds.get(table, 0.0) + seconds
+
+    @property
+    def total_rows(self) -> int:
+        return sum(self.rows.values())
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    def rows_per_sec(self, table: Optional[str] = None) -> float:
+        rows = self.rows.get(table, 0) if table else self.total_rows
+        seconds = self.seconds.get(table, 0.0) if table else self.total_seconds
+        return rows / seconds if seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        parts = [f"{table}: {rows} rows @ {self.rows_per_sec(table):,.0f} rows/s"
+                 for table, rows in self.rows.items()]
+        return ', '.join(parts) if parts else 'no rows written'
+
+
+class BulkWriter:
+    """
+    Buffers rows per table and flushes them with COPY every `batch_size` rows.
+
+    Rows from several documents can share one writer; nothing is committed,
+    the caller owns the transaction.
+    """
+
+    def __init__(self, cur, batch_size: int = DEFAULT_BATCH_SIZE, stats: Optional[LoadStats] = None):
+        self.cur = cur
+        self.batch_size = max(1, batch_size)
+        self.stats = stats or LoadStats()
+        self._columns: Dict[str, Sequence[str]] = {}
+        self._pending: Dict[str, List[Sequence]] = {}
+
+    def add(self, table: str, columns: Sequence[str], row: Sequence):
+        known = self._columns.setdefault(table, tuple(columns))
+        if known != tuple(columns):
+            raise ValueError(f"Column list for {table} changed within one writer")
+        pending = self._pending.setdefault(table, [])
+        pending.append(row)
+        if len(pending) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table: Optional[str] = None):
+        tables = [table] if table else list(self._pending)
+        for name in tables:
+            rows = self._pending.get(name)
+            if not rows:
+                continue
+            started = time.perf_counter()
+            written = copy_rows(self.cur, name, self._columns[name], rows)
+            self.stats.add(name, written, time.perf_counter() - started)
+            self._pending[name] = []
+
+    def discard(self, table: str):
+        """Drop rows buffered for `table` (e.g. after a failed optional write)"""
+        self._pending.pop(table, None)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Shared PostgreSQL Connection Pool
+One SSL handshake per pooled connection instead of one per document or demo section
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '5'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # seconds to wait for a free connection
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '60000'))
+DB_SSLMODE = os.getenv('DB_SSLMODE', 'require')  # 'disable' for a local Postgres without TLS
+DB_HEALTH_CHECK_AFTER = float(os.getenv('DB_HEALTH_CHECK_AFTER', '30'))  # idle seconds before SELECT 1
+LATENCY_SAMPLES = 1000
+
+# Hot read queries, prepared once per connection on first use
+PREPARED_STATEMENTS: Dict[str, Tuple[str, str]] = {
+    'knowledge_search': ('text, integer', """
+        SELECT title, content, doc_type, source_type, relevance
+        FROM search_knowledge($1, $2)
+    """),
+    'hybrid_search': ('text, vector, integer, integer, integer', """
+        SELECT title, content, doc_type, source_type, relevance
+        FROM hybrid_search_knowledge($1, $2, $3, $4, $5)
+    """),
+    'knowledge_by_ids': ('text[]', """
+        SELECT id, title, content, doc_type, source_type
+        FROM knowledge_simple
+        WHERE id = ANY($1::uuid[])
+    """),
+    'compliance_status': ('', """
+        SELECT pci_requirement, total_findings, critical_count, open_count
+        FROM compliance_status(30)
+    """),
+}
+
+
+class PoolTimeout(pg_pool.PoolError):
+    """No connection became free within the acquire timeout"""
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 pool with blocking acquire, health checks and metrics.
+
+    Connections are opened with sslmode=DB_SSLMODE (require by default) and a server-side
+    statement_timeout. A connection that sat idle longer than
+    DB_HEALTH_CHECK_AFTER is pinged before being handed out and replaced if
+    the ping fails. Acquire latency is sampled for stats().
+    """
+
+    def __init__(self, dsn: Optional[str] = None, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX,
+                 statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS, acquire_timeout: float = DB_POOL_TIMEOUT,
+                 application_name: str = 'pci-compliance-scripts', sslmode: str = DB_SSLMODE):
+        dsn = dsn or DATABASE_URL
+        if not dsn:
+            raise RuntimeError("DATABASE_URL environment variable not set")
+        self.maxconn = max(1, maxconn)
+        self.acquire_timeout = acquire_timeout
+        self._pool = pg_pool.ThreadedConnectionPool(
+            max(0, min(minconn, self.maxconn)), self.maxconn, dsn,
+            sslmode=sslmode,
+            application_name=application_name,
+            options=f'-c statement_timeout={statement_timeout_ms}'
+        )
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        opened = time.monotonic()
+        self._last_used: Dict[int, float] = {id(conn): opened for conn in self._pool._pool}
+        self._prepared: Dict[int, set] = {}
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.acquired = 0
+        self.health_check_failures = 0
+        self.timeouts = 0
+
+    def getconn(self):
+        """Acquire a healthy connection, waiting up to acquire_timeout for a free slot"""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection available after {self.acquire_timeout}s")
+        try:
+            conn = self._pool.getconn()
+            while not self._is_healthy(conn):
+                with self._lock:
+                    self.health_check_failures += 1
+                self._discard(conn)
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.acquired += 1
+            self._latencies.append((time.perf_counter() - started) * 1000)
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection; broken or explicitly closed ones are dropped"""
+        try:
+            if close or conn.closed:
+                self._discard(conn)
+                return
+            if conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        except psycopg2.Error:
+            self._discard(conn)
+        finally:
+            self._slots.release()
+
+    def _discard(self, conn):
+        self._last_used.pop(id(conn), None)
+        self._prepared.pop(id(conn), None)
+        try:
+            self._pool.putconn(conn, close=True)
+        except (psycopg2.Error, pg_pool.PoolError):
+            pass
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is None:
+            # Opened by this getconn() call, nothing to check yet
+            self._last_used[id(conn)] = time.monotonic()
+            return True
+        if time.monotonic() - last_used < DB_HEALTH_CHECK_AFTER:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """`with pool.connection() as conn:` - rolls back on error, always returns the connection"""
+        conn = self.getconn()
+        try:
+            yield conn
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def execute_prepared(self, cur, name: str, params: Sequence = ()):
+        """Run a statement from PREPARED_STATEMENTS, preparing it on this connection first if needed"""
+        conn = cur.connection
+        prepared = self._prepared.setdefault(id(conn), set())
+        if name not in prepared:
+            types, sql = PREPARED_STATEMENTS[name]
+            cur.execute(f"PREPARE {name}{f'({types})' if types else ''} AS {sql}")
+            prepared.add(name)
+        if params:
+            cur.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", tuple(params))
+        else:
+            cur.execute(f"EXECUTE {name}")
+
+    def stats(self) -> Dict:
+        """Acquire latency and pool counters"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        def percentile(p: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+        return {
+            'acquired': self.acquired,
+            'connections_open': len(self._pool._used) + len(self._pool._pool),
+            'max_connections': self.maxconn,
+            'acquire_ms_p50': percentile(0.50),
+            'acquire_ms_p95': percentile(0.95),
+            'acquire_ms_max': round(samples[-1], 3) if samples else 0.0,
+            'health_check_failures': self.health_check_failures,
+            'timeouts': self.timeouts
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"{stats['acquired']} acquires on {stats['connections_open']} connections, "
+                f"acquire p50 {stats['acquire_ms_p50']}ms / p95 {stats['acquire_ms_p95']}ms")
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Process-wide pool built from DATABASE_URL on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure_pool(dsn: Optional[str] = None, **options) -> ConnectionPool:
+    """Replace the process-wide pool, e.g. to point scripts at a benchmark database"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+        _pool = ConnectionPool(dsn, **options)
+        return _pool
+
+
+@contextmanager
+def connection() -> Iterator:
+    """Shortcut for get_pool().connection()"""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def close_pool():
+    """Close every pooled connection (call once at exit)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Near-Duplicate Chunk Detection
+MinHash signatures over word shingles, LSH banding for candidates, exact Jaccard to confirm
+
+Usage:
+    python3 scripts/dedup.py scan            # backfill LSH bands (e.g. evidence rows from n8n)
+    python3 scripts/dedup.py scan --link     # ... and link near-duplicates to their original
+    python3 scripts/dedup.py stats
+    python3 scripts/dedup.py verify          # exit 1 if duplicates lost their original's embedding
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from db import close_pool, connection
+from knowledge_search import bump_generation
+
+# Opt-in: 'link' or 'skip' change what ingest stores and what search_knowledge() returns
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'off').lower()  # 'off', 'link' or 'skip'
+DEDUP_ACTIONS = {'link': 'linked', 'skip': 'skipped', 'report': 'found'}
+DEDUP_THRESHOLD = float(os.getenv('DEDUP_THRESHOLD', '0.8'))  # Jaccard similarity of word shingles
+SHINGLE_WORDS = 5
+# 16 bands x 4 rows: a pair with Jaccard 0.6 shares a band with p ~ 0.89, 0.8 with p > 0.999
+LSH_BANDS = 16
+LSH_ROWS = 4
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+DEDUP_COLUMNS = ('duplicate_of', 'lsh_bands')  # knowledge_simple columns added by 006_dedup.sql
+SKIPPED_COLUMNS = ('source_file', 'duplicate_of')  # knowledge_skipped_duplicates (DEDUP_MODE=skip)
+
+_rng = np.random.RandomState(20240917)  # fixed: band hashes are stored and must stay comparable
+_SHINGLE_MULTIPLIERS = (_rng.randint(1, 1 << 62, SHINGLE_WORDS, dtype=np.int64).astype(np.uint64) << 1) | 1
+_PERM_A = (_rng.randint(1, 1 << 62, LSH_BANDS * LSH_ROWS, dtype=np.int64).astype(np.uint64) << 1) | 1
+_PERM_B = _rng.randint(0, 1 << 62, LSH_BANDS * LSH_ROWS, dtype=np.int64).astype(np.uint64)
+
+
+def shingles(text: Optional[str]) -> np.ndarray:
+    """
+    Sorted unique 64-bit hashes of the overlapping SHINGLE_WORDS-word windows of `text`.
+
+    Tokens are CRC32-hashed once and each window is combined with odd
+    multipliers in wrapping uint64 arithmetic, instead of hashing every
+    joined window string.
+    """
+    tokens = TOKEN_RE.findall((text or '').lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    hashes = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.uint64, count=len(tokens))
+    width = min(SHINGLE_WORDS, len(hashes))
+    windows = len(hashes) - width + 1
+    combined = np.zeros(windows, dtype=np.uint64)
+    for offset in range(width):
+        combined += hashes[offset:offset + windows] * _SHINGLE_MULTIPLIERS[offset]
+    return np.unique(combined)
+
+
+def minhash(shingle_hashes: np.ndarray) -> np.ndarray:
+    """LSH_BANDS * LSH_ROWS MinHash values, one multiply-shift hash (a*x + b) >> 32 per row"""
+    if not len(shingle_hashes):
+        return np.full(LSH_BANDS * LSH_ROWS, np.iinfo(np.uint64).max, dtype=np.uint64)
+    return ((_PERM_A[:, None] * shingle_hashes[None, :] + _PERM_B[:, None]) >> np.uint64(32)).min(axis=1)
+
+
+def band_hashes(signature: np.ndarray) -> List[int]:
+    """One signed 64-bit hash per band (band number included, so bands never collide with each other)"""
+    rows = signature.reshape(LSH_BANDS, LSH_ROWS)
+    return [int.from_bytes(hashlib.blake2b(bytes([band]) + rows[band].tobytes(), digest_size=8).digest(),
+                           'big', signed=True)
+            for band in range(LSH_BANDS)]
+
+
+def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    """Exact Jaccard similarity of two shingles() results"""
+    if not len(a) or not len(b):
+        return 0.0
+    shared = len(np.intersect1d(a, b, assume_unique=True))
+    return shared / (len(a) + len(b) - shared)
+
+
+class DedupBatch:
+    """
+    What to store of one batch of new chunks, as decided by ChunkDeduplicator.apply().
+
+    `stored` are the offsets written to knowledge_simple (all of them unless
+    DEDUP_MODE=skip), `canonical` the stored offsets that are no duplicate
+    and get an embedding. row() appends the DEDUP_COLUMNS values.
+    """
+
+    def __init__(self, duplicate_of: List[Optional[str]], bands: Optional[List[List[int]]] = None,
+                 skip: bool = False):
+        self.duplicate_of = duplicate_of
+        self.bands = bands
+        self.stored = [offset for offset, match in enumerate(duplicate_of) if match is None or not skip]
+        self.canonical = [offset for offset in self.stored if duplicate_of[offset] is None]
+        self.skipped = len(duplicate_of) - len(self.stored)
+
+    @classmethod
+    def unchecked(cls, size: int) -> 'DedupBatch':
+        """Every chunk stored and canonical (no deduplicator)"""
+        return cls([None] * size)
+
+    def row(self, offset: int, row: tuple) -> tuple:
+        if self.bands is None:
+            return row
+        return row + (self.duplicate_of[offset], self.bands[offset])
+
+
+class ChunkDeduplicator:
+    """
+    Flags chunks whose shingle Jaccard with an existing canonical chunk is >= `threshold`.
+
+    Candidates are canonical knowledge_simple rows sharing at least one LSH
+    band (one GIN lookup per batch) plus earlier chunks of the same batch;
+    each candidate is confirmed with the exact Jaccard of its shingles.
+    Rows written earlier in the caller's transaction are visible, so
+    duplicates within one document are caught too.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, mode: str = DEDUP_MODE):
+        if mode not in DEDUP_ACTIONS:
+            raise ValueError(f"Unknown DEDUP_MODE: {mode}")
+        self.threshold = threshold
+        self.mode = mode
+        self.checked = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        self.candidates = 0
+        self.seconds = 0.0
+        self._source_key: Optional[str] = None
+        self._skip_refs: Set[str] = set()
+
+    def start(self, source_key: str):
+        """Begin a document; apply() records its skip references once per referenced chunk"""
+        self._source_key = source_key
+        self._skip_refs = set()
+
+    def apply(self, cur, chunk_ids: Sequence[str], chunks: Sequence[str], writer) -> DedupBatch:
+        """
+        Check a batch of new chunks and decide which rows to write.
+
+        Near-duplicates are stored without an embedding (link) or not at all
+        (skip). Skipped chunks add a knowledge_skipped_duplicates row to the
+        BulkWriter `writer` (flush knowledge_simple first), so the document is
+        ingested again if the chunk it copies is deleted.
+        """
+        verdicts = self.check(cur, chunk_ids, chunks)
+        batch = DedupBatch([match for match, _ in verdicts], [bands for _, bands in verdicts],
+                           skip=self.mode == 'skip')
+        if self.mode == 'skip':
+            for match in sorted(set(batch.duplicate_of) - {None} - self._skip_refs):
+                self._skip_refs.add(match)
+                writer.add('knowledge_skipped_duplicates', SKIPPED_COLUMNS, (self._source_key, match))
+        return batch
+
+    def check(self, cur, chunk_ids: Sequence[str], chunks: Sequence[str]) -> List[Tuple[Optional[str], List[int]]]:
+        """(id of the chunk it duplicates or None, LSH band hashes) for each chunk"""
+        started = time.perf_counter()
+        shingle_sets = [shingles(chunk) for chunk in chunks]
+        bands = [band_hashes(minhash(shingle_set)) for shingle_set in shingle_sets]
+
+        existing: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+        all_bands = sorted({band for chunk_bands in bands for band in chunk_bands})
+        if all_bands:
+            cur.execute("""
+                SELECT id, content, lsh_bands FROM knowledge_simple
+                WHERE duplicate_of IS NULL AND lsh_bands && %s::bigint[]
+            """, (all_bands,))
+            for row_id, content, row_bands in cur.fetchall():
+                candidate = (str(row_id), shingles(content))
+                for band in row_bands or ():
+                    existing.setdefault(band, []).append(candidate)
+
+        verdicts = []
+        for chunk_id, shingle_set, chunk_bands, chunk in zip(chunk_ids, shingle_sets, bands, chunks):
+            seen: Set[str] = set()
+            match, best = None, self.threshold
+            for band in chunk_bands:
+                for candidate_id, candidate_shingles in existing.get(band, ()):
+                    if candidate_id in seen:
+                        continue
+                    seen.add(candidate_id)
+                    similarity = jaccard(shingle_set, candidate_shingles)
+                    if similarity >= best:
+                        match, best = candidate_id, similarity
+            self.candidates += len(seen)
+            self.checked += 1
+            if match is not None:
+                self.duplicates += 1
+                self.duplicate_bytes += len(chunk.encode('utf-8'))
+            else:
+                # Canonical: later chunks of this batch are compared against it too
+                for band in chunk_bands:
+                    existing.setdefault(band, []).append((chunk_id, shingle_set))
+            verdicts.append((match, chunk_bands))
+        self.seconds += time.perf_counter() - started
+        return verdicts
+
+    def savings(self, cur, with_embeddings: bool = False) -> Dict:
+        """
+        Estimated storage not written because of deduplication.
+
+        Per-row table and index size are averaged from the live relations:
+        skipped chunks save a knowledge_simple row, its index entries and its
+        embedding; linked chunks save only the embedding row and its HNSW
+        entry.
+        """
+        def per_row(table: str) -> Tuple[float, float]:
+            cur.execute("""
+                SELECT pg_table_size(c.oid), pg_indexes_size(c.oid), GREATEST(c.reltuples, 1)
+                FROM pg_class c WHERE c.oid = to_regclass(%s)
+            """, (table,))
+            row = cur.fetchone()
+            return (row[0] / row[2], row[1] / row[2]) if row else (0.0, 0.0)
+
+        table_bytes = index_bytes = 0.0
+        if self.mode == 'skip':
+            row_bytes, row_index_bytes = per_row('knowledge_simple')
+            table_bytes += self.duplicates * row_bytes
+            index_bytes += self.duplicates * row_index_bytes
+        if with_embeddings:
+            row_bytes, row_index_bytes = per_row('knowledge_embeddings')
+            table_bytes += self.duplicates * row_bytes
+            index_bytes += self.duplicates * row_index_bytes
+        return {
+            'mode': self.mode,
+            'threshold': self.threshold,
+            'checked': self.checked,
+            'duplicates': self.duplicates,
+            'duplicate_text_bytes': self.duplicate_bytes,
+            'table_bytes_saved': int(table_bytes),
+            'index_bytes_saved': int(index_bytes),
+            'seconds': round(self.seconds, 3)
+        }
+
+    def summary(self) -> str:
+        rate = self.duplicates / self.checked if self.checked else 0.0
+        return (f"{self.duplicates}/{self.checked} chunks {DEDUP_ACTIONS[self.mode]} as near-duplicates ({rate:.1%}, "
+                f"Jaccard >= {self.threshold}), {self.duplicate_bytes / 1024:,.0f} KB of text, "
+                f"{self.candidates} candidates checked in {self.seconds:.2f}s")
+
+
+class ReleasedDuplicates:
+    """
+    Keeps the near-duplicates of chunks deleted in the current transaction searchable.
+
+    A linked duplicate was stored without an embedding and a skipped one not
+    at all, so deleting their original (changed file, --force, removed file)
+    would drop them from vector search or lose the text. release() runs
+    before such a DELETE: per deleted original the oldest surviving
+    duplicate becomes canonical, the others are re-linked to it, and with
+    `vector_table` the promoted chunk gets a copy of the original's
+    knowledge_embeddings row (near-identical text, so no API call).
+    `promoted` collects (promoted id, original id, source file) for the
+    local vector store and `stale_sources` the files that skipped a copy of
+    a deleted chunk and must be ingested again.
+    """
+
+    def __init__(self):
+        self.promoted: List[Tuple[str, str, str]] = []
+        self.relinked = 0
+        self.stale_sources: Set[str] = set()
+
+    def release(self, cur, doomed: str, params: tuple, vector_table: bool = False) -> int:
+        """Release the duplicates of the knowledge_simple rows matching WHERE `doomed`; returns rows updated"""
+        cur.execute(f"""
+            WITH doomed AS (SELECT id FROM knowledge_simple WHERE {doomed}),
+            orphans AS (
+                SELECT d.id, d.duplicate_of AS original,
+                       first_value(d.id) OVER (PARTITION BY d.duplicate_of ORDER BY d.created_at, d.id) AS promoted
+                FROM knowledge_simple d
+                WHERE d.duplicate_of IN (SELECT id FROM doomed)
+                  AND d.id NOT IN (SELECT id FROM doomed)
+            )
+            UPDATE knowledge_simple k SET duplicate_of = NULLIF(o.promoted, o.id)
+            FROM orphans o
+            WHERE k.id = o.id
+            RETURNING k.id, o.original, k.source_file, k.duplicate_of IS NULL
+        """, params)
+        rows = cur.fetchall()
+        promoted = [(str(row_id), str(original), source_file)
+                    for row_id, original, source_file, canonical in rows if canonical]
+        if promoted and vector_table:
+            cur.execute("""
+                INSERT INTO knowledge_embeddings
+                    (knowledge_id, text, embedding, metadata, doc_type, source_file, chunk_index)
+                SELECT k.id, k.content, e.embedding,
+                       (COALESCE(e.metadata, '{}'::jsonb) - 'chunk_index' - 'section_path' - 'tokens'
+                        - 'total_chunks') || jsonb_build_object('source', k.source_file, 'promoted_from', p.original),
+                       k.doc_type, k.source_file, NULL
+                FROM unnest(%s::uuid[], %s::uuid[]) AS p(promoted, original)
+                JOIN knowledge_simple k ON k.id = p.promoted
+                JOIN knowledge_embeddings e ON e.knowledge_id = p.original
+            """, ([row_id for row_id, _, _ in promoted], [original for _, original, _ in promoted]))
+        self.promoted.extend(promoted)
+        self.relinked += len(rows) - len(promoted)
+
+        cur.execute(f"""
+            SELECT DISTINCT source_file FROM knowledge_skipped_duplicates
+            WHERE duplicate_of IN (SELECT id FROM knowledge_simple WHERE {doomed})
+        """, params)
+        self.stale_sources.update(source_file for (source_file,) in cur.fetchall())
+        return len(rows)
+
+    def summary(self) -> str:
+        return f"{len(self.promoted)} near-duplicates promoted to canonical, {self.relinked} re-linked"
+
+
+def dedup_supported(cur) -> bool:
+    """True when 006_dedup.sql has been applied"""
+    cur.execute("""
+        SELECT COUNT(*) + (to_regclass('knowledge_skipped_duplicates') IS NOT NULL)::int
+        FROM information_schema.columns
+        WHERE table_name = 'knowledge_simple' AND column_name IN ('lsh_bands', 'duplicate_of')
+    """)
+    return cur.fetchone()[0] == 3
+
+
+def scan(conn, link: bool = False, batch_size: int = 500, threshold: float = DEDUP_THRESHOLD) -> ChunkDeduplicator:
+    """
+    Backfill lsh_bands for rows that have none (oldest first), optionally linking duplicates.
+
+    Rows inserted outside the ingest (e.g. evidence text appended by the n8n
+    workflow) have no bands until a scan; each batch is committed, so an
+    interrupted scan resumes where it stopped.
+    """
+    deduper = ChunkDeduplicator(threshold, 'link' if link else 'report')
+    cur = conn.cursor()
+    while True:
+        cur.execute("""
+            SELECT id, content FROM knowledge_simple
+            WHERE lsh_bands IS NULL
+            ORDER BY created_at, id
+            LIMIT %s
+        """, (batch_size,))
+        rows = cur.fetchall()
+        if not rows:
+            break
+        verdicts = deduper.check(cur, [str(row[0]) for row in rows], [row[1] or '' for row in rows])
+        execute_values(cur, """
+            UPDATE knowledge_simple k
+            SET lsh_bands = v.bands, duplicate_of = COALESCE(v.duplicate_of, k.duplicate_of)
+            FROM (VALUES %s) AS v(id, bands, duplicate_of)
+            WHERE k.id = v.id
+        """, [(row[0], bands, duplicate_of if link else None)
+              for row, (duplicate_of, bands) in zip(rows, verdicts)],
+            template="(%s::uuid, %s::bigint[], %s::uuid)")
+        conn.commit()
+        bump_generation(conn)
+        print(f"   🔎 {deduper.checked} rows scanned, {deduper.duplicates} near-duplicates")
+    cur.close()
+    return deduper
+
+
+def stats(cur) -> Dict:
+    """Linked duplicates and the share of knowledge_simple they occupy"""
+    cur.execute("""
+        SELECT COUNT(*),
+               COUNT(*) FILTER (WHERE duplicate_of IS NOT NULL),
+               COUNT(*) FILTER (WHERE lsh_bands IS NULL),
+               COALESCE(SUM(octet_length(content)) FILTER (WHERE duplicate_of IS NOT NULL), 0)
+        FROM knowledge_simple
+    """)
+    total, linked, unscanned, linked_bytes = cur.fetchone()
+    return {'rows': total, 'linked_duplicates': linked, 'unscanned': unscanned,
+            'linked_text_bytes': int(linked_bytes)}
+
+
+def verify(cur) -> Dict:
+    """
+    Invariants that deleting or re-ingesting an original must keep.
+
+    `chained`: linked duplicates whose original is itself a duplicate.
+    `unembedded_originals`: canonical chunks with linked duplicates but no
+    embedding row while knowledge_embeddings is in use, i.e. text that
+    hybrid search can only find by keywords.
+    """
+    cur.execute("""
+        SELECT COUNT(*) FROM knowledge_simple d
+        JOIN knowledge_simple o ON o.id = d.duplicate_of
+        WHERE o.duplicate_of IS NOT NULL
+    """)
+    problems = {'chained': cur.fetchone()[0], 'unembedded_originals': 0}
+    cur.execute("SELECT to_regclass('knowledge_embeddings') IS NOT NULL")
+    if cur.fetchone()[0]:
+        cur.execute("""
+            SELECT COUNT(DISTINCT o.id) FROM knowledge_simple o
+            JOIN knowledge_simple d ON d.duplicate_of = o.id
+            WHERE EXISTS (SELECT 1 FROM knowledge_embeddings)
+              AND NOT EXISTS (SELECT 1 FROM knowledge_embeddings e WHERE e.knowledge_id = o.id)
+        """)
+        problems['unembedded_originals'] = cur.fetchone()[0]
+    return problems
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Near-duplicate detection for knowledge_simple")
+    parser.add_argument('command', choices=('scan', 'stats', 'verify'))
+    parser.add_argument('--link', action='store_true', help="scan: set duplicate_of on near-duplicates")
+    parser.add_argument('--threshold', type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            if not dedup_supported(cur):
+                print("❌ lsh_bands/duplicate_of not found. Run database/006_dedup.sql first!")
+                return False
+            if args.command == 'scan':
+                deduper = scan(conn, args.link, args.batch_size, args.threshold)
+                print(f"✅ {deduper.summary()}")
+            if args.command == 'verify':
+                problems = verify(cur)
+                cur.close()
+                print(f"{'❌' if any(problems.values()) else '✅'} {problems}")
+                return not any(problems.values())
+            print(f"📊 {stats(cur)}")
+            cur.close()
+        return True
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
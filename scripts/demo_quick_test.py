@@ -5,11 +5,13 @@ Run this during the hackathon demo to show key functionality
 """
 
 import os
-import json
-import psycopg2
 import requests
 from datetime import datetime
 
+from db import close_pool, get_pool
+from interaction_logger import close_interaction_logger, get_interaction_logger
+from knowledge_search import get_search
+
 # Configuration
 DATABASE_URL = os.getenv('DATABASE_URL')
 
@@ -26,7 +28,7 @@ def demo_database_content():
     """Show current database content"""
     print_header("DATABASE CONTENT OVERVIEW")
     
-    conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+    conn = get_pool().getconn()
     cur = conn.cursor()
     
     # Knowledge base stats
@@ -85,15 +87,12 @@ def demo_database_content():
         print("   📊 No compliance data yet")
     
     cur.close()
-    conn.close()
+    get_pool().putconn(conn)
 
 def demo_knowledge_search():
     """Demonstrate knowledge base search capabilities"""
     print_header("KNOWLEDGE BASE SEARCH DEMO")
     
-    conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-    cur = conn.cursor()
-    
     search_queries = [
         "SQL injection prevention",
         "cross site scripting XSS",
@@ -104,40 +103,23 @@ def demo_knowledge_search():
     for query in search_queries:
         print_section(f"Search: '{query}'")
         
-        # Combined search (keywords + full-text + title match)
-        cur.execute("""
-            SELECT 
-                title, 
-                doc_type,
-                ts_rank(to_tsvector('english', content), plainto_tsquery('english', %s)) as relevance
-            FROM knowledge_simple 
-            WHERE (
-                to_tsvector('english', content) @@ plainto_tsquery('english', %s)
-                OR keywords && string_to_array(lower(%s), ' ')
-                OR title ILIKE %s
-            )
-            ORDER BY relevance DESC, created_at DESC
-            LIMIT 3
-        """, (query, query, query, f"%{query}%"))
-        
-        results = cur.fetchall()
+        # Combined search (keywords + full-text + title match), cached per knowledge base generation
+        results = get_search().search(query, 3)
         
         if results:
-            for i, (title, doc_type, relevance) in enumerate(results, 1):
+            for i, result in enumerate(results, 1):
+                title, doc_type, relevance = result['title'], result['doc_type'], result['relevance']
                 doc_emoji = {'policy': '📋', 'compliance_doc': '📄', 'evidence': '🔍'}
                 print(f"   {i}. {doc_emoji.get(doc_type, '📄')} {title[:50]}...")
                 print(f"      📊 Relevance: {relevance:.3f} | Type: {doc_type}")
         else:
             print(f"   ❌ No results found for '{query}'")
-    
-    cur.close()
-    conn.close()
 
 def demo_chatbot_simulation():
     """Simulate ChatBot interactions"""
     print_header("CHATBOT RAG SIMULATION")
     
-    conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+    conn = get_pool().getconn()
     cur = conn.cursor()
     
     # Sample ChatBot queries
@@ -165,18 +147,9 @@ def demo_chatbot_simulation():
         print(f"   🤖 Tool Used: {chat['tool']}")
         
         if chat['tool'] == 'search_knowledge_base':
-            # Simulate knowledge search
-            cur.execute("""
-                SELECT title, doc_type
-                FROM knowledge_simple 
-                WHERE (
-                    to_tsvector('english', content) @@ plainto_tsquery('english', %s)
-                    OR keywords && string_to_array(lower(%s), ' ')
-                )
-                LIMIT 3
-            """, (chat['search_term'], chat['search_term']))
-            
-            results = cur.fetchall()
+            # Simulate knowledge search (same search_knowledge() call as the n8n tool)
+            results = [(result['title'], result['doc_type'])
+                       for result in get_search().search(chat['search_term'], 3)]
             print(f"   📚 Knowledge Sources Found: {len(results)}")
             for title, doc_type in results:
                 print(f"      • {title[:40]}... ({doc_type})")
@@ -195,31 +168,26 @@ def demo_chatbot_simulation():
             for severity, count in results:
                 print(f"      • {severity}: {count} findings")
         
-        # Simulate response logging
-        cur.execute("""
-            INSERT INTO chatbot_queries (
-                user_query, bot_response, sources_used, 
-                confidence_score, response_time_ms
-            ) VALUES (%s, %s, %s, %s, %s)
-        """, (
+        # Simulate response logging (queued, written in the background)
+        get_interaction_logger().log(
             chat['query'][:100],
             f"Response based on {chat['tool']} tool",
-            json.dumps([{'tool': chat['tool']}]),
+            [{'tool': chat['tool']}],
             0.85,
             1200
-        ))
+        )
     
-    conn.commit()
-    print(f"\n   ✅ {len(chatbot_queries)} ChatBot interactions logged")
+    get_interaction_logger().flush(timeout=10)
+    print(f"\n   ✅ {len(chatbot_queries)} ChatBot interactions logged ({get_interaction_logger().summary()})")
     
     cur.close()
-    conn.close()
+    get_pool().putconn(conn)
 
 def demo_workflow_status():
     """Show workflow execution status"""
     print_header("WORKFLOW EXECUTION STATUS")
     
-    conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+    conn = get_pool().getconn()
     cur = conn.cursor()
     
     # Recent workflow executions
@@ -232,6 +200,7 @@ def demo_workflow_status():
             duration_ms,
             created_at
         FROM workflow_logs 
+        WHERE created_at >= NOW() - INTERVAL '30 days'  -- prunes to the last one or two monthly partitions
         ORDER BY created_at DESC 
         LIMIT 5
     """)
@@ -247,7 +216,7 @@ def demo_workflow_status():
         print("   📝 No workflow executions yet")
     
     # Summary stats
-    print_section("Workflow Performance Summary")
+    print_section("Workflow Performance Summary (last 30 days)")
     cur.execute("""
         SELECT 
             workflow_name,
@@ -255,6 +224,7 @@ def demo_workflow_status():
             AVG(duration_ms) as avg_duration,
             SUM(findings_processed) as total_findings
         FROM workflow_logs 
+        WHERE created_at >= NOW() - INTERVAL '30 days'
         GROUP BY workflow_name
     """)
     
@@ -268,7 +238,7 @@ def demo_workflow_status():
         print("   📊 No performance data available")
     
     cur.close()
-    conn.close()
+    get_pool().putconn(conn)
 
 def main():
     """Run complete demo"""
@@ -282,13 +252,13 @@ def main():
     
     try:
         # Test database connection
-        conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+        conn = get_pool().getconn()
         cur = conn.cursor()
         cur.execute('SELECT version()')
         version = cur.fetchone()[0]
         print(f"✅ Connected to: {version[:50]}...")
         cur.close()
-        conn.close()
+        get_pool().putconn(conn)
         
         # Run demo sections
         demo_database_content()
@@ -304,10 +274,15 @@ def main():
         print("   ✅ ChatBot RAG functionality")
         print("   ✅ Workflow automation logging")
         print("   ✅ Compliance status tracking")
+        print(f"   🔌 Database pool: {get_pool().summary()}")
+        print(f"   🔍 Search cache: {get_search().summary()}")
         
     except Exception as e:
         print(f"❌ Demo failed: {e}")
         print("💡 Check database connection and run setup_knowledge_base.sh first")
+    finally:
+        close_interaction_logger()
+        close_pool()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
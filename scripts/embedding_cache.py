@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Content-Addressed Embedding Cache
+Keeps embeddings on disk keyed by (chunk hash, model, dimensions) so re-ingests skip the API
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.getenv(
+    'EMBEDDING_CACHE_DIR',
+    str(Path(__file__).parent.parent / '.cache' / 'embeddings')
+)
+EMBEDDING_CACHE_MAX_MB = int(os.getenv('EMBEDDING_CACHE_MAX_MB', '512'))
+EVICT_FRACTION = 0.1  # share of entries dropped at once when the cache is full
+
+
+def content_key(text: str) -> str:
+    """Cache key for one chunk of text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    float32 vectors in a memory-mapped file plus a JSON index.
+
+    Each (model, dimensions) pair gets its own directory holding
+    `vectors.f32` (one fixed-width row per slot) and `index.json`
+    (key -> [slot, last_used]). The cache never grows past `max_bytes`;
+    when full, the least recently used entries are evicted and their slots
+    reused.
+    """
+
+    def __init__(self, model: str, dimensions: int, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 max_bytes: int = EMBEDDING_CACHE_MAX_MB * 1024 * 1024):
+        self.model = model
+        self.dimensions = dimensions
+        self.row_bytes = dimensions * np.dtype(np.float32).itemsize
+        self.capacity = max(1, max_bytes // self.row_bytes)
+        safe_model = re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+        self.path = Path(cache_dir) / f"{safe_model}-{dimensions}"
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.path / 'vectors.f32'
+        self.index_path = self.path / 'index.json'
+
+        self.index: Dict[str, List[int]] = {}
+        self.free_slots: List[int] = []
+        self.clock = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._vectors: Optional[np.memmap] = None
+        self._load()
+
+    def _load(self):
+        if self.index_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.index = {key: list(value) for key, value in state.get('entries', {}).items()}
+            self.free_slots = list(state.get('free_slots', []))
+            self.clock = state.get('clock', 0)
+
+        rows = self.vectors_path.stat().st_size // self.row_bytes if self.vectors_path.exists() else 0
+        if rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                      shape=(rows, self.dimensions))
+
+        # Drop index entries whose rows never reached the file (e.g. a crash before flush)
+        stale = [key for key, (slot, _) in self.index.items() if slot >= rows]
+        for key in stale:
+            del self.index[key]
+        self.free_slots = [slot for slot in self.free_slots if slot < rows]
+
+        # Shrink to the configured limit if it was lowered since the last run
+        if len(self.index) > self.capacity:
+            self._evict(len(self.index) - self.capacity)
+
+    @property
+    def rows(self) -> int:
+        return 0 if self._vectors is None else self._vectors.shape[0]
+
+    def _grow(self, min_rows: int):
+        """Extend the vectors file, doubling up to `capacity` rows"""
+        rows = min(self.capacity, max(min_rows, self.rows * 2, 64))
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        with open(self.vectors_path, 'ab') as f:
+            f.truncate(rows * self.row_bytes)
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r+',
+                                  shape=(rows, self.dimensions))
+
+    def _evict(self, count: int):
+        """Drop the `count` least recently used entries"""
+        victims = sorted(self.index.items(), key=lambda item: item[1][1])[:count]
+        for key, (slot, _) in victims:
+            del self.index[key]
+            self.free_slots.append(slot)
+        self.evictions += len(victims)
+
+    def _allocate_slot(self) -> int:
+        if self.free_slots:
+            return self.free_slots.pop()
+        used = len(self.index)
+        if used < self.capacity:
+            if used >= self.rows:
+                self._grow(used + 1)
+            return used
+        self._evict(max(1, int(self.capacity * EVICT_FRACTION)))
+        return self.free_slots.pop()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Vector for `key`, or None on a miss"""
+        entry = self.index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.clock += 1
+        entry[1] = self.clock
+        return np.array(self._vectors[entry[0]])
+
+    def put(self, key: str, vector: Sequence[float]):
+        """Store a vector (overwrites an existing entry for the same key)"""
+        if len(vector) != self.dimensions:
+            raise ValueError(f"Expected {self.dimensions} dimensions, got {len(vector)}")
+        self.clock += 1
+        entry = self.index.get(key)
+        slot = entry[0] if entry else self._allocate_slot()
+        self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+        self.index[key] = [slot, self.clock]
+
+    def save(self):
+        """Flush vectors and atomically rewrite the index"""
+        if self._vectors is not None:
+            self._vectors.flush()
+        state = {
+            'model': self.model,
+            'dimensions': self.dimensions,
+            'clock': self.clock,
+            'free_slots': self.free_slots,
+            'entries': self.index
+        }
+        tmp_path = self.index_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.index),
+            'capacity': self.capacity,
+            'size_mb': round(self.rows * self.row_bytes / (1024 * 1024), 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"{stats['hits']} hits / {stats['misses']} misses "
+                f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries, "
+                f"{stats['size_mb']} MB, {stats['evictions']} evicted")
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Batched Embedding Generation
+Pluggable embedding providers: OpenAI (batched, concurrent requests) or a local hashing vectorizer
+"""
+
+import math
+import os
+import re
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from embedding_cache import content_key
+from keyword_engine import STOP_WORDS
+
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'openai').lower()  # 'openai' or 'local'
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+LOCAL_EMBEDDING_MODEL = 'local-hashing-v1'  # bump if HashingEmbeddingProvider output changes
+EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', '1536'))  # text-embedding-3-small
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '100'))  # inputs per request
+EMBEDDING_CONCURRENCY = int(os.getenv('EMBEDDING_CONCURRENCY', '4'))  # requests in flight
+MAX_INPUT_CHARS = 8000  # per input, same limit as the original single-chunk call
+
+
+_VECTOR_FORMATS: Dict[int, str] = {}
+
+
+def format_vector(vector: Sequence[float]) -> str:
+    """Format an embedding as a PostgreSQL vector literal"""
+    values = tuple(vector.tolist() if isinstance(vector, np.ndarray) else vector)
+    template = _VECTOR_FORMATS.get(len(values))
+    if template is None:
+        # One %-format per dimension count is ~3x faster than joining per-value f-strings
+        template = _VECTOR_FORMATS[len(values)] = '[' + ', '.join(['%.6f'] * len(values)) + ']'
+    return template % values
+
+
+def embed_batch(client, texts: Sequence[str], model: str = EMBEDDING_MODEL,
+                dimensions: int = EMBEDDING_DIMENSIONS) -> List[List[float]]:
+    """One embeddings request for a whole batch, results in input order"""
+    options = {}
+    if model.startswith('text-embedding-3'):
+        options['dimensions'] = dimensions  # keeps vectors the size the cache and table expect
+    response = client.embeddings.create(
+        model=model,
+        input=[text[:MAX_INPUT_CHARS] for text in texts],
+        **options
+    )
+    vectors = [None] * len(texts)
+    for item in response.data:
+        vectors[item.index] = item.embedding
+    return vectors
+
+
+class EmbeddingProvider(ABC):
+    """
+    Turns a batch of texts into fixed-size vectors.
+
+    `model` and `dimensions` identify the vector space: the embedding cache,
+    the local vector store and query embedding all key on them, so ingest
+    and search must use the same provider. Remote providers are batched,
+    run concurrently and cached by embed_texts(); local ones are called
+    directly on the whole batch.
+    """
+
+    name = 'base'
+    remote = False
+
+    def __init__(self, model: str, dimensions: int):
+        self.model = model
+        self.dimensions = dimensions
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str]) -> List[Sequence[float]]:
+        """One vector of `dimensions` floats per text, in input order"""
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI embeddings API (one request per call)"""
+
+    name = 'OpenAI'
+    remote = True
+
+    def __init__(self, client, model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS):
+        super().__init__(model, dimensions)
+        self.client = client
+
+    def embed(self, texts: Sequence[str]) -> List[List[float]]:
+        return embed_batch(self.client, texts, self.model, self.dimensions)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Offline feature-hashing embeddings.
+
+    Unigrams and adjacent bigrams (stop words dropped) are hashed with CRC32
+    into `dimensions` signed buckets, weighted by 1 + log(tf), and the
+    sparse batch is scattered into a dense matrix with one bincount and
+    L2-normalized. Purely lexical, but deterministic across processes and
+    machines, so no network, API key or model download is needed.
+    """
+
+    name = 'local hashing'
+    MAX_SLOT_CACHE = 500_000
+    TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, model: str = LOCAL_EMBEDDING_MODEL):
+        super().__init__(model, dimensions)
+        self._slots: Dict[str, int] = {}  # term -> signed (bucket + 1)
+
+    def _slot(self, term: str) -> int:
+        slot = self._slots.get(term)
+        if slot is None:
+            if len(self._slots) >= self.MAX_SLOT_CACHE:
+                self._slots.clear()
+            digest = zlib.crc32(term.encode('utf-8'))
+            slot = (digest % self.dimensions + 1) * (-1 if digest & 0x80000000 else 1)
+            self._slots[term] = slot
+        return slot
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        slots: List[int] = []
+        weights: List[float] = []
+        for row, text in enumerate(texts):
+            tokens = [token for token in self.TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+            counts = Counter(tokens)
+            counts.update(f"{first} {second}" for first, second in zip(tokens, tokens[1:]))
+            slots.extend(self._slot(term) for term in counts)
+            weights.extend(1.0 + math.log(count) for count in counts.values())
+            rows.extend([row] * len(counts))
+
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        if slots:
+            slots_array = np.asarray(slots, dtype=np.int64)
+            flat = np.asarray(rows, dtype=np.int64) * self.dimensions + np.abs(slots_array) - 1
+            signed = np.sign(slots_array) * np.asarray(weights, dtype=np.float64)
+            matrix = np.bincount(flat, weights=signed, minlength=matrix.size) \
+                .astype(np.float32).reshape(matrix.shape)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def get_embedding_provider(openai_client=None, provider: str = EMBEDDING_PROVIDER) -> Optional[EmbeddingProvider]:
+    """Provider selected by EMBEDDING_PROVIDER ('openai' needs a client, 'local' never does)"""
+    if provider == 'local':
+        return HashingEmbeddingProvider()
+    if provider != 'openai':
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER: {provider}")
+    return OpenAIEmbeddingProvider(openai_client) if openai_client else None
+
+
+def embed_texts(texts: Sequence[str], provider: Optional[EmbeddingProvider],
+                batch_size: int = EMBEDDING_BATCH_SIZE, max_in_flight: int = EMBEDDING_CONCURRENCY,
+                cache=None) -> List[Optional[str]]:
+    """
+    Embed `texts` and return PostgreSQL vector literals in input order.
+
+    For remote providers, inputs are grouped into requests of `batch_size`
+    and at most `max_in_flight` requests run at once; with an
+    EmbeddingCache only cache misses are sent to the API. A failed request
+    leaves None for its inputs so callers can fall back to keyword-only
+    rows. Local providers embed the whole batch in one call.
+    """
+    if not provider or not texts:
+        return [None] * len(texts)
+
+    if not provider.remote:
+        try:
+            return [format_vector(vector) for vector in provider.embed([text[:MAX_INPUT_CHARS] for text in texts])]
+        except Exception as e:
+            print(f"⚠️  Embedding generation failed for {len(texts)} chunks: {e}")
+            return [None] * len(texts)
+
+    results: List[Optional[str]] = [None] * len(texts)
+    keys = [content_key(text[:MAX_INPUT_CHARS]) for text in texts]
+    pending = []
+    for i, key in enumerate(keys):
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            results[i] = format_vector(cached)
+        else:
+            pending.append(i)
+
+    batch_size = max(1, batch_size)
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+    def run(batch: List[int]) -> List[Optional[List[float]]]:
+        try:
+            return provider.embed([texts[i] for i in batch])
+        except Exception as e:
+            print(f"⚠️  Embedding generation failed for {len(batch)} chunks: {e}")
+            return [None] * len(batch)
+
+    started = time.perf_counter()
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(batches)))) as executor:
+            for batch, vectors in zip(batches, executor.map(run, batches)):
+                for i, vector in zip(batch, vectors):
+                    if vector is None:
+                        continue
+                    results[i] = format_vector(vector)
+                    if cache is not None:
+                        cache.put(keys[i], vector)
+        if cache is not None:
+            cache.save()
+
+    if not pending:
+        return results
+
+    elapsed = time.perf_counter() - started
+    embedded = sum(1 for vector in results if vector is not None)
+    rate = len(pending) / elapsed if elapsed > 0 else 0.0
+    print(f"   🧠 Embedded {embedded}/{len(texts)} chunks "
+          f"({len(texts) - len(pending)} cached, {len(pending)} via {len(batches)} requests, "
+          f"{elapsed:.2f}s, {rate:,.0f} chunks/s)")
+    return results
@@ -6,17 +6,54 @@ Simplified version for hackathon (keyword-based search)
 
 import os
 import sys
+import argparse
+import itertools
+import json
+import pickle
+import tempfile
+import time
 import psycopg2
-from psycopg2.extras import Json
 import PyPDF2
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import re
-from typing import List, Optional
+import uuid
+from typing import Iterable, Iterator, List, Optional, Union
+
+from bulk_load import DEFAULT_BATCH_SIZE, BulkWriter, LoadStats, batched
+from db import close_pool, connection, get_pool
+from dedup import (DEDUP_COLUMNS, DEDUP_MODE, ChunkDeduplicator, DedupBatch, ReleasedDuplicates,
+                   dedup_supported, verify as verify_dedup)
+from embedding_cache import EmbeddingCache
+from embeddings import (EMBEDDING_BATCH_SIZE, EMBEDDING_CONCURRENCY, EMBEDDING_PROVIDER,
+                        EmbeddingProvider, embed_texts, get_embedding_provider)
+from stage_profiler import enable_profiling, get_profiler, log_workflow_run
+from knowledge_search import bump_generation
+from keyword_engine import KEYWORD_STATS_PATH, STOP_WORDS, KeywordEngine, rebuild_keywords, sync_statistics
+from ingest_manifest import (IngestManifest, delete_legacy_chunks, delete_source_chunks, file_fingerprint,
+                             hash_file)
+from markdown_chunker import MarkdownChunk, iter_markdown_chunks
+from vector_store import LocalVectorStore, parse_vector
 
 # Environment configuration
 DATABASE_URL = os.getenv('DATABASE_URL')
 USE_PGVECTOR = os.getenv('USE_PGVECTOR', 'false').lower() == 'true'
+USE_EMBEDDING_CACHE = os.getenv('EMBEDDING_CACHE', 'true').lower() == 'true'
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'auto').lower()  # 'auto', 'pgvector' or 'local'
+KEYWORD_ENGINE = os.getenv('KEYWORD_ENGINE', 'tfidf').lower()  # 'tfidf' or 'simple'
 CHUNK_SIZE = 1000  # words per chunk
+CHUNK_OVERLAP = 100  # words overlap between chunks
+MARKDOWN_CHUNKING = os.getenv('MARKDOWN_CHUNKING', 'structure').lower()  # 'structure' or 'words'
+BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE))  # rows per COPY
+SUPPORTED_EXTENSIONS = ('.pdf', '.md', '.txt')
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '25'))  # page range per worker task
+WORKFLOW_NAME = 'Knowledge Base Ingestion'  # workflow_logs.workflow_name of each run
+
+# Chunk ids are generated here so embedding rows can reference their knowledge_simple row
+KNOWLEDGE_SIMPLE_COLUMNS = ('id', 'title', 'content', 'doc_type', 'keywords', 'source_type', 'source_file')
+KNOWLEDGE_EMBEDDING_COLUMNS = ('knowledge_id', 'text', 'embedding', 'metadata', 'doc_type', 'source_file',
+                               'chunk_index')
 
 def setup_openai():
     """Setup OpenAI client if vector mode enabled"""
@@ -33,56 +70,101 @@ def setup_openai():
             return None
     return None
 
+def setup_embeddings() -> Optional[EmbeddingProvider]:
+    """Embedding provider for vector mode (EMBEDDING_PROVIDER=local needs no API key)"""
+    if not USE_PGVECTOR:
+        return None
+    if EMBEDDING_PROVIDER == 'local':
+        return get_embedding_provider()
+    return get_embedding_provider(setup_openai())
+
+def iter_words(segments: Iterable[str]) -> Iterator[str]:
+    """Word stream over text segments (pages or lines) that end on whitespace"""
+    for segment in segments:
+        yield from segment.split()
+
+def iter_chunks(words: Iterable[str], chunk_size: int = CHUNK_SIZE,
+                overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Sliding window of `chunk_size` words advancing by chunk_size - overlap.
+
+    Produces exactly the chunks of the original list-based splitter while
+    holding at most one window of words in memory.
+    """
+    step = chunk_size - overlap
+    window: List[str] = []
+    for word in words:
+        window.append(word)
+        if len(window) == chunk_size:
+            yield ' '.join(window)
+            del window[:step]
+    # Trailing windows start inside the last full chunk, as before
+    while window:
+        yield ' '.join(window[:chunk_size])
+        del window[:step]
+
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE) -> List[str]:
     """Split text into chunks with word overlap"""
-    words = text.split()
-    chunks = []
-    overlap = 100  # words overlap between chunks
-    
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk = ' '.join(words[i:i + chunk_size])
-        if chunk.strip():
-            chunks.append(chunk.strip())
-    
-    return chunks
+    return list(iter_chunks(text.split(), chunk_size))
+
+def iter_pdf_pages(pdf_path: str) -> Iterator[str]:
+    """Yield the text of each PDF page, one page in memory at a time"""
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page in reader.pages:
+            text = page.extract_text()
+            if text:
+                yield text
 
 def extract_pdf_text(pdf_path: str) -> str:
     """Extract text from PDF file"""
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            pages = []
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    pages.append(text)
-            return '\n'.join(pages)
+        return '\n'.join(iter_pdf_pages(pdf_path))
     except Exception as e:
         print(f"❌ Error reading PDF {pdf_path}: {e}")
         return ""
 
+def iter_document_segments(doc_path: str) -> Iterator[str]:
+    """Stream a PDF page by page or a MD/TXT file line by line"""
+    if doc_path.endswith('.pdf'):
+        yield from iter_pdf_pages(doc_path)
+    elif doc_path.endswith(('.md', '.txt')):
+        with open(doc_path, 'r', encoding='utf-8') as f:
+            yield from f
+    else:
+        raise ValueError(f"Unsupported file type: {doc_path}")
+
+def iter_document_chunks(doc_path: str,
+                         chunk_size: int = CHUNK_SIZE) -> Iterator[Union[str, MarkdownChunk]]:
+    """
+    pages/lines -> words -> overlapping chunks, without materializing the document
+
+    Markdown is split along its headings, lists and code blocks instead
+    (MARKDOWN_CHUNKING=structure), yielding MarkdownChunk with the section path.
+    """
+    profiler = get_profiler()
+    segments = profiler.iter('extract', iter_document_segments(doc_path), size=len)
+    if doc_path.endswith('.md') and MARKDOWN_CHUNKING == 'structure':
+        return profiler.iter('chunk', iter_markdown_chunks(segments), chunks=True)
+    return profiler.iter('chunk', iter_chunks(iter_words(segments), chunk_size), chunks=True)
+
+def chunk_content(chunk: Union[str, MarkdownChunk]) -> str:
+    """Text of a plain or Markdown chunk"""
+    return chunk.text if isinstance(chunk, MarkdownChunk) else chunk
+
 def extract_keywords(text: str, max_keywords: int = 20) -> List[str]:
-    """Extract keywords from text for simple search"""
+    """Extract keywords from text for simple search (first distinct non-stopwords)"""
     # Remove special characters and convert to lowercase
     text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text.lower())
     
-    # Split into words and filter
-    words = text.split()
-    
-    # Remove short words and common stop words
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 
-        'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have',
-        'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should',
-        'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'
-    }
-    
     keywords = []
-    for word in words:
+    seen = set()
+    for word in text.split():
         if (len(word) > 2 and 
-            word not in stop_words and 
+            word not in STOP_WORDS and 
             word.isalpha() and
-            word not in keywords):
+            word not in seen):
+            seen.add(word)
             keywords.append(word)
             
         if len(keywords) >= max_keywords:
@@ -90,164 +172,627 @@ def extract_keywords(text: str, max_keywords: int = 20) -> List[str]:
     
     return keywords
 
-def get_connection():
-    """Get PostgreSQL connection"""
-    if not DATABASE_URL:
-        raise RuntimeError("DATABASE_URL environment variable not set")
-    
-    try:
-        return psycopg2.connect(DATABASE_URL, sslmode='require')
-    except psycopg2.Error as e:
-        print(f"❌ Database connection failed: {e}")
-        raise
+_keyword_engine = None
+
+def get_keyword_engine() -> Optional[KeywordEngine]:
+    """Shared corpus-level TF-IDF keyword engine (None when KEYWORD_ENGINE=simple)"""
+    global _keyword_engine
+    if KEYWORD_ENGINE == 'tfidf' and _keyword_engine is None:
+        try:
+            _keyword_engine = KeywordEngine()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Keyword statistics unreadable, starting fresh: {e}")
+            _keyword_engine = KeywordEngine(path=None)
+            _keyword_engine.path = KEYWORD_STATS_PATH
+    return _keyword_engine
+
+def use_keyword_engine(engine: Optional[KeywordEngine]):
+    """Rank keywords with `engine` (e.g. an in-memory one that never touches KEYWORD_STATS_PATH)"""
+    global _keyword_engine
+    _keyword_engine = engine
+
+def chunk_keywords(chunks: List[str]) -> List[List[str]]:
+    """Keywords for a batch of chunks (TF-IDF engine, or first-N words in simple mode)"""
+    engine = get_keyword_engine()
+    with get_profiler().stage('keywords', chunks=len(chunks)):
+        if engine is not None:
+            return engine.extract(chunks)
+        return [extract_keywords(chunk) for chunk in chunks]
+
+_deduplicator = None
+
+def get_deduplicator() -> Optional[ChunkDeduplicator]:
+    """Ingest-time near-duplicate detection (None when DEDUP_MODE=off or 006_dedup.sql is missing)"""
+    return _deduplicator
+
+def use_deduplicator(deduper: Optional[ChunkDeduplicator]):
+    """Check every new chunk against stored ones with `deduper`"""
+    global _deduplicator
+    _deduplicator = deduper
+
+_release_duplicates = False
 
-def generate_embedding(text: str, client) -> Optional[str]:
-    """Generate embedding using OpenAI (if available)"""
-    if not client:
+def release_duplicates(enabled: bool):
+    """Promote the near-duplicates of deleted chunks (needs 006_dedup.sql, whatever DEDUP_MODE is)"""
+    global _release_duplicates
+    _release_duplicates = enabled
+
+_embedding_cache = None
+
+def get_embedding_cache(embedder: Optional[EmbeddingProvider]) -> Optional[EmbeddingCache]:
+    """Shared on-disk embedding cache (None when EMBEDDING_CACHE=false or the provider is local)"""
+    global _embedding_cache
+    if not (embedder and embedder.remote):
         return None
-        
-    try:
-        response = client.embeddings.create(
-            model="text-embedding-3-small",
-            input=text[:8000]  # Limit input size
-        )
-        vector = response.data[0].embedding
-        # Format as PostgreSQL vector literal
-        return '[' + ', '.join(f'{value:.6f}' for value in vector) + ']'
-    except Exception as e:
-        print(f"⚠️  Embedding generation failed: {e}")
+    if USE_EMBEDDING_CACHE and _embedding_cache is None:
+        try:
+            _embedding_cache = EmbeddingCache(embedder.model, embedder.dimensions)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Embedding cache unavailable, continuing without it: {e}")
+            return None
+    return _embedding_cache
+
+_vector_store = None
+
+def get_vector_store() -> Optional[LocalVectorStore]:
+    """Local vector store when embeddings are not written to pgvector (None otherwise)"""
+    return _vector_store
+
+def use_local_vectors(embedder: EmbeddingProvider) -> LocalVectorStore:
+    """Send embeddings to the local vector store instead of knowledge_embeddings"""
+    global _vector_store
+    if _vector_store is None:
+        _vector_store = LocalVectorStore(dimensions=embedder.dimensions, model=embedder.model)
+    return _vector_store
+
+def generate_embedding(text: str, embedder: Optional[EmbeddingProvider]) -> Optional[str]:
+    """Generate embedding with the configured provider (if available), checking the local cache first"""
+    if not embedder:
         return None
+    with get_profiler().stage('embed', chunks=1):
+        return embed_texts([text], embedder, cache=get_embedding_cache(embedder))[0]
 
-def ingest_document(doc_path: str, doc_type: str, openai_client=None) -> bool:
-    """Ingest a single document into knowledge base"""
-    print(f"📄 Processing: {doc_path}")
-    
-    # Extract text
-    if doc_path.endswith('.pdf'):
-        text = extract_pdf_text(doc_path)
-    elif doc_path.endswith(('.md', '.txt')):
-        try:
-            with open(doc_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-        except Exception as e:
-            print(f"❌ Error reading {doc_path}: {e}")
-            return False
-    else:
-        print(f"⚠️  Unsupported file type: {doc_path}")
-        return False
-    
-    if not text.strip():
-        print(f"⚠️  No text extracted from {doc_path}")
-        return False
-    
-    # Split into chunks
-    chunks = chunk_text(text)
+def prepare_document(doc_path: str, with_keywords: bool = True) -> dict:
+    """Extraction, chunking and keyword extraction (CPU-only, safe to run in a worker process)"""
+    chunks = list(iter_document_chunks(doc_path))
     if not chunks:
-        print(f"⚠️  No chunks created from {doc_path}")
+        raise ValueError(f"No text extracted from {doc_path}")
+    keywords = [extract_keywords(chunk_content(chunk)) for chunk in chunks] if with_keywords else None
+    return {'chunks': chunks, 'keywords': keywords}
+
+def replace_previous_chunks(cur, doc_path: str, source_key: str, vector_table: bool, engine=None,
+                            manifest: Optional[IngestManifest] = None) -> Optional[ReleasedDuplicates]:
+    """Delete whatever this file contributed on a previous run, releasing near-duplicates of those chunks"""
+    released = ReleasedDuplicates() if _release_duplicates else None
+    replaced = delete_source_chunks(cur, source_key, vector_table, engine, released)
+    replaced += delete_legacy_chunks(cur, doc_path, engine, released, vector_table)
+    if released is not None and manifest is not None:
+        manifest.mark_stale(cur, released.stale_sources - {source_key})
+    if replaced:
+        print(f"♻️  Replacing {replaced} previously ingested chunks")
+    if released is not None and (released.promoted or released.relinked):
+        print(f"   🔗 {released.summary()}")
+    return released
+
+def vector_row(chunk_id: str, chunk: str, embedding: str, doc_path: str, doc_type: str, source_key: str,
+               idx: int, embedder, section: Optional[MarkdownChunk] = None,
+               total_chunks: Optional[int] = None) -> tuple:
+    """KNOWLEDGE_EMBEDDING_COLUMNS row of one chunk"""
+    metadata = {
+        'source': Path(doc_path).name,
+        'chunk_index': idx,
+        'doc_type': doc_type,
+        'embedding_model': embedder.model
+    }
+    if total_chunks is not None:
+        metadata['total_chunks'] = total_chunks
+    if section is not None:
+        metadata['section_path'] = section.section_path
+        metadata['tokens'] = section.tokens
+    return (chunk_id, chunk, embedding, metadata, doc_type, source_key, idx)
+
+def write_vector_rows(cur, writer: BulkWriter, vector_rows: List[tuple]) -> bool:
+    """COPY embedding rows under a savepoint; False (keyword rows kept) when vector storage fails"""
+    cur.execute("SAVEPOINT vector_rows")
+    try:
+        with get_profiler().stage('db_write'):
+            for row in vector_rows:
+                writer.add('knowledge_embeddings', KNOWLEDGE_EMBEDDING_COLUMNS, row)
+            writer.flush()
+        cur.execute("RELEASE SAVEPOINT vector_rows")
+        return True
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT vector_rows")
+        writer.discard('knowledge_embeddings')
+        print(f"   ⚠️  Vector storage failed, continuing keyword only: {e}")
         return False
+
+def update_local_store(local_store: LocalVectorStore, source_key: str, ids: List[str], vectors: List,
+                       released: Optional[ReleasedDuplicates] = None):
+    """Apply a committed document to the local vector store (a failure only costs vector search)"""
+    try:
+        with get_profiler().stage('vectors', chunks=len(ids)):
+            if released is not None:
+                local_store.adopt(released.promoted)
+            local_store.replace_source(source_key, ids, vectors)
+    except Exception as e:
+        print(f"   ⚠️  Local vector store update failed: {e}")
+
+def write_document(doc_path: str, doc_type: str, chunks: Iterable[Union[str, MarkdownChunk]],
+                   keywords: Optional[Iterable[List[str]]] = None,
+                   embeddings: Optional[Iterable[Optional[str]]] = None,
+                   embedder=None, source_key: Optional[str] = None,
+                   manifest: Optional[IngestManifest] = None, fingerprint: Optional[dict] = None,
+                   batch_size: int = BATCH_SIZE, stats: Optional[LoadStats] = None,
+                   total_chunks: Optional[int] = None) -> bool:
+    """
+    Store the chunks of one document in a single transaction
+
+    `chunks` may be a generator: it is consumed in batches of `batch_size`
+    and each batch gets its keywords, embeddings and COPY before the next
+    one is read, so memory stays bounded by one batch. Keywords and
+    embeddings are computed per batch unless passed in; callers pass
+    already extracted chunks and embeddings so the transaction stays short.
+    """
+    source_key = source_key or Path(doc_path).name
+    vector_mode = bool(USE_PGVECTOR and embedder)
+    local_store = get_vector_store() if vector_mode else None
+    local_ids, local_vectors = [], []
+    keyword_stream = iter(keywords) if keywords is not None else None
+    embedding_stream = iter(embeddings) if embeddings is not None else None
     
-    print(f"📝 Created {len(chunks)} chunks")
+    profiler = get_profiler()
+    deduper = get_deduplicator()
+    engine = get_keyword_engine()
+    vector_table = vector_mode and local_store is None
+    simple_columns = KNOWLEDGE_SIMPLE_COLUMNS + (DEDUP_COLUMNS if deduper is not None else ())
     
-    # Database connection
-    conn = get_connection()
+    # Pooled database connection
+    pool = get_pool()
+    conn = pool.getconn()
     cur = conn.cursor()
     
+    # Keyword statistics follow the transaction: undone on rollback, kept on commit
+    if engine is not None:
+        engine.begin()
     try:
-        for idx, chunk in enumerate(chunks):
-            # Extract keywords
-            keywords = extract_keywords(chunk)
-            
-            # Store in simple table (always)
-            cur.execute("""
-                INSERT INTO knowledge_simple (title, content, doc_type, keywords, source_type)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (
-                f"{Path(doc_path).stem} - Chunk {idx + 1}",
-                chunk,
-                doc_type,
-                keywords,
-                'document'
-            ))
+        with profiler.stage('db_write'):
+            released = replace_previous_chunks(cur, doc_path, source_key, vector_table, engine, manifest)
+
+        writer = BulkWriter(cur, batch_size)
+        chunk_count = 0
+        skipped = 0
+        vector_failed = False
+        if deduper is not None:
+            deduper.start(source_key)
+        for batch in batched(chunks, batch_size):
+            batch_keywords = (list(itertools.islice(keyword_stream, len(batch)))
+                              if keyword_stream is not None else None)
+            batch_embeddings = (list(itertools.islice(embedding_stream, len(batch)))
+                                if embedding_stream is not None else None)
+            sections = [chunk if isinstance(chunk, MarkdownChunk) else None for chunk in batch]
+            batch = [chunk_content(chunk) for chunk in batch]
+            chunk_ids = [str(uuid.uuid4()) for _ in batch]
             
-            # Store in vector table (if enabled and available)
-            if USE_PGVECTOR and openai_client:
-                embedding = generate_embedding(chunk, openai_client)
-                if embedding:
-                    try:
-                        cur.execute("""
-                            INSERT INTO knowledge_embeddings 
-                            (text, embedding, metadata, doc_type, source_file, chunk_index)
-                            VALUES (%s, %s::vector, %s::jsonb, %s, %s, %s)
-                        """, (
-                            chunk,
-                            embedding,
-                            Json({
-                                'source': Path(doc_path).name,
-                                'chunk_index': idx,
-                                'total_chunks': len(chunks),
-                                'doc_type': doc_type
-                            }),
-                            doc_type,
-                            Path(doc_path).name,
-                            idx
-                        ))
-                        print(f"   ✅ Chunk {idx + 1}/{len(chunks)} (with embedding)")
-                    except psycopg2.Error as e:
-                        print(f"   ⚠️  Vector storage failed for chunk {idx + 1}: {e}")
-                        print(f"   ✅ Chunk {idx + 1}/{len(chunks)} (keyword only)")
-                else:
-                    print(f"   ✅ Chunk {idx + 1}/{len(chunks)} (keyword only)")
+            # Near-duplicates of stored chunks are dropped (skip) or stored without embedding (link)
+            if deduper is not None:
+                with profiler.stage('dedup', chunks=len(batch)):
+                    dedup = deduper.apply(cur, chunk_ids, batch, writer)
             else:
-                print(f"   ✅ Chunk {idx + 1}/{len(chunks)} (keyword only)")
+                dedup = DedupBatch.unchecked(len(batch))
+            skipped += dedup.skipped
+            
+            if batch_keywords is None:
+                batch_keywords = [None] * len(batch)
+                if dedup.stored:
+                    stored_keywords = chunk_keywords([batch[offset] for offset in dedup.stored])
+                    for offset, chunk_words in zip(dedup.stored, stored_keywords):
+                        batch_keywords[offset] = chunk_words
+            
+            if batch_embeddings is None:
+                batch_embeddings = [None] * len(batch)
+                if vector_mode and not vector_failed and dedup.canonical:
+                    with profiler.stage('embed', chunks=len(dedup.canonical)):
+                        vectors = embed_texts([batch[offset] for offset in dedup.canonical], embedder,
+                                              cache=get_embedding_cache(embedder))
+                    for offset, vector in zip(dedup.canonical, vectors):
+                        batch_embeddings[offset] = vector
+            
+            vector_rows = []
+            for offset in dedup.stored:
+                idx = chunk_count + offset
+                section = sections[offset]
+                title = f"{Path(doc_path).stem} - Chunk {idx + 1}"
+                if section is not None and section.section_path:
+                    title = f"{title} - {section.section_path}"[:500]
+                row = (chunk_ids[offset], title, batch[offset], doc_type, batch_keywords[offset], 'document',
+                       source_key)
+                writer.add('knowledge_simple', simple_columns, dedup.row(offset, row))
+                
+                # Linked duplicates reuse the original's embedding
+                if batch_embeddings[offset] and dedup.duplicate_of[offset] is None and not vector_failed:
+                    vector_rows.append(vector_row(chunk_ids[offset], batch[offset], batch_embeddings[offset],
+                                                  doc_path, doc_type, source_key, idx, embedder, section,
+                                                  total_chunks))
+            with profiler.stage('db_write', chunks=len(batch)):
+                writer.flush('knowledge_simple')  # before the skip references to its rows
+                writer.flush()
+            chunk_count += len(batch)
+            
+            if vector_rows and local_store is not None:
+                # Written to the local store only after the commit below
+                local_ids.extend(row[0] for row in vector_rows)
+                local_vectors.extend(parse_vector(row[2]) for row in vector_rows)
+            elif vector_rows:
+                vector_failed = not write_vector_rows(cur, writer, vector_rows)
         
-        conn.commit()
+        if not chunk_count:
+            conn.rollback()
+            if engine is not None:
+                engine.rollback()
+            print(f"⚠️  No text extracted from {doc_path}")
+            return False
+        
+        embedded = writer.stats.rows.get('knowledge_embeddings', 0) + len(local_ids)
+        duplicates = f", {skipped} near-duplicates skipped" if skipped else ''
+        print(f"   ✅ {chunk_count} chunks ({embedded} with embedding, "
+              f"{chunk_count - skipped - embedded} keyword only{duplicates})")
+        print(f"   💾 {writer.stats.summary()}")
+        
+        with profiler.stage('db_write'):
+            if manifest is not None:
+                fingerprint = dict(fingerprint or {})
+                fingerprint.setdefault('content_hash', hash_file(doc_path))
+                if 'size_bytes' not in fingerprint:
+                    stat = os.stat(doc_path)
+                    fingerprint['size_bytes'] = stat.st_size
+                    fingerprint['mtime_ns'] = stat.st_mtime_ns
+                manifest.record(cur, source_key, doc_type, fingerprint, chunk_count)
+            
+            conn.commit()
+        if engine is not None:
+            engine.commit()
+        if local_store is not None:
+            update_local_store(local_store, source_key, local_ids, local_vectors, released)
+        # Invalidate searches that ran while the transaction was open (and the local store was saved)
+        bump_generation(conn)
+        profiler.count(docs=1, chunks=chunk_count, nbytes=os.path.getsize(doc_path))
+        if stats is not None:
+            for table, rows in writer.stats.rows.items():
+                stats.add(table, rows, writer.stats.seconds[table])
         print(f"🎉 Successfully ingested: {doc_path}")
         return True
         
     except Exception as e:
         conn.rollback()
+        if engine is not None:
+            engine.rollback()
         print(f"❌ Error ingesting {doc_path}: {e}")
         return False
     finally:
         cur.close()
-        conn.close()
+        pool.putconn(conn)
+
+def stage_document(doc_path: str, embedder, chunks_file, vectors_file=None) -> int:
+    """
+    Extract, chunk and (with `vectors_file`) embed a document into spool files, returns its chunk count
+
+    Runs before the write transaction, one batch in memory at a time, so
+    neither PDF extraction nor embedding API calls happen while the
+    transaction is open. Batches are appended as pickles; iter_spooled()
+    reads them back.
+    """
+    total = 0
+    for batch in batched(iter_document_chunks(doc_path), EMBEDDING_BATCH_SIZE * EMBEDDING_CONCURRENCY):
+        pickle.dump(batch, chunks_file, protocol=pickle.HIGHEST_PROTOCOL)
+        if vectors_file is not None:
+            with get_profiler().stage('embed', chunks=len(batch)):
+                vectors = embed_texts([chunk_content(chunk) for chunk in batch], embedder,
+                                      cache=get_embedding_cache(embedder))
+            pickle.dump(vectors, vectors_file, protocol=pickle.HIGHEST_PROTOCOL)
+        total += len(batch)
+    return total
+
+def iter_spooled(spool_file) -> Iterator:
+    """Items of the batches written to a spool file by stage_document()"""
+    spool_file.seek(0)
+    while True:
+        try:
+            yield from pickle.load(spool_file)
+        except EOFError:
+            return
 
-def main():
+def ingest_document(doc_path: str, doc_type: str, embedder=None,
+                    source_key: Optional[str] = None, manifest: Optional[IngestManifest] = None,
+                    fingerprint: Optional[dict] = None, batch_size: int = BATCH_SIZE,
+                    stats: Optional[LoadStats] = None) -> bool:
+    """
+    Ingest a single document into knowledge base
+
+    The document is streamed once (pages -> words -> chunks -> embeddings)
+    into temporary spool files, then the spool is streamed into COPY
+    batches, so memory does not grow with document size and the write
+    transaction only covers database work. When `source_key` is given,
+    chunks previously ingested from the same file are replaced in the same
+    transaction and, with a `manifest`, the file's manifest row is updated
+    on commit. Pass `stats` to aggregate throughput over a run.
+    """
+    print(f"📄 Processing: {doc_path}")
+    if not doc_path.endswith(SUPPORTED_EXTENSIONS):
+        print(f"⚠️  Unsupported file type: {doc_path}")
+        return False
+    
+    vector_mode = bool(USE_PGVECTOR and embedder)
+    with tempfile.TemporaryFile() as chunks_file, tempfile.TemporaryFile() as vectors_file:
+        try:
+            total_chunks = stage_document(doc_path, embedder, chunks_file, vectors_file if vector_mode else None)
+        except Exception as e:
+            print(f"❌ Error reading {doc_path}: {e}")
+            return False
+        
+        return write_document(doc_path, doc_type, iter_spooled(chunks_file),
+                              embeddings=iter_spooled(vectors_file) if vector_mode else None,
+                              embedder=embedder, source_key=source_key, manifest=manifest,
+                              fingerprint=fingerprint, batch_size=batch_size, stats=stats,
+                              total_chunks=total_chunks)
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """Number of pages in a PDF"""
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+def extract_pdf_pages(pdf_path: str, start: int, end: int) -> List[str]:
+    """Extract text of pages [start, end) (one page range of a large PDF)"""
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        pages = []
+        for number in range(start, end):
+            text = reader.pages[number].extract_text()
+            if text:
+                pages.append(text)
+        return pages
+
+def ingest_parallel(jobs: List[tuple], workers: int, embedder=None,
+                    manifest: Optional[IngestManifest] = None, batch_size: int = BATCH_SIZE,
+                    stats: Optional[LoadStats] = None) -> List[bool]:
+    """
+    Ingest (source_key, path, doc_type, fingerprint) jobs with a process pool.
+
+    Extraction, chunking and (simple-mode) keywords run in `workers`
+    processes; PDFs with more than PDF_PAGES_PER_TASK pages are split into
+    page ranges. TF-IDF keywords are ranked by the writer, which owns the
+    corpus statistics. Results
+    are written by this process in job order, so chunk numbering is the same
+    as a sequential run, and a failure only affects its own file. Returns
+    one success flag per job.
+    """
+    results = []
+    profiler = get_profiler()
+    # Corpus-level keywords need the shared statistics, so they are ranked by the writer
+    worker_keywords = get_keyword_engine() is None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def submit(job):
+            _, path, _, _ = job
+            try:
+                if path.endswith('.pdf'):
+                    pages = count_pdf_pages(path)
+                    if pages > PDF_PAGES_PER_TASK:
+                        return 'pages', [pool.submit(extract_pdf_pages, path, start,
+                                                     min(start + PDF_PAGES_PER_TASK, pages))
+                                         for start in range(0, pages, PDF_PAGES_PER_TASK)]
+                return 'document', pool.submit(prepare_document, path, worker_keywords)
+            except Exception as e:
+                return 'error', e
+        
+        # Keep a bounded window of documents in flight ahead of the writer
+        remaining = iter(jobs)
+        pending = deque()
+        for job in itertools.islice(remaining, workers * 2):
+            pending.append((job, submit(job)))
+        
+        while pending:
+            job, (kind, handle) = pending.popleft()
+            next_job = next(remaining, None)
+            if next_job is not None:
+                pending.append((next_job, submit(next_job)))
+            
+            source_key, path, doc_type, fingerprint = job
+            print(f"📄 Processing: {path}")
+            try:
+                if kind == 'error':
+                    raise handle
+                if kind == 'pages':
+                    # Time blocked on worker results is 'workers'; their CPU shows up as children_cpu_s
+                    pages = profiler.iter('workers', (page for future in handle for page in future.result()))
+                    chunks = list(profiler.iter('chunk', iter_chunks(iter_words(pages)), chunks=True))
+                    if not chunks:
+                        raise ValueError(f"No text extracted from {path}")
+                    with profiler.stage('workers'):
+                        keywords = (list(pool.map(extract_keywords, chunks, chunksize=64))
+                                    if worker_keywords else None)
+                    prepared = {'chunks': chunks, 'keywords': keywords}
+                else:
+                    with profiler.stage('workers'):
+                        prepared = handle.result()
+            except ValueError as e:
+                print(f"⚠️  {e}")
+                results.append(False)
+                continue
+            except Exception as e:
+                print(f"❌ Error reading {path}: {e}")
+                results.append(False)
+                continue
+            
+            # Embed before opening the transaction so it stays short
+            embeddings = None
+            if USE_PGVECTOR and embedder:
+                with profiler.stage('embed', chunks=len(prepared['chunks'])):
+                    embeddings = embed_texts([chunk_content(chunk) for chunk in prepared['chunks']], embedder,
+                                             cache=get_embedding_cache(embedder))
+            
+            results.append(write_document(path, doc_type, prepared['chunks'], prepared['keywords'],
+                                          embeddings, embedder, source_key, manifest,
+                                          fingerprint, batch_size, stats,
+                                          total_chunks=len(prepared['chunks'])))
+    return results
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Ingest knowledge_base/ documents into PostgreSQL")
+    parser.add_argument('--force', action='store_true',
+                        help="re-ingest every file even if the manifest says it is unchanged")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"rows per COPY batch (default {BATCH_SIZE}, env INGEST_BATCH_SIZE)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes for PDF extraction, chunking and keywords (default 1 = sequential)")
+    parser.add_argument('--rebuild-keywords', action='store_true',
+                        help="recompute TF-IDF statistics from the database and rewrite document keywords")
+    parser.add_argument('--profile', action='store_true',
+                        help="time extract/chunk/keywords/embed/db_write stages and print a report")
+    parser.add_argument('--profile-output', help="write the --profile report as JSON")
+    return parser.parse_args(argv)
+
+def discover_documents(knowledge_base_dir: Path, folders) -> List[tuple]:
+    """List (source_key, path, doc_type) for every PDF/MD file in the document folders"""
+    documents = []
+    for folder_path, doc_type in folders:
+        if not folder_path.exists():
+            print(f"📁 Creating {folder_path}")
+            folder_path.mkdir(exist_ok=True)
+            continue
+        
+        # Find all PDF and MD files
+        files = sorted(list(folder_path.glob('*.pdf')) + list(folder_path.glob('*.md')))
+        
+        if not files:
+            print(f"   ⚠️  No PDF or MD files found in {folder_path}")
+            continue
+        
+        for file_path in files:
+            source_key = file_path.relative_to(knowledge_base_dir).as_posix()
+            documents.append((source_key, str(file_path), doc_type))
+    return documents
+
+def apply_removals(plan: dict, manifest: IngestManifest, vector_mode: bool, vector_table: bool) -> Optional[int]:
+    """
+    Refresh touched fingerprints and drop the chunks of deleted files in one transaction.
+
+    Returns the number of removed files, or None when the transaction failed.
+    """
+    engine = get_keyword_engine()
+    store = get_vector_store() if vector_mode else None
+    pool = get_pool()
+    conn = pool.getconn()
+    cur = conn.cursor()
+    released = ReleasedDuplicates() if _release_duplicates else None
+    if engine is not None:
+        engine.begin()
+    try:
+        # Same content, new stat (e.g. fresh checkout): remember the new fingerprint
+        for source_key, _, _, fingerprint in plan['touched']:
+            manifest.touch(cur, source_key, fingerprint)
+        for source_key in plan['removed']:
+            print(f"🗑️  Removing chunks of deleted file: {source_key}")
+            manifest.forget(cur, source_key, vector_table, engine, released)
+        if released is not None:
+            manifest.mark_stale(cur, released.stale_sources)
+        conn.commit()
+        if engine is not None:
+            engine.commit()
+        if store is not None and plan['removed']:
+            if released is not None:
+                store.adopt(released.promoted)
+            store.remove_sources(plan['removed'])
+            store.save()
+        bump_generation(conn)
+        return len(plan['removed'])
+    except Exception as e:
+        conn.rollback()
+        if engine is not None:
+            engine.rollback()
+        print(f"❌ Error updating manifest: {e}")
+        return None
+    finally:
+        cur.close()
+        pool.putconn(conn)
+
+def reingest_stale(documents: List[tuple], manifest: IngestManifest, embedder=None,
+                   batch_size: int = BATCH_SIZE, stats: Optional[LoadStats] = None) -> List[bool]:
+    """Ingest again the files manifest.mark_stale() flagged (DEDUP_MODE=skip), one success flag each"""
+    results = []
+    for source_key, path, doc_type in documents:
+        if source_key in manifest.stale:
+            print(f"🔁 Re-ingesting {source_key}: chunks it skipped as near-duplicates were deleted")
+            results.append(ingest_document(path, doc_type, embedder, source_key=source_key, manifest=manifest,
+                                           fingerprint=file_fingerprint(path), batch_size=batch_size,
+                                           stats=stats))
+    return results
+
+def main(args: Optional[argparse.Namespace] = None):
     """Main ingestion process"""
+    args = args or parse_args([])
+    started = time.perf_counter()
+    profiler = enable_profiling() if args.profile else get_profiler()
     print("🚀 PCI DSS Knowledge Base Ingestion")
     print("=" * 50)
     
     # Check database connection
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT version()")
-        version = cur.fetchone()[0]
-        print(f"📊 Database: {version}")
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT version()")
+            version = cur.fetchone()[0]
+            print(f"📊 Database: {version}")
         
-        # Check if tables exist
-        cur.execute("""
-            SELECT table_name FROM information_schema.tables 
-            WHERE table_schema = 'public' AND table_name = 'knowledge_simple'
-        """)
-        if not cur.fetchone():
-            print("❌ knowledge_simple table not found. Run database schema first!")
-            return False
+            # Check if tables exist
+            cur.execute("""
+                SELECT table_name FROM information_schema.tables 
+                WHERE table_schema = 'public'
+                  AND table_name IN ('knowledge_simple', 'knowledge_sources', 'knowledge_embeddings')
+            """)
+            tables = {row[0] for row in cur.fetchall()}
+            if 'knowledge_simple' not in tables:
+                print("❌ knowledge_simple table not found. Run database schema first!")
+                return False
+            if 'knowledge_sources' not in tables:
+                print("❌ knowledge_sources table not found. Run database/002_incremental_ingest.sql first!")
+                return False
+        
+            manifest = IngestManifest.load(cur)
+            if dedup_supported(cur):
+                # Links from earlier runs are kept intact even with DEDUP_MODE=off
+                release_duplicates(True)
+                if DEDUP_MODE != 'off':
+                    use_deduplicator(ChunkDeduplicator())
+            elif DEDUP_MODE != 'off':
+                print("⚠️  Near-duplicate detection disabled (run database/006_dedup.sql)")
             
-        cur.close()
-        conn.close()
-        print("✅ Database connection OK")
+            engine = get_keyword_engine()
+            if engine is not None and not args.rebuild_keywords:
+                synced = sync_statistics(conn, engine)
+                if synced is not None:
+                    engine.save()
+                    print(f"🔤 Keyword statistics covered {synced[0]} chunks, database has {synced[1]}: "
+                          f"recounted from knowledge_simple")
+        print(f"✅ Database connection OK ({len(manifest.entries)} files in manifest)")
     except Exception as e:
         print(f"❌ Database check failed: {e}")
         return False
     
-    # Setup OpenAI if vector mode enabled
-    openai_client = setup_openai()
+    # Setup the embedding provider if vector mode enabled
+    embedder = setup_embeddings()
+    if embedder and (VECTOR_BACKEND == 'local' or 'knowledge_embeddings' not in tables):
+        if VECTOR_BACKEND == 'pgvector':
+            print("⚠️  knowledge_embeddings table not found (run database/005_pgvector.sql), using keyword mode")
+            embedder = None
+        else:
+            store = use_local_vectors(embedder)
+            print(f"📦 Storing embeddings in the local vector store ({store.summary()})")
     if USE_PGVECTOR:
-        if openai_client:
-            print("🧠 Vector mode enabled with OpenAI embeddings")
+        if embedder:
+            print(f"🧠 Vector mode enabled with {embedder.name} embeddings ({embedder.model})")
         else:
-            print("⚠️  Vector mode requested but OpenAI unavailable, using keyword mode")
+            print("⚠️  Vector mode requested but no embedding provider available, using keyword mode")
     else:
         print("🔤 Keyword search mode (recommended for hackathon)")
     
@@ -272,61 +817,154 @@ def main():
         (knowledge_base_dir / 'compliance', 'compliance_doc')
     ]
     
-    total_processed = 0
-    total_success = 0
+    documents = discover_documents(knowledge_base_dir, folders)
+    plan = manifest.classify(documents, force=args.force)
+    counts = {'added': 0, 'changed': 0, 'skipped': len(plan['skipped']), 'removed': 0, 'failed': 0}
+    vector_mode = bool(USE_PGVECTOR and embedder)
+    vector_table = vector_mode and get_vector_store() is None
+    load_stats = LoadStats()
     
-    for folder_path, doc_type in folders:
-        if not folder_path.exists():
-            print(f"📁 Creating {folder_path}")
-            folder_path.mkdir(exist_ok=True)
-            continue
-            
-        print(f"\n📂 Processing {folder_path} ({doc_type})")
-        
-        # Find all PDF and MD files
-        files = list(folder_path.glob('*.pdf')) + list(folder_path.glob('*.md'))
-        
-        if not files:
-            print(f"   ⚠️  No PDF or MD files found in {folder_path}")
-            continue
-            
-        for file_path in files:
-            total_processed += 1
-            if ingest_document(str(file_path), doc_type, openai_client):
-                total_success += 1
+    jobs = [(state, job) for state in ('added', 'changed') for job in plan[state]]
+    if args.workers > 1 and jobs:
+        print(f"⚡ Parallel ingestion with {args.workers} worker processes")
+        outcomes = ingest_parallel([job for _, job in jobs], args.workers, embedder,
+                                   manifest, args.batch_size, load_stats)
+    else:
+        outcomes = [ingest_document(path, doc_type, embedder, source_key=source_key,
+                                    manifest=manifest, fingerprint=fingerprint,
+                                    batch_size=args.batch_size, stats=load_stats)
+                    for _, (source_key, path, doc_type, fingerprint) in jobs]
+    for (state, _), ok in zip(jobs, outcomes):
+        if ok:
+            counts[state] += 1
+        else:
+            counts['failed'] += 1
+    
+    if plan['touched'] or plan['removed']:
+        removed = apply_removals(plan, manifest, vector_mode, vector_table)
+        if removed is None:
+            counts['failed'] += len(plan['removed'])
+        else:
+            counts['removed'] = removed
+    
+    # Files that skipped copies of chunks deleted above (DEDUP_MODE=skip) get their text back
+    for ok in reingest_stale(documents, manifest, embedder, args.batch_size, load_stats):
+        counts['changed' if ok else 'failed'] += 1
+    
+    engine = get_keyword_engine()
+    if engine is not None:
+        if counts['added'] or counts['changed'] or counts['removed']:
+            engine.save()
+        if args.rebuild_keywords:
+            try:
+                with connection() as conn:
+                    updated = rebuild_keywords(conn, engine)
+                    conn.commit()
+                    bump_generation(conn)
+                engine.save()
+                print(f"🔤 Rebuilt TF-IDF keywords for {updated} chunks ({len(engine.terms)} terms, "
+                      f"{engine.n_docs} chunks in corpus)")
+            except Exception as e:
+                counts['failed'] += 1
+                print(f"❌ Keyword rebuild failed: {e}")
     
     # Summary
     print("\n" + "=" * 50)
     print(f"📊 Ingestion Summary:")
-    print(f"   • Total files processed: {total_processed}")
-    print(f"   • Successfully ingested: {total_success}")
-    print(f"   • Failed: {total_processed - total_success}")
+    print(f"   • Added: {counts['added']}")
+    print(f"   • Changed: {counts['changed']}")
+    print(f"   • Skipped (unchanged): {counts['skipped']}")
+    print(f"   • Removed: {counts['removed']}")
+    print(f"   • Failed: {counts['failed']}")
+    if vector_mode and get_embedding_cache(embedder) is not None:
+        print(f"   • Embedding cache: {get_embedding_cache(embedder).summary()}")
+    if vector_mode and get_vector_store() is not None:
+        print(f"   • Local vector store: {get_vector_store().summary()}")
+    dedup_savings = None
+    if _release_duplicates and vector_table and (counts['changed'] or counts['removed']):
+        # Replacing or removing originals must not leave their duplicates without an embedding
+        try:
+            with connection() as conn:
+                cur = conn.cursor()
+                problems = verify_dedup(cur)
+                cur.close()
+            if any(problems.values()):
+                print(f"⚠️  Near-duplicate links need attention: {problems} (see scripts/dedup.py verify)")
+        except Exception as e:
+            print(f"⚠️  Could not verify near-duplicate links: {e}")
+    if get_deduplicator() is not None and get_deduplicator().checked:
+        print(f"   • Deduplication: {get_deduplicator().summary()}")
+        try:
+            with connection() as conn:
+                cur = conn.cursor()
+                dedup_savings = get_deduplicator().savings(cur, vector_table)
+                cur.close()
+            print(f"     saved ~{dedup_savings['table_bytes_saved'] / 1024:,.0f} KB table, "
+                  f"~{dedup_savings['index_bytes_saved'] / 1024:,.0f} KB index")
+        except Exception as e:
+            print(f"⚠️  Could not estimate dedup savings: {e}")
+    if load_stats.total_rows:
+        print(f"   • Rows written: {load_stats.total_rows} in {load_stats.total_seconds:.2f}s "
+              f"({load_stats.rows_per_sec():,.0f} rows/s)")
+    print(f"   • Database pool: {get_pool().summary()}")
     
-    if total_success > 0:
+    report = profiler.report() if profiler.enabled else None
+    if report:
+        print(f"\n⏱️  Stage profile ({report['docs']} docs, {report['chunks']} chunks, "
+              f"{report['bytes'] / (1024 * 1024):.1f} MB):")
+        for line in profiler.summary_lines():
+            print(f"   {line}")
+        if args.profile_output:
+            Path(args.profile_output).write_text(json.dumps(report, indent=2))
+            print(f"   📄 Profile saved to {args.profile_output}")
+    
+    # One workflow_logs row per run so ingest regressions show up over time
+    duration_ms = int((time.perf_counter() - started) * 1000)
+    succeeded = counts['added'] + counts['changed'] + counts['removed']
+    status = 'success' if not counts['failed'] else ('partial' if succeeded else 'failed')
+    metadata = {
+        'counts': counts,
+        'workers': args.workers,
+        'embedding_model': embedder.model if vector_mode else None,
+        'rows_written': load_stats.rows,
+        'rows_per_sec': round(load_stats.rows_per_sec(), 1),
+        'dedup': dedup_savings,
+        'profile': report
+    }
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            log_workflow_run(cur, WORKFLOW_NAME, status, duration_ms, metadata,
+                             error_message=f"{counts['failed']} files failed" if counts['failed'] else None)
+            conn.commit()
+            cur.close()
+    except Exception as e:
+        print(f"⚠️  Could not write workflow_logs: {e}")
+    
+    if counts['added'] or counts['changed'] or counts['removed']:
         # Verify ingestion
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT doc_type, COUNT(*) FROM knowledge_simple GROUP BY doc_type")
-            results = cur.fetchall()
+            with connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT doc_type, COUNT(*) FROM knowledge_simple GROUP BY doc_type")
+                results = cur.fetchall()
+                cur.close()
             
             print(f"\n📈 Knowledge Base Contents:")
             for doc_type, count in results:
                 print(f"   • {doc_type}: {count} chunks")
-                
-            cur.close()
-            conn.close()
             
         except Exception as e:
             print(f"⚠️  Could not verify ingestion: {e}")
+    close_pool()
     
     print("\n🎯 Next steps:")
     print("   1. Verify knowledge base content in database")
     print("   2. Test ChatBot knowledge search")
     print("   3. Build n8n workflows")
     
-    return total_success > 0
+    return counts['failed'] == 0
 
 if __name__ == "__main__":
-    success = main()
-    sys.exit(0 if success else 1)
\ No newline at end of file
+    success = main(parse_args())
+    sys.exit(0 if success else 1)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Knowledge Base Ingestion Manifest
+Tracks every ingested source file so re-runs only touch what changed
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+HASH_BLOCK_SIZE = 1024 * 1024  # bytes read per hashing step
+
+
+def hash_file(path: str) -> str:
+    """Compute the sha256 of a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str) -> Dict:
+    """Cheap change indicator (size + mtime) taken from a single stat call"""
+    stat = os.stat(path)
+    return {'size_bytes': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+class IngestManifest:
+    """Per-file ingestion state stored in the knowledge_sources table"""
+
+    def __init__(self, entries: Optional[Dict[str, Dict]] = None):
+        self.entries = entries or {}
+        self.stale = set()  # files to ingest again, see mark_stale()
+
+    @classmethod
+    def load(cls, cur) -> 'IngestManifest':
+        """Read the whole manifest in one round trip"""
+        cur.execute("""
+            SELECT source_file, doc_type, content_hash, size_bytes, mtime_ns, chunk_count
+            FROM knowledge_sources
+        """)
+        entries = {}
+        for source_file, doc_type, content_hash, size_bytes, mtime_ns, chunk_count in cur.fetchall():
+            entries[source_file] = {
+                'doc_type': doc_type,
+                'content_hash': content_hash,
+                'size_bytes': size_bytes,
+                'mtime_ns': mtime_ns,
+                'chunk_count': chunk_count
+            }
+        return cls(entries)
+
+    def classify(self, files: List[Tuple[str, str, str]], force: bool = False) -> Dict[str, List]:
+        """
+        Split discovered files into added/changed/skipped/removed.
+
+        `files` holds (source_key, path, doc_type) tuples. Unchanged size and
+        mtime skip the file after one stat call; otherwise the content hash
+        decides, so a fresh checkout with new mtimes is not re-ingested.
+        Skipped files whose stat changed are returned in `touched` so their
+        fingerprint can be refreshed.
+        """
+        plan = {'added': [], 'changed': [], 'skipped': [], 'touched': [], 'removed': []}
+        seen = set()
+
+        for source_key, path, doc_type in files:
+            seen.add(source_key)
+            fingerprint = file_fingerprint(path)
+            entry = self.entries.get(source_key)
+
+            if entry is None:
+                plan['added'].append((source_key, path, doc_type, fingerprint))
+                continue
+
+            if (not force and
+                    entry['size_bytes'] == fingerprint['size_bytes'] and
+                    entry['mtime_ns'] == fingerprint['mtime_ns'] and
+                    entry['doc_type'] == doc_type):
+                plan['skipped'].append((source_key, path, doc_type, fingerprint))
+                continue
+
+            fingerprint['content_hash'] = hash_file(path)
+            if (not force and
+                    fingerprint['content_hash'] == entry['content_hash'] and
+                    entry['doc_type'] == doc_type):
+                plan['skipped'].append((source_key, path, doc_type, fingerprint))
+                plan['touched'].append((source_key, path, doc_type, fingerprint))
+            else:
+                plan['changed'].append((source_key, path, doc_type, fingerprint))
+
+        plan['removed'] = sorted(key for key in self.entries if key not in seen)
+        return plan
+
+    def record(self, cur, source_key: str, doc_type: str, fingerprint: Dict, chunk_count: int):
+        """Upsert the manifest row for a freshly ingested file"""
+        cur.execute("""
+            INSERT INTO knowledge_sources
+                (source_file, doc_type, content_hash, size_bytes, mtime_ns, chunk_count, ingested_at)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (source_file) DO UPDATE SET
+                doc_type = EXCLUDED.doc_type,
+                content_hash = EXCLUDED.content_hash,
+                size_bytes = EXCLUDED.size_bytes,
+                mtime_ns = EXCLUDED.mtime_ns,
+                chunk_count = EXCLUDED.chunk_count,
+                ingested_at = NOW()
+        """, (
+            source_key,
+            doc_type,
+            fingerprint['content_hash'],
+            fingerprint['size_bytes'],
+            fingerprint['mtime_ns'],
+            chunk_count
+        ))
+        self.entries[source_key] = {
+            'doc_type': doc_type,
+            'content_hash': fingerprint['content_hash'],
+            'size_bytes': fingerprint['size_bytes'],
+            'mtime_ns': fingerprint['mtime_ns'],
+            'chunk_count': chunk_count
+        }
+        self.stale.discard(source_key)
+
+    def touch(self, cur, source_key: str, fingerprint: Dict):
+        """Refresh size/mtime of a file whose content did not change"""
+        cur.execute("""
+            UPDATE knowledge_sources SET size_bytes = %s, mtime_ns = %s
+            WHERE source_file = %s
+        """, (fingerprint['size_bytes'], fingerprint['mtime_ns'], source_key))
+        entry = self.entries.get(source_key)
+        if entry:
+            entry['size_bytes'] = fingerprint['size_bytes']
+            entry['mtime_ns'] = fingerprint['mtime_ns']
+
+    def mark_stale(self, cur, source_keys: Iterable[str]):
+        """
+        Make the next classify() treat files as changed.
+
+        Used for files whose skipped near-duplicate chunks relied on a chunk
+        that was just deleted; the mark commits with the delete.
+        """
+        source_keys = [key for key in source_keys if key in self.entries]
+        if not source_keys:
+            return
+        cur.execute("""
+            UPDATE knowledge_sources SET content_hash = '', mtime_ns = -1
+            WHERE source_file = ANY(%s)
+        """, (source_keys,))
+        for key in source_keys:
+            self.entries[key]['content_hash'] = ''
+            self.entries[key]['mtime_ns'] = -1
+        self.stale.update(source_keys)
+
+    def forget(self, cur, source_key: str, vector_table: bool = False, keyword_engine=None, duplicates=None):
+        """Drop a deleted file and all of its chunks"""
+        delete_source_chunks(cur, source_key, vector_table, keyword_engine, duplicates)
+        cur.execute("DELETE FROM knowledge_sources WHERE source_file = %s", (source_key,))
+        self.entries.pop(source_key, None)
+        self.stale.discard(source_key)
+
+
+def _delete_chunks(cur, where: str, params: tuple, keyword_engine=None, duplicates=None,
+                   vector_table: bool = False) -> int:
+    """
+    DELETE the knowledge_simple rows matching `where`.
+
+    The deleted chunks are taken out of `keyword_engine`'s statistics, and
+    with `duplicates` (dedup.ReleasedDuplicates) their near-duplicates are
+    promoted or flagged for re-ingest first.
+    """
+    if duplicates is not None:
+        duplicates.release(cur, where, params, vector_table)
+    query = f"DELETE FROM knowledge_simple WHERE {where}"
+    if keyword_engine is None:
+        cur.execute(query, params)
+        return cur.rowcount
+    cur.execute(f"{query} RETURNING content", params)
+    contents = [content or '' for (content,) in cur.fetchall()]
+    if contents:
+        keyword_engine.remove(contents)
+    return len(contents)
+
+
+def delete_source_chunks(cur, source_key: str, vector_table: bool = False, keyword_engine=None,
+                         duplicates=None) -> int:
+    """Remove every chunk previously ingested from `source_key`"""
+    deleted = _delete_chunks(cur, "source_file = %s", (source_key,), keyword_engine, duplicates, vector_table)
+    if duplicates is not None:
+        cur.execute("DELETE FROM knowledge_skipped_duplicates WHERE source_file = %s", (source_key,))
+    if vector_table:
+        cur.execute("DELETE FROM knowledge_embeddings WHERE source_file = %s", (source_key,))
+    return deleted
+
+
+def delete_legacy_chunks(cur, doc_path: str, keyword_engine=None, duplicates=None,
+                         vector_table: bool = False) -> int:
+    """
+    Remove chunks written before source_file was tracked.
+
+    Older runs titled chunks '<stem> - Chunk N' and left source_file NULL,
+    so the first manifest-aware run would otherwise duplicate them.
+    """
+    return _delete_chunks(cur, """
+        source_file IS NULL
+          AND source_type = 'document'
+          AND starts_with(title, %s)
+    """, (f"{Path(doc_path).stem} - Chunk ",), keyword_engine, duplicates, vector_table)
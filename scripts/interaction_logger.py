@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Buffered Chat Interaction Logger
+Queues chatbot_queries rows in memory and writes them from a background thread with one COPY per batch
+
+Usage:
+    from interaction_logger import get_interaction_logger
+    get_interaction_logger().log(query, answer, sources, confidence, response_time_ms)
+    ...
+    close_interaction_logger()   # before close_pool(); also runs at exit
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bulk_load import copy_rows
+from db import get_pool
+
+CHAT_LOG_BATCH_SIZE = int(os.getenv('CHAT_LOG_BATCH_SIZE', '100'))  # rows per COPY
+CHAT_LOG_FLUSH_INTERVAL = float(os.getenv('CHAT_LOG_FLUSH_INTERVAL', '1'))  # max seconds a row waits
+CHAT_LOG_QUEUE_SIZE = int(os.getenv('CHAT_LOG_QUEUE_SIZE', '10000'))  # queued rows before back-pressure
+# How long log() may block on a full queue before the record is dropped (0 = drop at once)
+CHAT_LOG_PUT_TIMEOUT = float(os.getenv('CHAT_LOG_PUT_TIMEOUT', '0.5'))
+CHAT_LOG_RETRIES = int(os.getenv('CHAT_LOG_RETRIES', '3'))  # write attempts per batch
+
+TABLE = 'chatbot_queries'
+COLUMNS = ('user_query', 'bot_response', 'sources_used', 'confidence_score', 'response_time_ms', 'created_at')
+
+
+class _Flush:
+    """Queue marker: write everything queued before it, then set `done`"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class InteractionLogger:
+    """
+    Background writer for chatbot_queries.
+
+    log() only appends to a bounded queue, so the database round trip is
+    off the response path. A daemon thread collects up to `batch_size` rows
+    or whatever arrived within `flush_interval` seconds and writes them with
+    one COPY on a pooled connection. When the queue is full, log() blocks for
+    up to `put_timeout` seconds (back-pressure) and then drops the record;
+    drops are counted, never raised. created_at is taken (naive local time,
+    like the column's NOW() default) when log() is called, not when the
+    batch is written. close() waits for blocked log() calls, drains the
+    queue and is registered with atexit by get_interaction_logger().
+    """
+
+    def __init__(self, pool=None, batch_size: int = CHAT_LOG_BATCH_SIZE,
+                 flush_interval: float = CHAT_LOG_FLUSH_INTERVAL, max_queue: int = CHAT_LOG_QUEUE_SIZE,
+                 put_timeout: float = CHAT_LOG_PUT_TIMEOUT, retries: int = CHAT_LOG_RETRIES):
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retries = max(1, retries)
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._closed = False
+        self._putting = 0  # log() calls blocked on a full queue
+        self._idle = threading.Condition(self._lock)
+        self._stats = {'logged': 0, 'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0,
+                       'blocked': 0, 'max_queued': 0, 'write_seconds': 0.0}
+        self._thread = threading.Thread(target=self._run, name='interaction-logger', daemon=True)
+        self._thread.start()
+
+    def log(self, user_query: str, bot_response: str, sources_used=None,
+            confidence_score: Optional[float] = None, response_time_ms: Optional[int] = None,
+            created_at: Optional[datetime] = None) -> bool:
+        """Queue one interaction; False when it was dropped (logger closed or queue still full)"""
+        row = (user_query, bot_response,
+               sources_used if sources_used is None or isinstance(sources_used, str)
+               else json.dumps(sources_used, default=str),
+               confidence_score, response_time_ms, created_at or datetime.now())
+        with self._lock:
+            if self._closed:
+                self._stats['dropped'] += 1
+                return False
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                self._stats['blocked'] += 1
+                if self.put_timeout <= 0:
+                    self._stats['dropped'] += 1
+                    return False
+                self._putting += 1
+            else:
+                self._stats['logged'] += 1
+                self._stats['max_queued'] = max(self._stats['max_queued'], self._queue.qsize())
+                return True
+
+        # Wait for room without the lock so the writer thread can keep updating its stats
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+            queued = True
+        except queue.Full:
+            queued = False
+        with self._lock:
+            self._putting -= 1
+            self._idle.notify_all()
+            self._stats['logged' if queued else 'dropped'] += 1
+            if queued:
+                self._stats['max_queued'] = max(self._stats['max_queued'], self._queue.qsize())
+        return queued
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything logged so far; False if that did not finish within `timeout`"""
+        if not self._thread.is_alive():
+            return self._queue.empty()
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> bool:
+        """Stop accepting records, write the queued ones and stop the thread"""
+        with self._lock:
+            if self._closed:
+                return not self._thread.is_alive()
+            self._closed = True
+            # Let blocked log() calls finish first so no record is queued behind _STOP
+            self._idle.wait_for(lambda: not self._putting)
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return False
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"⚠️  Interaction logger: {self._queue.qsize()} records not written at shutdown")
+            return False
+        return True
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _run(self):
+        batch: List[tuple] = []
+        deadline = 0.0
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0) if batch else None)
+            except queue.Empty:
+                item = None  # flush_interval elapsed
+            if isinstance(item, tuple):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            if batch:
+                self._write(batch)
+                batch = []
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+    def _write(self, batch: List[tuple]):
+        """COPY one batch in its own transaction, retrying with backoff before giving up on it"""
+        for attempt in range(1, self.retries + 1):
+            started = time.perf_counter()
+            try:
+                with (self.pool or get_pool()).connection() as conn:
+                    cur = conn.cursor()
+                    written = copy_rows(cur, TABLE, COLUMNS, batch)
+                    conn.commit()
+                    cur.close()
+            except Exception as e:
+                if attempt == self.retries:
+                    self._count('failed', len(batch))
+                    print(f"❌ Interaction logger: {len(batch)} records lost after {attempt} attempts: {e}")
+                    return
+                time.sleep(min(0.2 * 2 ** (attempt - 1), 2.0))
+                continue
+            with self._lock:
+                self._stats['written'] += written
+                self._stats['batches'] += 1
+                self._stats['write_seconds'] += time.perf_counter() - started
+            return
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        seconds = stats.pop('write_seconds')
+        stats['queued'] = self._queue.qsize()
+        stats['avg_batch'] = round(stats['written'] / stats['batches'], 1) if stats['batches'] else 0.0
+        stats['rows_per_sec'] = round(stats['written'] / seconds, 1) if seconds > 0 else 0.0
+        return stats
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"{stats['written']}/{stats['logged']} written in {stats['batches']} batches "
+                f"(avg {stats['avg_batch']}, {stats['rows_per_sec']:,.0f} rows/s), "
+                f"{stats['queued']} queued, {stats['dropped']} dropped, {stats['failed']} failed")
+
+
+_logger: Optional[InteractionLogger] = None
+_logger_lock = threading.Lock()
+
+
+def get_interaction_logger() -> InteractionLogger:
+    """Process-wide logger on the shared connection pool, drained at interpreter exit"""
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = InteractionLogger()
+            atexit.register(_logger.close)
+        return _logger
+
+
+def close_interaction_logger():
+    """Drain and stop the process-wide logger; call before close_pool()"""
+    global _logger
+    with _logger_lock:
+        logger, _logger = _logger, None
+    if logger is not None:
+        logger.close()
+        atexit.unregister(logger.close)
+
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Corpus-Level Keyword Engine
+Picks the most distinctive terms and bigrams per chunk with TF-IDF over the whole knowledge base
+"""
+
+import itertools
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from bulk_load import copy_rows
+
+KEYWORD_STATS_PATH = os.getenv(
+    'KEYWORD_STATS_PATH',
+    str(Path(__file__).parent.parent / '.cache' / 'keyword_stats.npz')
+)
+MAX_KEYWORDS = 20
+
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have',
+    'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should',
+    'may', 'might', 'must', 'can', 'this', 'that', 'these', 'those'
+})
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[Optional[str]]:
+    """
+    Lowercase word tokens, same filter as the original extract_keywords().
+
+    Dropped tokens are kept as None placeholders so bigrams never join words
+    that were not adjacent in the text.
+    """
+    return [token if (len(token) > 2 and token.isalpha() and token not in STOP_WORDS) else None
+            for token in TOKEN_RE.findall(text.lower())]
+
+
+def chunk_terms(text: str) -> List[str]:
+    """Unigrams plus bigrams of adjacent kept tokens (e.g. 'sql injection')"""
+    tokens = tokenize(text)
+    terms = [token for token in tokens if token]
+    terms.extend(f"{first} {second}" for first, second in zip(tokens, tokens[1:])
+                 if first and second)
+    return terms
+
+
+class KeywordEngine:
+    """
+    Incremental document-frequency table plus vectorized TF-IDF ranking.
+
+    update() folds a batch of chunks into the corpus statistics in one
+    sparse pass and remove() takes deleted chunks out again; top_terms()
+    ranks every term of every chunk in a batch with NumPy and keeps the best
+    `k` per chunk. Between begin() and commit() every change is logged so
+    rollback() can undo the changes of a failed database write. Statistics
+    persist in an .npz file so later ingests keep scoring against the whole
+    corpus.
+    """
+
+    def __init__(self, path: Optional[str] = KEYWORD_STATS_PATH):
+        self.path = path
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.df = np.zeros(1024, dtype=np.int64)
+        self.n_docs = 0
+        self._undo: Optional[List[Tuple[np.ndarray, int]]] = None
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            self.terms = [str(term) for term in data['terms']]
+            df = data['df']
+            self.n_docs = int(data['n_docs'])
+        self.vocab = {term: i for i, term in enumerate(self.terms)}
+        self.df = np.zeros(max(1024, len(self.terms) * 2), dtype=np.int64)
+        self.df[:len(df)] = df
+
+    def save(self, path: Optional[str] = None):
+        """Atomically write the corpus statistics"""
+        path = path or self.path
+        if not path:
+            return
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path,
+                 terms=np.array(self.terms, dtype=str),
+                 df=self.df[:len(self.terms)],
+                 n_docs=np.int64(self.n_docs))
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        """Forget all statistics (before a full rebuild)"""
+        self.vocab = {}
+        self.terms = []
+        self.df = np.zeros(1024, dtype=np.int64)
+        self.n_docs = 0
+        self._undo = None
+
+    def begin(self):
+        """Start logging changes so they can be undone if the matching database transaction fails"""
+        self._undo = []
+
+    def commit(self):
+        """Keep the changes since begin()"""
+        self._undo = None
+
+    def rollback(self):
+        """Undo the changes since begin()"""
+        undo, self._undo = self._undo or [], None
+        for cols, n_chunks in reversed(undo):
+            self._add_df(cols, n_chunks)
+
+    def _matrix(self, chunks: Sequence[str], grow: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sparse (row, term id, count) triplets for a batch of chunks"""
+        rows: List[int] = []
+        cols: List[int] = []
+        vocab, terms = self.vocab, self.terms
+        for row, chunk in enumerate(chunks):
+            if grow:
+                ids = [vocab.setdefault(term, len(vocab)) for term in chunk_terms(chunk)]
+                added = len(vocab) - len(terms)
+                if added:
+                    # New terms are the most recently inserted dict keys, in id order
+                    terms.extend(reversed(list(itertools.islice(reversed(vocab), added))))
+            else:
+                ids = [term_id for term_id in map(vocab.get, chunk_terms(chunk)) if term_id is not None]
+            cols.extend(ids)
+            rows.extend([row] * len(ids))
+
+        if not cols:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+
+        width = len(self.terms)
+        keys = np.asarray(rows, dtype=np.int64) * width + np.asarray(cols, dtype=np.int64)
+        unique, counts = np.unique(keys, return_counts=True)
+        return unique // width, unique % width, counts
+
+    def _grow_df(self):
+        if len(self.terms) > len(self.df):
+            df = np.zeros(len(self.terms) * 2, dtype=np.int64)
+            df[:len(self.df)] = self.df
+            self.df = df
+
+    def _add_df(self, cols: np.ndarray, n_chunks: int):
+        """Count (or with a negative `n_chunks`, uncount) the term ids of a batch"""
+        self._grow_df()
+        counts = np.bincount(cols, minlength=len(self.terms))
+        if n_chunks < 0:
+            counts = -counts
+        self.df[:len(self.terms)] += counts
+        self.n_docs += n_chunks
+        if self._undo is not None:
+            self._undo.append((cols, -n_chunks))
+
+    def update(self, chunks: Sequence[str]):
+        """Add a batch of chunks to the document frequencies"""
+        _, cols, _ = self._matrix(chunks, grow=True)
+        self._add_df(cols, len(chunks))
+
+    def remove(self, chunks: Sequence[str]):
+        """Take deleted chunks out of the document frequencies"""
+        _, cols, _ = self._matrix(chunks, grow=False)
+        self._add_df(cols, -len(chunks))
+
+    def _rank(self, rows: np.ndarray, cols: np.ndarray, counts: np.ndarray,
+              n_chunks: int, k: int) -> List[List[str]]:
+        """Keep the `k` best TF-IDF terms per row of a sparse batch"""
+        keywords: List[List[str]] = [[] for _ in range(n_chunks)]
+        if not len(rows):
+            return keywords
+
+        # Removing chunks that were never counted (e.g. rows from before the engine) can undershoot
+        df = np.maximum(self.df[cols], 0)
+        idf = np.log((1.0 + max(self.n_docs, 0)) / (1.0 + df)) + 1.0
+        scores = (1.0 + np.log(counts)) * idf
+
+        # Sort by row, then score descending (term id breaks ties deterministically)
+        order = np.lexsort((cols, -scores, rows))
+        rows, cols = rows[order], cols[order]
+        starts = np.searchsorted(rows, np.arange(n_chunks))
+        rank = np.arange(len(rows)) - starts[rows]
+        keep = rank < k
+        for row, col in zip(rows[keep].tolist(), cols[keep].tolist()):
+            keywords[row].append(self.terms[col])
+        return keywords
+
+    def top_terms(self, chunks: Sequence[str], k: int = MAX_KEYWORDS) -> List[List[str]]:
+        """The `k` highest TF-IDF terms of each chunk, best first"""
+        rows, cols, counts = self._matrix(chunks, grow=False)
+        return self._rank(rows, cols, counts, len(chunks), k)
+
+    def extract(self, chunks: Sequence[str], k: int = MAX_KEYWORDS) -> List[List[str]]:
+        """Fold new chunks into the corpus statistics, then rank their terms"""
+        rows, cols, counts = self._matrix(chunks, grow=True)
+        self._add_df(cols, len(chunks))
+        return self._rank(rows, cols, counts, len(chunks), k)
+
+
+def _iter_batches(conn, query: str, batch_size: int) -> Iterable[List[tuple]]:
+    """Stream a query through a server-side cursor"""
+    cur = conn.cursor(name='keyword_rebuild')
+    cur.itersize = batch_size
+    cur.execute(query)
+    try:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+
+
+def recount_statistics(conn, engine: KeywordEngine, batch_size: int = 2000) -> int:
+    """Replace the engine's statistics with a count of every knowledge_simple chunk, returns the chunk count"""
+    engine.reset()
+    for rows in _iter_batches(conn, "SELECT content FROM knowledge_simple", batch_size):
+        engine.update([content or '' for (content,) in rows])
+    return engine.n_docs
+
+
+def sync_statistics(conn, engine: KeywordEngine, batch_size: int = 2000) -> Optional[Tuple[int, int]]:
+    """
+    Recount the statistics when their chunk count differs from knowledge_simple.
+
+    The .npz file is local to one host, so another host's ingest, rows
+    added by n8n or a wiped .cache/ leave it out of step with the database.
+    Returns (stored count, database count) when it recounted, else None;
+    the caller saves the engine.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM knowledge_simple")
+    chunks = cur.fetchone()[0]
+    cur.close()
+    if chunks == engine.n_docs:
+        return None
+    stored = engine.n_docs
+    recount_statistics(conn, engine, batch_size)
+    return stored, chunks
+
+
+def rebuild_keywords(conn, engine: KeywordEngine, batch_size: int = 2000, k: int = MAX_KEYWORDS) -> int:
+    """
+    Recompute corpus statistics from knowledge_simple and rewrite document keywords.
+
+    Pass one streams every chunk into the document frequencies; pass two
+    ranks the terms of each ingested document chunk and applies them with one
+    COPY into a temp table plus a single UPDATE. Manually curated rows
+    (seed data, evidence) keep their keywords. The caller commits.
+    """
+    recount_statistics(conn, engine, batch_size)
+
+    cur = conn.cursor()
+    cur.execute("CREATE TEMP TABLE tmp_chunk_keywords (id UUID PRIMARY KEY, keywords TEXT[]) ON COMMIT DROP")
+    updated = 0
+    for rows in _iter_batches(conn, "SELECT id, content FROM knowledge_simple WHERE source_type = 'document'",
+                              batch_size):
+        keywords = engine.top_terms([content or '' for _, content in rows], k)
+        updated += copy_rows(cur, 'tmp_chunk_keywords', ('id', 'keywords'),
+                             ((row_id, terms) for (row_id, _), terms in zip(rows, keywords)))
+    cur.execute("""
+        UPDATE knowledge_simple k SET keywords = t.keywords
+        FROM tmp_chunk_keywords t
+        WHERE k.id = t.id
+    """)
+    cur.close()
+    return updated
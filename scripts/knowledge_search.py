@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Cached Knowledge Search
+Ranked search_knowledge() results behind an LRU/TTL cache invalidated by the knowledge base generation
+
+Usage:
+    python3 scripts/knowledge_search.py "sql injection prevention" "pci requirement 6"
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+import psycopg2
+
+from db import close_pool, get_pool
+from embeddings import EMBEDDING_PROVIDER, EmbeddingProvider, format_vector, get_embedding_provider
+from vector_store import LocalVectorStore
+
+SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', '256'))  # cached queries
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '300'))  # seconds
+# How often knowledge_generation is re-read; hits in between never touch the pool (0 = on every lookup)
+SEARCH_GENERATION_CHECK = float(os.getenv('SEARCH_GENERATION_CHECK', '1'))
+HNSW_EF_SEARCH = int(os.getenv('HNSW_EF_SEARCH', '40'))  # HNSW candidate list per vector query
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '50'))  # rows taken from each ranking before fusion
+LATENCY_SAMPLES = 1000
+
+RESULT_COLUMNS = ('title', 'content', 'doc_type', 'source_type', 'relevance')
+
+
+class _Uncached(list):
+    """Results returned by a fetch but kept out of the cache (degraded, e.g. the query embedding failed)"""
+
+
+def normalize_query(query: str) -> str:
+    """Cache key and search text: lowercase, single spaces"""
+    return ' '.join((query or '').lower().split())
+
+
+class KnowledgeSearch:
+    """
+    search_knowledge() with a bounded LRU cache of normalized query -> results.
+
+    Entries expire after `ttl` seconds and are dropped as soon as the
+    knowledge base generation (advanced by a trigger on knowledge_simple,
+    see database/004_knowledge_generation.sql) moves past the one they were
+    computed at. The generation is re-read at most every
+    `generation_check` seconds, so hits in between are served without a
+    pooled connection. Without 004 the cache falls back to TTL only.
+    """
+
+    def __init__(self, pool=None, max_entries: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL,
+                 generation_check: float = SEARCH_GENERATION_CHECK):
+        self.pool = pool or get_pool()
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.generation_check = generation_check
+        self._entries: 'OrderedDict[tuple, tuple]' = OrderedDict()  # (query, limit) -> (generation, expires, results)
+        self._lock = threading.Lock()
+        self._generation: Optional[int] = None
+        self._generation_checked = 0.0
+        self._generation_supported = True
+        self._hit_ms = deque(maxlen=LATENCY_SAMPLES)
+        self._miss_ms = deque(maxlen=LATENCY_SAMPLES)
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _read_generation(self, cur) -> Optional[int]:
+        if not self._generation_supported:
+            return None
+        try:
+            cur.execute("SELECT generation FROM knowledge_generation")
+            row = cur.fetchone()
+            return row[0] if row else None
+        except psycopg2.Error:
+            cur.connection.rollback()
+            self._generation_supported = False
+            print("⚠️  knowledge_generation not found (run database/004_knowledge_generation.sql), "
+                  "search cache uses TTL only")
+            return None
+
+    def _current_generation(self, cur, force: bool = False) -> Optional[int]:
+        """Knowledge base generation, re-read at most every `generation_check` seconds"""
+        now = time.monotonic()
+        if force or self._generation is None or now - self._generation_checked >= self.generation_check:
+            generation = self._read_generation(cur)
+            with self._lock:
+                if generation != self._generation and self._generation is not None:
+                    self.invalidations += len(self._entries)
+                    self._entries.clear()
+                self._generation = generation
+                self._generation_checked = now
+        return self._generation
+
+    def _generation_fresh(self) -> bool:
+        """True while the last generation read is recent enough to serve hits without the database"""
+        if not self._generation_supported:
+            return True
+        return (self._generation is not None and
+                time.monotonic() - self._generation_checked < self.generation_check)
+
+    def _lookup(self, key: tuple, generation: Optional[int]) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry_generation, expires, results = entry
+            if entry_generation != generation or time.monotonic() >= expires:
+                del self._entries[key]
+                self.expired += 1
+                return None
+            self._entries.move_to_end(key)
+            return results
+
+    def _store(self, key: tuple, generation: Optional[int], results: List[Dict]):
+        with self._lock:
+            self._entries[key] = (generation, time.monotonic() + self.ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _run(self, cur, statement: str, params: tuple) -> List[Dict]:
+        self.pool.execute_prepared(cur, statement, params)
+        return [dict(zip(RESULT_COLUMNS, row)) for row in cur.fetchall()]
+
+    def _hit(self, started: float, results: List[Dict]) -> List[Dict]:
+        with self._lock:
+            self.hits += 1
+            self._hit_ms.append((time.perf_counter() - started) * 1000)
+        return results
+
+    def _cached(self, key: tuple, fetch) -> List[Dict]:
+        """Serve `key` from the cache or compute it with fetch(cur) (only called on a miss)"""
+        started = time.perf_counter()
+        if self._generation_fresh():
+            results = self._lookup(key, self._generation)
+            if results is not None:
+                return self._hit(started, results)
+
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            try:
+                generation = self._current_generation(cur)
+                results = self._lookup(key, generation)
+                if results is not None:
+                    return self._hit(started, results)
+
+                results = fetch(cur)
+                if isinstance(results, _Uncached):
+                    results = list(results)  # degraded: returned, never cached
+                elif not self._generation_supported:
+                    self._store(key, None, results)
+                elif self._current_generation(cur, force=True) == generation:
+                    # Re-read above so a change that landed during the query is not cached under the old generation
+                    self._store(key, generation, results)
+            finally:
+                cur.close()
+        with self._lock:
+            self.misses += 1
+            self._miss_ms.append((time.perf_counter() - started) * 1000)
+        return results
+
+    def search(self, query: str, limit: int = 5) -> List[Dict]:
+        """Ranked knowledge chunks for `query` (dicts with RESULT_COLUMNS keys)"""
+        text = normalize_query(query)
+        return self._cached((text, limit), lambda cur: self._run(cur, 'knowledge_search', (text, limit)))
+
+    def hybrid(self, query: str, embedder: Optional[EmbeddingProvider] = None, limit: int = 5,
+               ef_search: int = HNSW_EF_SEARCH) -> List[Dict]:
+        """
+        hybrid_search_knowledge(): HNSW kNN and keyword search fused by reciprocal rank.
+
+        The query is embedded only on a cache miss, with the same provider
+        that embedded the chunks. Without a provider (or if embedding fails)
+        the SQL function returns the keyword ranking; after a failed
+        embedding that ranking is returned but not cached.
+        Requires database/005_pgvector.sql.
+        """
+        text = normalize_query(query)
+
+        def fetch(cur):
+            embedding = self._embed(text, embedder)
+            results = self._run(cur, 'hybrid_search', (text, embedding and format_vector(embedding), limit,
+                                                       ef_search, max(HYBRID_CANDIDATES, limit)))
+            return _Uncached(results) if embedder and embedding is None else results
+
+        return self._cached(('hybrid', text, limit, ef_search, embedder and embedder.model), fetch)
+
+    def semantic(self, query: str, embedder: EmbeddingProvider, store=None, limit: int = 5) -> List[Dict]:
+        """
+        Cosine kNN over the local vector store (hosts without pgvector).
+
+        Matching ids are resolved against knowledge_simple with one primary
+        key lookup; `relevance` is the cosine similarity.
+        """
+        store = store or get_local_vector_store(embedder)
+        text = normalize_query(query)
+
+        def fetch(cur):
+            store.reload()
+            embedding = self._embed(text, embedder)
+            if embedding is None:
+                return _Uncached()
+            matches = store.search([embedding], limit)[0]
+            if not matches:
+                return []
+            self.pool.execute_prepared(cur, 'knowledge_by_ids', ([row_id for row_id, _ in matches],))
+            rows = {str(row[0]): row[1:] for row in cur.fetchall()}
+            return [dict(zip(RESULT_COLUMNS, rows[row_id] + (round(similarity, 6),)))
+                    for row_id, similarity in matches if row_id in rows]
+
+        return self._cached(('semantic', text, limit, embedder.model), fetch)
+
+    @staticmethod
+    def _embed(text: str, embedder: Optional[EmbeddingProvider]) -> Optional[List[float]]:
+        if not embedder:
+            return None
+        try:
+            return list(embedder.embed([text])[0])
+        except Exception as e:
+            print(f"⚠️  Query embedding failed: {e}")
+            return None
+
+    def invalidate(self):
+        """Drop every cached result"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        """Hit rate, cache size and hit/miss latency"""
+        with self._lock:
+            hit_ms, miss_ms = sorted(self._hit_ms), sorted(self._miss_ms)
+            lookups = self.hits + self.misses
+            entries = len(self._entries)
+        def percentile(samples: List[float], p: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'expired': self.expired,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+            'generation': self._generation,
+            'hit_ms_p50': percentile(hit_ms, 0.50),
+            'hit_ms_p95': percentile(hit_ms, 0.95),
+            'miss_ms_p50': percentile(miss_ms, 0.50),
+            'miss_ms_p95': percentile(miss_ms, 0.95)
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+                f"hit p50 {stats['hit_ms_p50']}ms / miss p50 {stats['miss_ms_p50']}ms")
+
+
+def bump_generation(conn) -> bool:
+    """
+    Move the knowledge base generation forward, dropping cached results everywhere.
+
+    Call after COMMIT of a transaction that spanned several statements:
+    the trigger's nextval() is visible before the commit, so a query in
+    between could cache old rows under the new generation. Also for changes
+    outside knowledge_simple, e.g. the local vector store saved after the
+    ingest commit. False when 004_knowledge_generation.sql has not been
+    applied.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT nextval('knowledge_generation_seq')")
+        conn.commit()
+        return True
+    except psycopg2.Error:
+        conn.rollback()
+        return False
+    finally:
+        cur.close()
+
+
+_local_stores: Dict[tuple, LocalVectorStore] = {}
+
+
+def get_local_vector_store(embedder: EmbeddingProvider) -> LocalVectorStore:
+    """Process-wide LocalVectorStore for the provider's vector space (files written by ingest_knowledge_base.py)"""
+    key = (embedder.model, embedder.dimensions)
+    if key not in _local_stores:
+        _local_stores[key] = LocalVectorStore(dimensions=embedder.dimensions, model=embedder.model)
+    return _local_stores[key]
+
+
+def get_query_embedder(openai_client=None) -> Optional[EmbeddingProvider]:
+    """Query-side provider matching ingest (EMBEDDING_PROVIDER); None leaves hybrid() keyword-only"""
+    if EMBEDDING_PROVIDER == 'openai' and openai_client is None and os.getenv('OPENAI_API_KEY'):
+        try:
+            from openai import OpenAI
+            openai_client = OpenAI()
+        except ImportError:
+            return None
+    return get_embedding_provider(openai_client)
+
+
+_search: Optional[KnowledgeSearch] = None
+_search_lock = threading.Lock()
+
+
+def get_search() -> KnowledgeSearch:
+    """Process-wide cached search on the shared connection pool"""
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = KnowledgeSearch()
+        return _search
+
+
+def search_knowledge(query: str, limit: int = 5) -> List[Dict]:
+    """Shortcut for get_search().search()"""
+    return get_search().search(query, limit)
+
+
+def main():
+    queries = sys.argv[1:] or ['sql injection prevention', 'pci requirement 6']
+    search = get_search()
+    try:
+        for query in queries + queries:
+            results = search.search(query)
+            print(f"\n🔍 '{query}': {len(results)} results")
+            for result in results:
+                print(f"   • {result['title'][:60]} ({result['doc_type']}, {result['relevance']:.3f})")
+        print(f"\n📊 Search cache: {search.summary()}")
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Bulk Findings Loader
+Normalizes Snyk issues, streams them with COPY into a staging table and upserts `findings` in one statement
+
+Usage:
+    python3 scripts/load_findings.py --input snyk-issues.json
+    curl ... | python3 scripts/load_findings.py --input - --json     # n8n "Execute Command" step
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from bulk_load import copy_rows
+from db import close_pool, connection
+from stage_profiler import log_workflow_run
+
+WORKFLOW_NAME = 'Snyk Findings Load'
+SEVERITIES = ('critical', 'high', 'medium', 'low')
+RISK_SCORES = {'critical': 9, 'high': 7, 'medium': 5, 'low': 3}
+# Same fallback mapping as "Format Analysis Results" in pci-automation-workflow.json
+CWE_REQUIREMENTS = {'CWE-89': '6.5.1', 'CWE-79': '6.5.7', 'CWE-338': '6.5.3'}
+DEFAULT_REQUIREMENT = '6.5.6'
+DEFAULT_REPO = 'unknown-repo'
+
+FINDING_COLUMNS = ('finding_id', 'repo_name', 'severity', 'title', 'description', 'fix_suggestion',
+                   'affected_file', 'line_number', 'cwe_id', 'pci_requirement', 'risk_score', 'status')
+# Staged next to FINDING_COLUMNS: raw Snyk issue (True) or "Format Analysis Results" item (False)
+STAGING_COLUMNS = FINDING_COLUMNS + ('from_snyk',)
+# Replaced only when the input has a value, so a partial analyzed item does not blank out scanner data
+MERGED_COLUMNS = ('repo_name', 'severity', 'title', 'description', 'fix_suggestion', 'affected_file',
+                  'line_number', 'cwe_id', 'pci_requirement', 'risk_score')
+
+
+def _text(value, limit: Optional[int] = None) -> Optional[str]:
+    if value is None or value == '':
+        return None
+    text = str(value)
+    return text[:limit] if limit else text
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _severity(value) -> str:
+    severity = str(value or '').lower()
+    return severity if severity in SEVERITIES else 'medium'
+
+
+def normalize_snyk_issue(issue: Dict, repo: Optional[str] = None) -> Dict:
+    """
+    Snyk REST issue ({id, attributes: {...}}) -> findings row, mapped like "Parse Snyk Response".
+
+    pci_requirement is only the CWE fallback; load_findings() never lets it
+    replace a requirement that is already stored (mapped by the AI step).
+    """
+    attrs = issue.get('attributes') or {}
+    problems = attrs.get('problems') or [{}]
+    source = problems[0].get('source') or {}
+    cwe_id = next((item.get('id') for item in attrs.get('classes') or []
+                   if str(item.get('id', '')).startswith('CWE-')), 'CWE-unknown')
+    severity = _severity(attrs.get('effective_severity_level') or attrs.get('severity'))
+    return {
+        'finding_id': issue.get('id'),
+        'repo_name': attrs.get('project_name') or repo or DEFAULT_REPO,
+        'severity': severity,
+        'title': attrs.get('title') or 'Security Issue',
+        'description': attrs.get('description') or 'Security vulnerability detected by Snyk',
+        'fix_suggestion': None,
+        'affected_file': source.get('file_path') or 'unknown',
+        'line_number': _int(source.get('start_line')) or 0,
+        'cwe_id': cwe_id,
+        'pci_requirement': CWE_REQUIREMENTS.get(cwe_id, DEFAULT_REQUIREMENT),
+        'risk_score': RISK_SCORES[severity],
+        'status': 'resolved' if attrs.get('status') == 'resolved' else 'open',
+        'from_snyk': True
+    }
+
+
+def normalize_analyzed_finding(finding: Dict, repo: Optional[str] = None) -> Dict:
+    """Output item of "Format Analysis Results" (finding_id, evidence: {repo, file, line}) -> findings row"""
+    evidence = finding.get('evidence') or {}
+    severity = _severity(finding.get('severity'))
+    risk_score = _int(finding.get('risk_score'))
+    return {
+        'finding_id': finding.get('finding_id'),
+        'repo_name': evidence.get('repo') or finding.get('repo_name') or repo or DEFAULT_REPO,
+        'severity': severity,
+        'title': finding.get('title'),
+        'description': finding.get('description'),
+        'fix_suggestion': finding.get('fix_suggestion'),
+        'affected_file': evidence.get('file') or finding.get('affected_file'),
+        'line_number': _int(evidence.get('line', finding.get('line_number'))),
+        'cwe_id': finding.get('cwe_id'),
+        'pci_requirement': finding.get('pci_requirement'),
+        'risk_score': min(max(risk_score, 1), 10) if risk_score is not None else RISK_SCORES[severity],
+        'status': 'open',
+        'from_snyk': False
+    }
+
+
+def iter_issues(payload) -> Iterator[Dict]:
+    """
+    Issues of a Snyk response ({"data": [...]}, also when "data" is the raw
+    JSON string n8n's HTTP node returns), a list, or n8n items ({"json": ...})
+    """
+    if isinstance(payload, dict) and 'data' in payload:
+        payload = payload['data']
+        if isinstance(payload, str):
+            payload = json.loads(payload)
+            payload = payload.get('data', payload) if isinstance(payload, dict) else payload
+    if isinstance(payload, dict):
+        payload = [payload]
+    for item in payload or []:
+        if isinstance(item, dict) and isinstance(item.get('json'), dict):
+            item = item['json']
+        if isinstance(item, dict):
+            yield item
+
+
+def normalize(payload, repo: Optional[str] = None) -> Iterator[tuple]:
+    """STAGING_COLUMNS rows of every issue with an id (both Snyk and analyzed shapes)"""
+    for issue in iter_issues(payload):
+        finding = (normalize_snyk_issue(issue, repo) if 'attributes' in issue
+                   else normalize_analyzed_finding(issue, repo))
+        if not finding['finding_id']:
+            continue
+        yield (
+            _text(finding['finding_id'], 255),
+            _text(finding['repo_name'], 255),
+            finding['severity'],
+            _text(finding['title'], 500),
+            _text(finding['description']),
+            _text(finding['fix_suggestion']),
+            _text(finding['affected_file'], 500),
+            finding['line_number'],
+            _text(finding['cwe_id'], 50),
+            _text(finding['pci_requirement'], 50),
+            finding['risk_score'],
+            finding['status'],
+            finding['from_snyk']
+        )
+
+
+def _merge_sql(from_snyk: bool) -> str:
+    """Upsert of the staged rows of one source; a Snyk row's CWE fallback only fills a missing requirement"""
+    merged = {column: f"COALESCE(EXCLUDED.{column}, findings.{column})" for column in MERGED_COLUMNS}
+    if from_snyk:
+        merged['pci_requirement'] = "COALESCE(findings.pci_requirement, EXCLUDED.pci_requirement)"
+    # Snyk can close an issue; workflow states (in_progress, verified) are not overwritten otherwise
+    resolved = "EXCLUDED.status = 'resolved' AND findings.status IN ('open', 'in_progress')"
+    columns = ', '.join(FINDING_COLUMNS)
+    return f"""
+        WITH merged AS (
+            INSERT INTO findings ({columns})
+            SELECT {columns}
+            FROM (
+                SELECT DISTINCT ON (finding_id) *
+                FROM findings_staging
+                ORDER BY finding_id, seq DESC
+            ) latest
+            WHERE {'' if from_snyk else 'NOT '}from_snyk
+            ON CONFLICT (finding_id) DO UPDATE SET
+                {', '.join(f"{column} = {value}" for column, value in merged.items())},
+                status = CASE WHEN {resolved} THEN 'resolved' ELSE findings.status END
+            WHERE ({', '.join(f"findings.{column}" for column in merged)})
+                  IS DISTINCT FROM ({', '.join(merged.values())})
+               OR ({resolved})
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM merged
+    """
+
+
+def load_findings(cur, rows: Iterable[tuple]) -> Dict:
+    """
+    COPY rows into a temporary staging table and merge them into `findings`.
+
+    Unchanged findings are not rewritten (no dead tuples, updated_at kept);
+    a finding listed twice keeps its last occurrence. Raw Snyk issues and
+    analyzed findings are merged by separate statements so a Snyk reload
+    keeps the stored pci_requirement. The caller commits.
+    """
+    started = time.perf_counter()
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS findings_staging
+            (seq BIGSERIAL, LIKE findings INCLUDING DEFAULTS, from_snyk BOOLEAN NOT NULL)
+        ON COMMIT DELETE ROWS
+    """)
+    cur.execute("TRUNCATE findings_staging")
+    copy_started = time.perf_counter()
+    staged = copy_rows(cur, 'findings_staging', STAGING_COLUMNS, rows)
+    copy_seconds = time.perf_counter() - copy_started
+
+    merge_started = time.perf_counter()
+    inserted = updated = 0
+    for from_snyk in (False, True):
+        cur.execute(_merge_sql(from_snyk))
+        source_inserted, source_updated = cur.fetchone()
+        inserted += source_inserted
+        updated += source_updated
+    merge_seconds = time.perf_counter() - merge_started
+    seconds = time.perf_counter() - started
+
+    cur.execute("SELECT COUNT(DISTINCT finding_id) FROM findings_staging")
+    distinct = cur.fetchone()[0]
+    return {
+        'staged': staged,
+        'inserted': inserted,
+        'updated': updated,
+        'unchanged': distinct - inserted - updated,
+        'duplicates_in_input': staged - distinct,
+        'copy_s': round(copy_seconds, 4),
+        'merge_s': round(merge_seconds, 4),
+        'duration_ms': int(seconds * 1000),
+        'rows_per_sec': round(staged / seconds, 1) if seconds > 0 else 0.0
+    }
+
+
+def read_payload(path: str):
+    if path == '-':
+        return json.load(sys.stdin)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def record_failure(error: str, received: int, execution_id: Optional[str], log) -> bool:
+    """
+    Log a failed load to workflow_logs on a fresh pooled connection.
+
+    The connection the load ran on may be dropped or stuck in a broken COPY,
+    so it is not reused; a failure here is reported but never raised.
+    """
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            log_workflow_run(cur, WORKFLOW_NAME, 'failed', 0, {'received': received},
+                             error_message=error, execution_id=execution_id)
+            conn.commit()
+            cur.close()
+        return True
+    except Exception as e:
+        log(f"⚠️  Could not record the failure in workflow_logs: {e}")
+        return False
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Bulk load Snyk issues into findings (COPY + upsert)")
+    parser.add_argument('--input', default='-', help="Snyk issues JSON file, '-' for stdin (default)")
+    parser.add_argument('--repo', help=f"repo_name when the issue has none (default {DEFAULT_REPO})")
+    parser.add_argument('--execution-id', help="n8n execution id for the workflow_logs row")
+    parser.add_argument('--json', action='store_true', help="print the result as one JSON object (for n8n)")
+    args = parser.parse_args()
+
+    log = (lambda message: print(message, file=sys.stderr)) if args.json else print
+    rows: List[tuple] = []
+    try:
+        try:
+            rows = list(normalize(read_payload(args.input), args.repo))
+            log(f"📥 {len(rows)} findings to load")
+            with connection() as conn:
+                cur = conn.cursor()
+                result = load_findings(cur, rows)
+                log_workflow_run(cur, WORKFLOW_NAME, 'success', result['duration_ms'], result,
+                                 execution_id=args.execution_id, findings_processed=result['staged'])
+                conn.commit()
+                cur.close()
+        except Exception as e:
+            log(f"❌ Findings load failed: {e}")
+            record_failure(str(e), len(rows), args.execution_id, log)
+            if args.json:
+                print(json.dumps({'status': 'failed', 'error': str(e)}))
+            return False
+    finally:
+        close_pool()
+
+    log(f"✅ {result['inserted']} inserted, {result['updated']} updated, {result['unchanged']} unchanged "
+        f"({result['staged']} rows @ {result['rows_per_sec']:,.0f} rows/s; "
+        f"COPY {result['copy_s']:.3f}s, merge {result['merge_s']:.3f}s)")
+    if args.json:
+        print(json.dumps({'status': 'success', **result}))
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Log Partition Maintenance
+Pre-creates future monthly partitions of chatbot_queries/workflow_logs and drops (or detaches) expired ones;
+rows parked in the DEFAULT partition are moved into their month when it is created
+
+Usage:
+    python3 scripts/maintain_partitions.py                 # run daily or at least monthly (cron / n8n)
+    python3 scripts/maintain_partitions.py --dry-run       # show what would change, roll back
+    python3 scripts/maintain_partitions.py --detach        # keep expired months as standalone tables for archiving
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from db import close_pool, connection
+from stage_profiler import log_workflow_run
+
+WORKFLOW_NAME = 'Partition Maintenance'
+MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+# Full months kept behind the current one; PCI DSS 10.5.1 asks for 12 months of audit trail history
+RETENTION_MONTHS = {
+    'chatbot_queries': int(os.getenv('CHATBOT_QUERIES_RETENTION_MONTHS', '12')),
+    'workflow_logs': int(os.getenv('WORKFLOW_LOGS_RETENTION_MONTHS', '12')),
+}
+MIN_AUDIT_RETENTION_MONTHS = 12
+PARTITION_SUFFIX_RE = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month `months` after (or before) `month`"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def is_partitioned(cur, table: str) -> bool:
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+                (table,))
+    return cur.fetchone()[0]
+
+
+def list_partitions(cur, table: str) -> List[Tuple[str, date]]:
+    """(partition name, first day of its month) of the monthly partitions, oldest first"""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (table,))
+    partitions = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_SUFFIX_RE.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def default_rows(cur, table: str) -> int:
+    """Rows left in the DEFAULT partition, i.e. outside every monthly range"""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{table}_default",))
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute(f'SELECT COUNT(*) FROM "{table}_default"')
+    return cur.fetchone()[0]
+
+
+def expired_partitions(partitions: List[Tuple[str, date]], retention_months: int,
+                       today: Optional[date] = None) -> List[str]:
+    """Partitions whose whole month lies before the retention window"""
+    cutoff = add_months((today or date.today()).replace(day=1), -retention_months)
+    return [name for name, month in partitions if add_months(month, 1) <= cutoff]
+
+
+def maintain_table(cur, table: str, months_ahead: int, retention_months: int, detach: bool) -> Dict:
+    """
+    Create upcoming partitions and remove expired ones for one table; the caller commits.
+
+    ensure_monthly_partitions() moves rows of a new month out of the DEFAULT
+    partition; whatever is left there falls outside the created range.
+    """
+    cur.execute("SELECT ensure_monthly_partitions(%s, date_trunc('month', NOW())::date, %s)",
+                (table, months_ahead))
+    created = cur.fetchone()[0]
+    expired = expired_partitions(list_partitions(cur, table), retention_months)
+    for name in expired:
+        cur.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+        if not detach:
+            cur.execute(f'DROP TABLE "{name}"')
+    partitions = list_partitions(cur, table)
+    return {
+        'created': created,
+        'detached' if detach else 'dropped': expired,
+        'partitions': len(partitions),
+        'default_rows': default_rows(cur, table),
+        'range': f"{partitions[0][1]:%Y-%m}..{partitions[-1][1]:%Y-%m}" if partitions else None,
+        'retention_months': retention_months
+    }
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Monthly partition maintenance for chatbot_queries and workflow_logs")
+    parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD,
+                        help=f"future months to pre-create (default {MONTHS_AHEAD}, env PARTITION_MONTHS_AHEAD)")
+    parser.add_argument('--retention-months', type=int,
+                        help="override the per-table retention (env CHATBOT_QUERIES_/WORKFLOW_LOGS_RETENTION_MONTHS)")
+    parser.add_argument('--detach', action='store_true',
+                        help="detach expired partitions instead of dropping them (archive with pg_dump -t, then drop)")
+    parser.add_argument('--dry-run', action='store_true', help="report the changes and roll them back")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = {}
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            for table, retention in RETENTION_MONTHS.items():
+                retention = args.retention_months or retention
+                if retention < MIN_AUDIT_RETENTION_MONTHS:
+                    print(f"⚠️  {table}: {retention} months retention is below the "
+                          f"{MIN_AUDIT_RETENTION_MONTHS} months PCI DSS expects for audit trails")
+                if not is_partitioned(cur, table):
+                    print(f"❌ {table} is not partitioned. Run database/008_partition_logs.sql first!")
+                    conn.rollback()
+                    return False
+                results[table] = result = maintain_table(cur, table, args.months_ahead, retention, args.detach)
+                removed = result.get('dropped', result.get('detached'))
+                print(f"🗂️  {table}: {result['created']} partitions created, "
+                      f"{len(removed)} {'detached' if args.detach else 'dropped'}"
+                      f"{' (' + ', '.join(removed) + ')' if removed else ''}; "
+                      f"{result['partitions']} partitions {result['range']}")
+                if result['default_rows']:
+                    print(f"⚠️  {table}: {result['default_rows']} rows in {table}_default outside every monthly "
+                          f"partition (check created_at, or raise --months-ahead)")
+
+            if args.dry_run:
+                conn.rollback()
+                print("🔍 Dry run, nothing changed")
+            else:
+                log_workflow_run(cur, WORKFLOW_NAME, 'success', int((time.perf_counter() - started) * 1000),
+                                 results)
+                conn.commit()
+            cur.close()
+        return True
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Structure-Aware Markdown Chunking
+Splits Markdown along headings, lists and code blocks into chunks of a token budget, keeping the section path
+
+Usage:
+    python3 scripts/markdown_chunker.py knowledge_base/compliance/pci-dss-requirement-6-summary.md --max-tokens 400
+"""
+
+import argparse
+import math
+import os
+import re
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+MD_CHUNK_TOKENS = int(os.getenv('MD_CHUNK_TOKENS', '400'))  # token budget per chunk
+MD_MIN_TOKENS = int(os.getenv('MD_MIN_TOKENS', '80'))  # smaller sections are merged with the next one
+SECTION_SEPARATOR = ' > '
+
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+FENCE_RE = re.compile(r'^\s*(```+|~~~+)')
+LIST_ITEM_RE = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+INLINE_MARKUP_RE = re.compile(r'[*_`]+')
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:  # not installed, or the BPE file cannot be downloaded
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """cl100k_base token count with tiktoken, otherwise the ~4 characters per token estimate"""
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 4)
+
+
+class MarkdownChunk(NamedTuple):
+    """One chunk of a Markdown document and the headings it sits under"""
+    text: str
+    section_path: str  # e.g. "6.2 Management of Vulnerabilities > 6.2.4 Injection"
+    tokens: int
+
+
+class _Block(NamedTuple):
+    kind: str  # 'heading', 'code', 'list' or 'text'
+    text: str
+    path: Tuple[str, ...]
+
+
+def _heading_title(text: str) -> str:
+    return INLINE_MARKUP_RE.sub('', text).strip()
+
+
+def iter_blocks(lines: Iterable[str]) -> Iterator[_Block]:
+    """
+    Group Markdown lines into heading, fenced code, list and paragraph blocks.
+
+    Each block carries the titles of the headings above it. The level-1
+    heading is left out of the path: it names the document, which the
+    chunk title already does.
+    """
+    headings: List[Tuple[int, str]] = []
+    current: List[str] = []
+    kind = None
+    fence = None
+
+    def path() -> Tuple[str, ...]:
+        return tuple(title for level, title in headings if level > 1)
+
+    def flush() -> Optional[_Block]:
+        nonlocal current, kind
+        block = _Block(kind, ''.join(current).rstrip('\n'), path()) if current else None
+        current, kind = [], None
+        return block
+
+    for line in lines:
+        if not line.endswith('\n'):
+            line += '\n'
+        if fence is not None:
+            current.append(line)
+            if line.strip().startswith(fence):
+                fence = None
+                yield flush()
+            continue
+
+        fence_match = FENCE_RE.match(line)
+        if fence_match:
+            block = flush()
+            if block:
+                yield block
+            fence = fence_match.group(1)
+            kind = 'code'
+            current.append(line)
+            continue
+
+        heading = HEADING_RE.match(line)
+        if heading:
+            block = flush()
+            if block:
+                yield block
+            level = len(heading.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, _heading_title(heading.group(2))))
+            yield _Block('heading', line.rstrip('\n'), path())
+            continue
+
+        if not line.strip():
+            # A blank line ends a paragraph; lists may have blank lines between items
+            if kind == 'text':
+                yield flush()
+            elif kind == 'list':
+                current.append(line)
+            continue
+
+        is_item = LIST_ITEM_RE.match(line) is not None
+        if kind == 'list' and not is_item and not line[0].isspace() and current[-1] == '\n':
+            yield flush()  # paragraph after a list
+        elif kind == 'text' and is_item:
+            yield flush()
+        if kind is None:
+            kind = 'list' if is_item else 'text'
+        current.append(line)
+
+    block = flush()
+    if block:
+        yield block
+
+
+def _split_words(text: str, max_tokens: int) -> Iterator[str]:
+    """Last resort for a single line or sentence over the budget"""
+    piece: List[str] = []
+    for word in text.split():
+        if piece and count_tokens(' '.join(piece + [word])) > max_tokens:
+            yield ' '.join(piece)
+            piece = []
+        piece.append(word)
+    if piece:
+        yield ' '.join(piece)
+
+
+def split_block(block: _Block, max_tokens: int) -> Iterator[str]:
+    """
+    Pieces of a block over the budget: code by lines (each piece re-fenced),
+    lists by items, paragraphs by sentences, and words as a last resort.
+    """
+    if block.kind == 'code':
+        lines = block.text.split('\n')
+        opening = lines[0]
+        closing = lines[-1] if len(lines) > 1 and FENCE_RE.match(lines[-1]) else ''
+        body = lines[1:-1] if closing else lines[1:]
+        wrap = count_tokens(f"{opening}\n{closing or opening.strip()[:3]}")
+        units = body
+        join, budget = '\n', max(max_tokens - wrap, 1)
+    elif block.kind == 'list':
+        units = re.split(r'\n(?=\s*(?:[-*+]|\d+[.)])\s+)', block.text)
+        join, budget = '\n', max_tokens
+    else:
+        units = SENTENCE_RE.split(block.text)
+        join, budget = ' ', max_tokens
+
+    pieces: List[str] = []
+    size = 0
+    for unit in units:
+        tokens = count_tokens(unit)
+        if tokens > budget:
+            if pieces:
+                yield join.join(pieces)
+                pieces, size = [], 0
+            for part in _split_words(unit, budget):
+                yield (f"{opening}\n{part}\n{closing or opening.strip()[:3]}"
+                       if block.kind == 'code' else part)
+            continue
+        if pieces and size + tokens > budget:
+            text = join.join(pieces)
+            yield f"{opening}\n{text}\n{closing or opening.strip()[:3]}" if block.kind == 'code' else text
+            pieces, size = [], 0
+        pieces.append(unit)
+        size += tokens
+    if pieces:
+        text = join.join(pieces)
+        yield f"{opening}\n{text}\n{closing or opening.strip()[:3]}" if block.kind == 'code' else text
+
+
+def _common_path(paths: List[Tuple[str, ...]]) -> Tuple[str, ...]:
+    common = paths[0] if paths else ()
+    for path in paths[1:]:
+        length = 0
+        while length < min(len(common), len(path)) and common[length] == path[length]:
+            length += 1
+        common = common[:length]
+    return common
+
+
+def iter_markdown_chunks(lines: Iterable[str], max_tokens: int = MD_CHUNK_TOKENS,
+                         min_tokens: int = MD_MIN_TOKENS) -> Iterator[MarkdownChunk]:
+    """
+    Pack Markdown blocks into chunks of at most `max_tokens` tokens.
+
+    A heading starts a new chunk once the current one has `min_tokens`,
+    so short sibling sections are merged (the chunk's path is then their
+    common parent) instead of becoming fragments; top-level sections are
+    never merged. Code blocks, list items and sentences are only split when
+    they alone exceed the budget, and a chunk that continues a section
+    repeats its heading line. `lines` is consumed lazily: memory is bounded
+    by one chunk plus one block.
+    """
+    parts: List[Tuple[str, Tuple[str, ...], int, bool]] = []  # (text, path, tokens, is_body)
+    headings = {}  # path -> heading line, repeated at the top of continuation chunks
+
+    def size() -> int:
+        return sum(tokens for _, _, tokens, _ in parts)
+
+    def has_body() -> bool:
+        return any(body for _, _, _, body in parts)
+
+    def emit(path: Optional[Tuple[str, ...]] = None) -> MarkdownChunk:
+        """Chunk of the pending parts; trailing headings (or the heading of `path`) open the next one"""
+        carry = []
+        while parts and not parts[-1][3]:
+            carry.insert(0, parts.pop())
+        if not carry and path in headings:
+            carry = [(headings[path], path, count_tokens(headings[path]), False)]
+        text = '\n\n'.join(part[0] for part in parts)
+        path = _common_path([part[1] for part in parts if part[3]])
+        chunk = MarkdownChunk(text, SECTION_SEPARATOR.join(path), count_tokens(text))
+        parts[:] = carry
+        return chunk
+
+    for block in iter_blocks(lines):
+        tokens = count_tokens(block.text)
+        if block.kind == 'heading':
+            if has_body() and (size() >= min_tokens or size() + tokens > max_tokens
+                               or not _common_path([part[1] for part in parts if part[3]] + [block.path])):
+                yield emit()
+            headings[block.path] = block.text
+            parts.append((block.text, block.path, tokens, False))
+            continue
+
+        if size() + tokens > max_tokens and has_body():
+            yield emit(block.path)
+        if size() + tokens <= max_tokens:
+            parts.append((block.text, block.path, tokens, True))
+            continue
+
+        # The block alone is over the budget (after the pending headings)
+        for piece in split_block(block, max(max_tokens - size(), 1)):
+            piece_tokens = count_tokens(piece)
+            if has_body() and size() + piece_tokens > max_tokens:
+                yield emit(block.path)
+            parts.append((piece, block.path, piece_tokens, True))
+    if has_body():
+        yield emit()
+
+
+def chunk_markdown(text: str, max_tokens: int = MD_CHUNK_TOKENS) -> List[MarkdownChunk]:
+    """Chunks of a whole Markdown string"""
+    return list(iter_markdown_chunks(text.splitlines(keepends=True), max_tokens))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how a Markdown file is chunked")
+    parser.add_argument('path')
+    parser.add_argument('--max-tokens', type=int, default=MD_CHUNK_TOKENS)
+    args = parser.parse_args()
+
+    with open(args.path, 'r', encoding='utf-8') as f:
+        chunks = list(iter_markdown_chunks(f, args.max_tokens))
+    for number, chunk in enumerate(chunks, 1):
+        print(f"#{number:<3} {chunk.tokens:>5} tokens  {chunk.section_path or '(document)'}")
+    total = sum(chunk.tokens for chunk in chunks)
+    print(f"\n{len(chunks)} chunks, {total} tokens, "
+          f"{total / len(chunks) if chunks else 0:.0f} tokens/chunk "
+          f"({'tiktoken cl100k_base' if _encoding is not None else 'estimated'})")
+
+
+if __name__ == "__main__":
+    main()
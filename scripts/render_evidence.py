@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Batch Evidence Package Renderer
+Renders evidence packages for many findings from one template and COPYs them (plus knowledge entries) in one transaction
+
+Usage:
+    python3 scripts/render_evidence.py PCI-1712345678-abcde PCI-1712345679-fghij
+    python3 scripts/render_evidence.py --all                       # every finding without a package yet
+    echo '[{"finding_id": "..."}]' | python3 scripts/render_evidence.py --input - --json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from string import Template
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bulk_load import BulkWriter, LoadStats
+from db import close_pool, connection
+from knowledge_search import bump_generation
+from stage_profiler import log_workflow_run
+
+WORKFLOW_NAME = 'Evidence Render'
+RENDER_BATCH_SIZE = int(os.getenv('RENDER_BATCH_SIZE', '1000'))  # findings fetched and COPYed per round trip
+SCAN_TOOL = 'Snyk Code'
+MAX_KEYWORDS = 15  # same cut-off as "Prepare Knowledge Base Entry"
+
+# Same document as "Format Analysis Results" in pci-automation-workflow.json, parsed once
+EVIDENCE_TEMPLATE = Template("""# Security Finding Evidence Package
+
+**Finding ID:** $finding_id
+**Severity:** $severity
+**PCI DSS Requirement:** $pci_requirement
+**Risk Score:** $risk_score/10
+
+## Vulnerability Details
+- **Repository:** $repo_name
+- **File:** $affected_file:$line_number
+- **CWE:** $cwe_id
+- **Scan Tool:** $scan_tool
+- **Discovery Date:** $discovered_at
+
+## Description
+$description
+
+## Recommended Fix
+```
+$fix_suggestion
+```
+
+## Compliance Impact
+This vulnerability affects PCI DSS $pci_requirement compliance and must be addressed according to risk-based prioritization.
+
+---
+*Generated by DOKU PCI Compliance Automation*
+*Timestamp: $generated_at*""")
+
+FINDING_COLUMNS = ('finding_id', 'repo_name', 'severity', 'title', 'description', 'fix_suggestion',
+                   'affected_file', 'line_number', 'cwe_id', 'pci_requirement', 'risk_score', 'created_at')
+EVIDENCE_COLUMNS = ('finding_id', 'evidence_document', 'compliance_metadata')
+KNOWLEDGE_COLUMNS = ('title', 'content', 'doc_type', 'keywords', 'source_type', 'source_file')
+NON_WORD_RE = re.compile(r'[^a-z0-9\s]')
+
+
+def knowledge_source(finding_id: str) -> str:
+    """knowledge_simple.source_file of a finding's entry, so a re-render replaces it"""
+    return f"finding:{finding_id}"
+
+
+def finding_keywords(text: str) -> List[str]:
+    """First unique words over two characters, like "Prepare Knowledge Base Entry" """
+    keywords = []
+    for word in NON_WORD_RE.sub(' ', text.lower()).split():
+        if len(word) > 2 and word not in keywords:
+            keywords.append(word)
+            if len(keywords) == MAX_KEYWORDS:
+                break
+    return keywords
+
+
+def render_finding(finding: Dict, generated_at: str) -> Tuple[tuple, tuple]:
+    """(evidence_packages row, knowledge_simple row) of one finding"""
+    values = {column: '' if value is None else value for column, value in finding.items()}
+    created_at = finding.get('created_at')
+    values.update(
+        scan_tool=SCAN_TOOL,
+        discovered_at=created_at.isoformat() if isinstance(created_at, datetime) else values['created_at'],
+        generated_at=generated_at
+    )
+    metadata = {
+        'severity': finding['severity'],
+        'pci_requirement': finding['pci_requirement'],
+        'cwe_id': finding['cwe_id'],
+        'repo': finding['repo_name'],
+        'file': finding['affected_file'],
+        'line': finding['line_number'],
+        'risk_score': finding['risk_score'],
+        'generated_at': generated_at
+    }
+    search_text = f"{values['title']} - {values['description']} - Fix: {values['fix_suggestion']}"
+    evidence_row = (finding['finding_id'], EVIDENCE_TEMPLATE.substitute(values), metadata)
+    knowledge_row = (f"Security Finding: {values['title']}"[:500], search_text, 'evidence',
+                     finding_keywords(search_text), 'evidence_package', knowledge_source(finding['finding_id']))
+    return evidence_row, knowledge_row
+
+
+def _select_sql(finding_ids: Optional[List[str]], force: bool) -> Tuple[str, tuple]:
+    conditions, params = [], []
+    if finding_ids is not None:
+        conditions.append("f.finding_id = ANY(%s)")
+        params.append(finding_ids)
+    if not force:
+        conditions.append("NOT EXISTS (SELECT 1 FROM evidence_packages e WHERE e.finding_id = f.finding_id)")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return (f"SELECT {', '.join('f.' + column for column in FINDING_COLUMNS)} FROM findings f {where} "
+            f"ORDER BY f.finding_id", tuple(params))
+
+
+def render_evidence(conn, finding_ids: Optional[List[str]] = None, force: bool = False,
+                    batch_size: int = RENDER_BATCH_SIZE) -> Dict:
+    """
+    Render and store evidence packages for `finding_ids` (None = all findings).
+
+    Findings are read through a server-side cursor `batch_size` at a time;
+    each batch is rendered and written with one COPY per table, then the
+    next batch is fetched, so memory stays bounded by one batch. Findings
+    that already have a package are skipped unless `force`; the knowledge
+    entry of a rendered finding replaces its previous one. Everything runs
+    in the caller's transaction; the caller commits.
+    """
+    started = time.perf_counter()
+    generated_at = datetime.now(timezone.utc).isoformat()
+    stats = LoadStats()
+    writer = BulkWriter(conn.cursor(), batch_size, stats)
+    rendered = 0
+    render_seconds = 0.0
+
+    query, params = _select_sql(finding_ids, force)
+    findings = conn.cursor(name='evidence_findings')
+    findings.itersize = batch_size
+    findings.execute(query, params)
+    while True:
+        rows = findings.fetchmany(batch_size)
+        if not rows:
+            break
+        render_started = time.perf_counter()
+        rendered_rows = [render_finding(dict(zip(FINDING_COLUMNS, row)), generated_at) for row in rows]
+        render_seconds += time.perf_counter() - render_started
+
+        writer.cur.execute("DELETE FROM knowledge_simple WHERE source_file = ANY(%s)",
+                           ([knowledge_source(row[0]) for row in rows],))
+        for evidence_row, knowledge_row in rendered_rows:
+            writer.add('evidence_packages', EVIDENCE_COLUMNS, evidence_row)
+            writer.add('knowledge_simple', KNOWLEDGE_COLUMNS, knowledge_row)
+        writer.flush()
+        rendered += len(rows)
+    findings.close()
+    writer.cur.close()
+
+    seconds = time.perf_counter() - started
+    return {
+        'rendered': rendered,
+        'requested': len(finding_ids) if finding_ids is not None else None,
+        'evidence_rows': stats.rows.get('evidence_packages', 0),
+        'knowledge_rows': stats.rows.get('knowledge_simple', 0),
+        'render_s': round(render_seconds, 4),
+        'copy_s': round(stats.total_seconds, 4),
+        'duration_ms': int(seconds * 1000),
+        'findings_per_sec': round(rendered / seconds, 1) if seconds > 0 else 0.0
+    }
+
+
+def read_finding_ids(path: str) -> List[str]:
+    """Finding ids from a JSON list of ids / findings / n8n items, or one id per line"""
+    if path == '-':
+        text = sys.stdin.read()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    try:
+        payload = json.loads(text)
+    except json.JSONDecodeError:
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    ids = []
+    for item in payload if isinstance(payload, list) else [payload]:
+        if isinstance(item, dict):
+            item = (item.get('json') if isinstance(item.get('json'), dict) else item).get('finding_id')
+        if item:
+            ids.append(str(item))
+    return ids
+
+
+def unique(ids: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(ids))
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Render evidence packages for a batch of findings")
+    parser.add_argument('finding_ids', nargs='*', help="finding ids to render")
+    parser.add_argument('--input', help="JSON (ids, findings or n8n items) or one id per line; '-' for stdin")
+    parser.add_argument('--all', action='store_true', help="render every finding (without a package, see --force)")
+    parser.add_argument('--force', action='store_true',
+                        help="also render findings that already have a package (adds a new package version)")
+    parser.add_argument('--batch-size', type=int, default=RENDER_BATCH_SIZE,
+                        help=f"findings per fetch/COPY round (default {RENDER_BATCH_SIZE}, env RENDER_BATCH_SIZE)")
+    parser.add_argument('--execution-id', help="n8n execution id for the workflow_logs row")
+    parser.add_argument('--json', action='store_true', help="print the result as one JSON object (for n8n)")
+    args = parser.parse_args()
+
+    log = (lambda message: print(message, file=sys.stderr)) if args.json else print
+    finding_ids = None
+    if not args.all:
+        finding_ids = unique(list(args.finding_ids) + (read_finding_ids(args.input) if args.input else []))
+        if not finding_ids:
+            parser.error("pass finding ids, --input or --all")
+
+    try:
+        with connection() as conn:
+            try:
+                result = render_evidence(conn, finding_ids, args.force, max(1, args.batch_size))
+                cur = conn.cursor()
+                log_workflow_run(cur, WORKFLOW_NAME, 'success', result['duration_ms'], result,
+                                 execution_id=args.execution_id, findings_processed=result['rendered'])
+                conn.commit()
+                bump_generation(conn)  # the knowledge entries were written over several statements
+            except Exception as e:
+                conn.rollback()
+                log(f"❌ Evidence render failed: {e}")
+                cur = conn.cursor()
+                log_workflow_run(cur, WORKFLOW_NAME, 'failed', 0, {'requested': len(finding_ids or [])},
+                                 error_message=str(e), execution_id=args.execution_id)
+                conn.commit()
+                if args.json:
+                    print(json.dumps({'status': 'failed', 'error': str(e)}))
+                return False
+            cur.close()
+    finally:
+        close_pool()
+
+    skipped = (result['requested'] or 0) - result['rendered'] if finding_ids is not None else 0
+    log(f"✅ {result['rendered']} evidence packages rendered"
+        f"{f', {skipped} skipped (already packaged or unknown)' if skipped else ''} "
+        f"@ {result['findings_per_sec']:,.0f} findings/s (render {result['render_s']:.3f}s, "
+        f"COPY {result['copy_s']:.3f}s)")
+    if args.json:
+        print(json.dumps({'status': 'success', **result}))
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Per-Stage Profiler
+Wall time, CPU time, peak RSS and throughput per pipeline stage, reported as JSON and to workflow_logs
+"""
+
+import json
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+WORKFLOW_LOG_COLUMNS = ('workflow_name', 'execution_id', 'status', 'error_message', 'duration_ms',
+                        'findings_processed', 'metadata')
+
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """Peak resident set size (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StageProfiler:
+    """
+    Accumulates exclusive wall/CPU time per named stage.
+
+    Stages nest: time spent in an inner stage (e.g. 'extract' pulled by the
+    'chunk' iterator) is not counted again in the outer one, so the stage
+    times add up to the profiled total. Growth of the process peak RSS is
+    charged to the stage that caused it. A disabled profiler's stage() and
+    iter() are pass-throughs, so call sites can stay instrumented.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.stages: Dict[str, Dict] = {}
+        self.totals = {'docs': 0, 'chunks': 0, 'bytes': 0}  # end-to-end work, see count()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._started_children_cpu = self._children_cpu()
+
+    @staticmethod
+    def _children_cpu() -> float:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def _stage(self, name: str) -> Dict:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'docs': 0, 'chunks': 0,
+                                         'bytes': 0, 'rss_growth_mb': 0.0, 'peak_rss_mb': 0.0}
+        return stage
+
+    def add(self, name: str, docs: int = 0, chunks: int = 0, nbytes: int = 0):
+        """Credit work items to a stage (throughput is derived from these)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            stage = self._stage(name)
+            stage['docs'] += docs
+            stage['chunks'] += chunks
+            stage['bytes'] += nbytes
+
+    def count(self, docs: int = 0, chunks: int = 0, nbytes: int = 0):
+        """Credit end-to-end work (overall docs/s, chunks/s and MB/s)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.totals['docs'] += docs
+            self.totals['chunks'] += chunks
+            self.totals['bytes'] += nbytes
+
+    @contextmanager
+    def _timed(self, name: str, docs: int, chunks: int, nbytes: int):
+        stack = self._local.__dict__.setdefault('stack', [])
+        frame = [0.0, 0.0]  # wall and CPU spent in nested stages
+        stack.append(frame)
+        rss_before = _peak_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            stack.pop()
+            if stack:
+                stack[-1][0] += wall
+                stack[-1][1] += cpu
+            rss_after = _peak_rss_mb()
+            with self._lock:
+                stage = self._stage(name)
+                stage['calls'] += 1
+                stage['wall_s'] += wall - frame[0]
+                stage['cpu_s'] += cpu - frame[1]
+                stage['docs'] += docs
+                stage['chunks'] += chunks
+                stage['bytes'] += nbytes
+                stage['rss_growth_mb'] += rss_after - rss_before
+                stage['peak_rss_mb'] = max(stage['peak_rss_mb'], rss_after)
+
+    def stage(self, name: str, docs: int = 0, chunks: int = 0, nbytes: int = 0):
+        """`with profiler.stage('embed', chunks=len(batch)):`"""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name, docs, chunks, nbytes)
+
+    def iter(self, name: str, iterable: Iterable, chunks: bool = False,
+             size: Optional[Callable] = None) -> Iterator:
+        """
+        Charge the time spent producing each item of a (lazy) iterable to `name`.
+
+        Each item counts as one chunk when `chunks` is set; `size(item)` is
+        added to the stage's byte count.
+        """
+        if not self.enabled:
+            return iter(iterable)
+        return self._iter(name, iter(iterable), chunks, size)
+
+    def _iter(self, name, iterator, chunks, size):
+        while True:
+            with self._timed(name, 0, 0, 0):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            self.add(name, chunks=1 if chunks else 0, nbytes=size(item) if size else 0)
+            yield item
+
+    def report(self) -> Dict:
+        """Per-stage and total wall/CPU/RSS with docs/s, chunks/s and MB/s"""
+        wall = time.perf_counter() - self._started_wall
+        cpu = time.process_time() - self._started_cpu
+        children_cpu = self._children_cpu() - self._started_children_cpu
+
+        def rates(item: Dict, seconds: float) -> Dict:
+            if seconds <= 0:
+                return {'docs_per_s': 0.0, 'chunks_per_s': 0.0, 'mb_per_s': 0.0}
+            return {'docs_per_s': round(item['docs'] / seconds, 2),
+                    'chunks_per_s': round(item['chunks'] / seconds, 1),
+                    'mb_per_s': round(item['bytes'] / seconds / (1024 * 1024), 3)}
+
+        with self._lock:
+            stages = {}
+            for name, stage in self.stages.items():
+                stages[name] = {
+                    'calls': stage['calls'],
+                    'wall_s': round(stage['wall_s'], 4),
+                    'cpu_s': round(stage['cpu_s'], 4),
+                    'share': round(stage['wall_s'] / wall, 4) if wall > 0 else 0.0,
+                    'docs': stage['docs'],
+                    'chunks': stage['chunks'],
+                    'bytes': stage['bytes'],
+                    'rss_growth_mb': round(stage['rss_growth_mb'], 1),
+                    'peak_rss_mb': round(stage['peak_rss_mb'], 1),
+                    **rates(stage, stage['wall_s'])
+                }
+            totals = dict(self.totals)
+        return {
+            'wall_s': round(wall, 4),
+            'cpu_s': round(cpu, 4),
+            'children_cpu_s': round(children_cpu, 4),
+            'peak_rss_mb': round(_peak_rss_mb(), 1),
+            'children_peak_rss_mb': round(_peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            **totals,
+            **rates(totals, wall),
+            'stages': stages
+        }
+
+    def summary_lines(self) -> Iterator[str]:
+        """One printable line per stage, slowest first"""
+        report = self.report()
+        for name, stage in sorted(report['stages'].items(), key=lambda item: -item[1]['wall_s']):
+            yield (f"{name:<10} {stage['wall_s']:>8.3f}s wall {stage['cpu_s']:>8.3f}s cpu "
+                   f"{stage['share']:>6.1%}  {stage['chunks_per_s']:>9,.1f} chunks/s "
+                   f"{stage['mb_per_s']:>7.2f} MB/s  +{stage['rss_growth_mb']:.1f} MB peak RSS")
+        yield (f"{'total':<10} {report['wall_s']:>8.3f}s wall {report['cpu_s']:>8.3f}s cpu "
+               f"(+{report['children_cpu_s']:.3f}s workers), peak RSS {report['peak_rss_mb']} MB")
+
+
+_profiler = StageProfiler()
+
+
+def get_profiler() -> StageProfiler:
+    """Process-wide profiler (disabled until enable_profiling())"""
+    return _profiler
+
+
+def enable_profiling() -> StageProfiler:
+    """Start a fresh, enabled process-wide profiler"""
+    global _profiler
+    _profiler = StageProfiler(enabled=True)
+    return _profiler
+
+
+def log_workflow_run(cur, workflow_name: str, status: str, duration_ms: int, metadata: Dict,
+                     error_message: Optional[str] = None, execution_id: Optional[str] = None,
+                     findings_processed: Optional[int] = None):
+    """Insert one workflow_logs row (status: 'success', 'failed' or 'partial'); caller commits"""
+    cur.execute(f"""
+        INSERT INTO workflow_logs ({', '.join(WORKFLOW_LOG_COLUMNS)})
+        VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb)
+    """, (workflow_name, execution_id, status, error_message, duration_ms, findings_processed,
+          json.dumps(metadata, default=str)))
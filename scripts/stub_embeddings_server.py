@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenAI embeddings endpoint
+Returns deterministic vectors so ingestion can be exercised without an API key
+
+Usage:
+    python3 scripts/stub_embeddings_server.py --port 8089 --latency-ms 200
+    export OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=stub
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_DIMENSIONS = 1536  # text-embedding-3-small
+
+
+def stub_vector(text: str, dimensions: int) -> list:
+    """Deterministic unit-length pseudo embedding derived from the text"""
+    rng = random.Random(hashlib.sha256(text.encode('utf-8')).digest())
+    vector = [rng.uniform(-1.0, 1.0) for _ in range(dimensions)]
+    norm = sum(value * value for value in vector) ** 0.5 or 1.0
+    return [value / norm for value in vector]
+
+
+class EmbeddingsHandler(BaseHTTPRequestHandler):
+    """Implements POST /v1/embeddings with the OpenAI response shape"""
+
+    dimensions = DEFAULT_DIMENSIONS
+    latency = 0.0
+    lock = threading.Lock()
+    requests = 0
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/embeddings'):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        inputs = payload.get('input', [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = payload.get('dimensions') or self.dimensions
+
+        cls = type(self)
+        with cls.lock:
+            cls.requests += 1
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            if cls.latency:
+                time.sleep(cls.latency)
+            body = json.dumps({
+                'object': 'list',
+                'model': payload.get('model', 'stub'),
+                'data': [
+                    {'object': 'embedding', 'index': i, 'embedding': stub_vector(text, dimensions)}
+                    for i, text in enumerate(inputs)
+                ],
+                'usage': {'prompt_tokens': 0, 'total_tokens': 0}
+            }).encode('utf-8')
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        cls = type(self)
+        print(f"🧪 {self.command} {self.path} | requests={cls.requests} max_in_flight={cls.max_in_flight}")
+
+
+def serve(host: str = '127.0.0.1', port: int = 8089, dimensions: int = DEFAULT_DIMENSIONS,
+          latency_ms: int = 0) -> ThreadingHTTPServer:
+    """Create the stub server (call serve_forever() or run it in a thread)"""
+    EmbeddingsHandler.dimensions = dimensions
+    EmbeddingsHandler.latency = latency_ms / 1000.0
+    return ThreadingHTTPServer((host, port), EmbeddingsHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in OpenAI embeddings endpoint")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--dimensions', type=int, default=DEFAULT_DIMENSIONS)
+    parser.add_argument('--latency-ms', type=int, default=0, help="simulated per-request latency")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.dimensions, args.latency_ms)
+    print(f"🧪 Stub embeddings endpoint on http://{args.host}:{args.port}/v1/embeddings")
+    print(f"💡 export OPENAI_BASE_URL=http://{args.host}:{args.port}/v1 OPENAI_API_KEY=stub")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️ Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,11 +6,13 @@ Tests both n8n workflows and database integration
 
 import os
 import json
-import psycopg2
 import requests
 from datetime import datetime
 from typing import Dict, List, Optional
 
+from db import close_pool, get_pool
+from knowledge_search import get_search
+
 # Configuration
 DATABASE_URL = os.getenv('DATABASE_URL')
 N8N_WEBHOOK_BASE = os.getenv('N8N_WEBHOOK_BASE', 'https://your-n8n-instance.com/webhook')
@@ -31,7 +33,7 @@ class POCTester:
             if not DATABASE_URL:
                 raise Exception("DATABASE_URL environment variable not set")
             
-            self.db_conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+            self.db_conn = get_pool().getconn()
             
             # Test basic connection
             cur = self.db_conn.cursor()
@@ -277,19 +279,7 @@ class POCTester:
             ]
             
             for test in test_queries:
-                cur.execute("""
-                    SELECT title, content, doc_type 
-                    FROM knowledge_simple 
-                    WHERE (
-                        to_tsvector('english', content) @@ plainto_tsquery('english', %s)
-                        OR keywords && string_to_array(lower(%s), ' ')
-                        OR title ILIKE %s
-                    )
-                    ORDER BY ts_rank(to_tsvector('english', content), plainto_tsquery('english', %s)) DESC
-                    LIMIT 5
-                """, (test['query'], test['query'], f"%{test['query']}%", test['query']))
-                
-                results = cur.fetchall()
+                results = get_search().search(test['query'], 5)
                 
                 self.test_results['chatbot_workflow']['tests'].append({
                     'name': f'Knowledge Search: {test["query"]}',
@@ -298,15 +288,7 @@ class POCTester:
                 })
             
             # Test compliance status query
-            cur.execute("""
-                SELECT pci_requirement, COUNT(*) as total_findings,
-                       COUNT(CASE WHEN severity = 'critical' THEN 1 END) as critical_count,
-                       COUNT(CASE WHEN status = 'open' THEN 1 END) as open_count
-                FROM findings 
-                WHERE created_at >= NOW() - INTERVAL '30 days'
-                GROUP BY pci_requirement
-                ORDER BY total_findings DESC
-            """)
+            get_pool().execute_prepared(cur, 'compliance_status')
             
             status_results = cur.fetchall()
             
@@ -373,6 +355,9 @@ class POCTester:
             
             print("\n🤖 Testing ChatBot Workflow...")
             self.test_chatbot_workflow()
+            
+            self.test_results['database']['pool'] = get_pool().stats()
+            self.test_results['chatbot_workflow']['search_cache'] = get_search().stats()
         
         return self.test_results
     
@@ -425,7 +410,9 @@ class POCTester:
             except Exception as e:
                 print(f"⚠️ Cleanup warning: {e}")
             finally:
-                self.db_conn.close()
+                get_pool().putconn(self.db_conn)
+                self.db_conn = None
+        close_pool()
 
 
 def main():
@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+PCI DSS Compliance - Local Vector Store
+Quantized, memory-mapped embeddings with top-k cosine search for hosts without pgvector
+
+Usage:
+    python3 scripts/vector_store.py stats
+    python3 scripts/vector_store.py cluster --clusters 256
+    python3 scripts/vector_store.py bench --queries 100
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from embeddings import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, EMBEDDING_PROVIDER, LOCAL_EMBEDDING_MODEL
+
+VECTOR_STORE_DIR = os.getenv(
+    'VECTOR_STORE_DIR',
+    str(Path(__file__).parent.parent / '.cache' / 'vectors')
+)
+VECTOR_STORE_DTYPE = os.getenv('VECTOR_STORE_DTYPE', 'int8')  # 'int8' or 'float16'
+VECTOR_STORE_NPROBE = int(os.getenv('VECTOR_STORE_NPROBE', '8'))  # clusters scanned per query
+SCAN_BLOCK_ROWS = 8192  # rows dequantized per matrix multiply
+COMPACT_RATIO = 0.2  # rewrite the matrix once this share of rows is deleted
+KMEANS_ITERATIONS = 10
+
+
+def parse_vector(value) -> np.ndarray:
+    """float32 array from a list or a PostgreSQL vector literal ('[0.1, 0.2, ...]')"""
+    if isinstance(value, str):
+        return np.array(value.strip('[]').split(','), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class LocalVectorStore:
+    """
+    Unit-normalized embeddings in one contiguous memory-mapped matrix.
+
+    Rows are stored as int8 (symmetric per-row scale in `scales.f32`) or
+    float16 in `vectors.<dtype>`; `rows.json` is the row-id sidecar
+    ([knowledge_simple id, source_file] per row, null once deleted) and
+    `alive.bool` the matching live-row mask used to skip deleted rows. Top-k
+    cosine search dequantizes SCAN_BLOCK_ROWS rows at a time and scores a
+    whole batch of queries with one matrix multiply per block. After
+    cluster(), rows are ordered by k-means cluster and queries only scan
+    the `nprobe` nearest clusters plus rows appended since.
+    """
+
+    def __init__(self, path: str = VECTOR_STORE_DIR, dimensions: int = EMBEDDING_DIMENSIONS,
+                 model: str = EMBEDDING_MODEL, dtype: str = VECTOR_STORE_DTYPE):
+        if dtype not in ('int8', 'float16'):
+            raise ValueError(f"Unsupported vector store dtype: {dtype}")
+        safe_model = re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+        self.path = Path(path) / f"{safe_model}-{dimensions}-{dtype}"
+        self.dimensions = dimensions
+        self.dtype = np.dtype(dtype)
+        self.vectors_path = self.path / f"vectors.{dtype}"
+        self.scales_path = self.path / 'scales.f32'
+        self.rows_path = self.path / 'rows.json'
+        self.meta_path = self.path / 'meta.json'
+        self.alive_path = self.path / 'alive.bool'
+
+        self.rows: List[Optional[List[str]]] = []
+        self.alive = np.ones(0, dtype=bool)
+        self.clustered_rows = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.cluster_offsets: Optional[np.ndarray] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._pending: List[Tuple[List[str], np.ndarray]] = []
+        self._deleted = 0
+        self._load()
+
+    # -- persistence ---------------------------------------------------------
+
+    def _meta_stamp(self) -> Optional[int]:
+        return self.meta_path.stat().st_mtime_ns if self.meta_path.exists() else None
+
+    def _load(self):
+        self._loaded_stamp = self._meta_stamp()
+        if self._loaded_stamp is None:
+            return
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(self.rows_path, 'r', encoding='utf-8') as f:
+            self.rows = json.load(f)
+        self.rows = self.rows[:meta['rows']]  # rows beyond the last committed count never reached meta
+        self.clustered_rows = meta.get('clustered_rows', 0)
+        alive = np.fromfile(self.alive_path, dtype=bool) if self.alive_path.exists() else None
+        if alive is None or len(alive) < len(self.rows):
+            alive = np.array([row is not None for row in self.rows], dtype=bool)  # stores saved before alive.bool
+        self.alive = alive[:len(self.rows)].copy()
+        self._deleted = len(self.rows) - int(np.count_nonzero(self.alive))
+        if meta.get('clusters'):
+            self.centroids = np.load(self.path / 'centroids.npy')
+            self.cluster_offsets = np.load(self.path / 'cluster_offsets.npy')
+        self._map()
+
+    def reload(self) -> bool:
+        """Re-open the store if another process saved it since it was loaded"""
+        if self._pending or self._meta_stamp() == self._loaded_stamp:
+            return False
+        self.rows, self.clustered_rows, self._deleted = [], 0, 0
+        self.alive = np.ones(0, dtype=bool)
+        self.centroids, self.cluster_offsets = None, None
+        self._load()
+        return True
+
+    def _map(self):
+        count = len(self.rows)
+        if not count:
+            self._vectors, self._scales = None, None
+            return
+        self._vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode='r', shape=(count, self.dimensions))
+        if self.dtype == np.int8:
+            self._scales = np.memmap(self.scales_path, dtype=np.float32, mode='r', shape=(count,))
+
+    def _quantize(self, matrix: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == np.float16:
+            return matrix.astype(np.float16), None
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def _write_meta(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_rows = self.rows_path.with_suffix('.json.tmp')
+        with open(tmp_rows, 'w', encoding='utf-8') as f:
+            json.dump(self.rows, f, separators=(',', ':'))
+        os.replace(tmp_rows, self.rows_path)
+        tmp_alive = self.alive_path.with_suffix('.tmp')
+        self.alive.tofile(tmp_alive)
+        os.replace(tmp_alive, self.alive_path)
+        meta = {
+            'dimensions': self.dimensions,
+            'dtype': self.dtype.name,
+            'rows': len(self.rows),
+            'clustered_rows': self.clustered_rows,
+            'clusters': 0 if self.centroids is None else len(self.centroids)
+        }
+        tmp_meta = self.meta_path.with_suffix('.json.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta, self.meta_path)
+        self._loaded_stamp = self._meta_stamp()
+
+    def save(self):
+        """Append pending rows to the matrix files, then commit the sidecar and row count"""
+        if self._pending:
+            self.path.mkdir(parents=True, exist_ok=True)
+            committed = len(self.rows)
+            matrix = _normalize(np.vstack([vectors for _, vectors in self._pending]))
+            quantized, scales = self._quantize(matrix)
+            # Truncate first so a crashed earlier append cannot leave rows out of step with rows.json
+            with open(self.vectors_path, 'ab') as f:
+                f.truncate(committed * self.dimensions * self.dtype.itemsize)
+                f.write(quantized.tobytes())
+            if scales is not None:
+                with open(self.scales_path, 'ab') as f:
+                    f.truncate(committed * 4)
+                    f.write(scales.tobytes())
+            for rows, _ in self._pending:
+                self.rows.extend(rows)
+            self.alive = np.concatenate([self.alive, np.ones(len(self.rows) - committed, dtype=bool)])
+            self._pending = []
+            self._map()
+        if self.rows and self._deleted > COMPACT_RATIO * len(self.rows):
+            self.compact()
+            return
+        self._write_meta()
+        self._map()
+
+    # -- writes --------------------------------------------------------------
+
+    def add(self, ids: Sequence[str], vectors: Iterable, source: Optional[str] = None):
+        """Queue rows (knowledge_simple ids plus vectors or vector literals) until save()"""
+        matrix = np.vstack([parse_vector(vector) for vector in vectors]) if len(ids) else None
+        if matrix is None:
+            return
+        if matrix.shape != (len(ids), self.dimensions):
+            raise ValueError(f"Expected {len(ids)} x {self.dimensions} vectors, got {matrix.shape}")
+        self._pending.append(([[str(row_id), source] for row_id in ids], matrix))
+
+    def remove_sources(self, sources: Iterable[str]) -> int:
+        """Tombstone every row ingested from the given source files"""
+        sources = set(sources)
+        removed = 0
+        for i, row in enumerate(self.rows):
+            if row is not None and row[1] in sources:
+                self.rows[i] = None
+                self.alive[i] = False
+                removed += 1
+        self._pending = [(rows, vectors) for rows, vectors in self._pending
+                         if not rows or rows[0][1] not in sources]
+        self._deleted += removed
+        return removed
+
+    def adopt(self, promoted: Iterable[Tuple[str, str, str]]) -> int:
+        """Queue a copy of each original's vector for the (new id, original id, source) chunks replacing it"""
+        index = {row[0]: i for i, row in enumerate(self.rows) if row is not None}
+        by_source: Dict[str, Tuple[List[str], List[np.ndarray]]] = {}
+        for row_id, original, source in promoted:
+            i = index.get(str(original))
+            if i is not None:
+                ids, vectors = by_source.setdefault(source, ([], []))
+                ids.append(row_id)
+                vectors.append(self._dense(i, i + 1)[0])
+        for source, (ids, vectors) in by_source.items():
+            self.add(ids, vectors, source)
+        return sum(len(ids) for ids, _ in by_source.values())
+
+    def replace_source(self, source: str, ids: Sequence[str], vectors: Iterable):
+        """Swap the rows of one re-ingested file and save"""
+        self.remove_sources([source])
+        self.add(ids, vectors, source)
+        self.save()
+
+    def _dense(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """Dequantized float32 rows [start, end)"""
+        block = np.asarray(self._vectors[start:end], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[start:end, None]
+        return block
+
+    def _rewrite(self, order: np.ndarray, clustered_rows: int):
+        """Rewrite the matrix files with rows in `order`"""
+        matrix = np.vstack([self._dense(start, start + SCAN_BLOCK_ROWS)
+                            for start in range(0, len(self.rows), SCAN_BLOCK_ROWS)])[order]
+        rows = [self.rows[i] for i in order.tolist()]
+        quantized, scales = self._quantize(matrix)
+        self._vectors, self._scales = None, None
+        tmp_vectors = self.vectors_path.with_suffix('.tmp')
+        quantized.tofile(tmp_vectors)
+        os.replace(tmp_vectors, self.vectors_path)
+        if scales is not None:
+            tmp_scales = self.scales_path.with_suffix('.tmp')
+            scales.tofile(tmp_scales)
+            os.replace(tmp_scales, self.scales_path)
+        self.rows = rows
+        self.alive = np.array([row is not None for row in rows], dtype=bool)
+        self.clustered_rows = clustered_rows
+        self._deleted = len(rows) - int(np.count_nonzero(self.alive))
+        self._write_meta()
+        self._map()
+
+    def _live(self) -> np.ndarray:
+        return np.flatnonzero(self.alive)
+
+    def compact(self):
+        """Drop deleted rows (clusters are rebuilt with the same count if there were any)"""
+        n_clusters = len(self.centroids) if self.centroids is not None else 0
+        self.centroids, self.cluster_offsets = None, None
+        self._rewrite(self._live(), 0)
+        if n_clusters and len(self.rows):
+            self.cluster(n_clusters)
+
+    def cluster(self, n_clusters: Optional[int] = None, seed: int = 0) -> int:
+        """
+        Coarse k-means prefilter: reorder rows by cluster so each cluster is one contiguous range.
+
+        Defaults to about sqrt(rows) clusters; returns the cluster count.
+        """
+        if self._pending:
+            self.save()
+        if self._deleted:
+            self.centroids, self.cluster_offsets = None, None
+            self._rewrite(self._live(), 0)
+        count = len(self.rows)
+        if not count:
+            return 0
+        n_clusters = max(1, min(count, n_clusters or int(np.sqrt(count))))
+        matrix = self._dense()
+        rng = np.random.default_rng(seed)
+        centroids = matrix[rng.choice(count, n_clusters, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = self._assign(matrix, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            sizes = np.bincount(assignments, minlength=n_clusters)
+            empty = sizes == 0
+            sums[empty] = matrix[rng.choice(count, int(empty.sum()))]  # reseed empty clusters
+            centroids = _normalize(sums)
+        assignments = self._assign(matrix, centroids)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.zeros(n_clusters + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=n_clusters), out=offsets[1:])
+
+        self.centroids = centroids.astype(np.float32)
+        self.cluster_offsets = offsets
+        np.save(self.path / 'centroids.npy', self.centroids)
+        np.save(self.path / 'cluster_offsets.npy', self.cluster_offsets)
+        self._rewrite(order, count)
+        return n_clusters
+
+    @staticmethod
+    def _assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+            block = matrix[start:start + SCAN_BLOCK_ROWS]
+            assignments[start:start + SCAN_BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    # -- search --------------------------------------------------------------
+
+    def _ranges(self, queries: np.ndarray, nprobe: int) -> List[Tuple[int, int]]:
+        """Row ranges to scan: the nearest clusters of any query plus the unclustered tail"""
+        if self.centroids is None or nprobe >= len(self.centroids):
+            return [(0, len(self.rows))]
+        nearest = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+        ranges = [(int(self.cluster_offsets[c]), int(self.cluster_offsets[c + 1]))
+                  for c in np.unique(nearest).tolist()]
+        if self.clustered_rows < len(self.rows):
+            ranges.append((self.clustered_rows, len(self.rows)))
+        return ranges
+
+    def search(self, queries, k: int = 5, nprobe: int = VECTOR_STORE_NPROBE) -> List[List[Tuple[str, float]]]:
+        """Top-k (knowledge id, cosine similarity) per query vector, best first"""
+        if isinstance(queries, np.ndarray):
+            queries = np.atleast_2d(queries).astype(np.float32)
+        else:
+            queries = np.vstack([parse_vector(query) for query in queries])
+        queries = _normalize(queries)
+        if self._vectors is None:
+            return [[] for _ in range(len(queries))]
+
+        alive = self.alive if self._deleted else None
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for range_start, range_end in self._ranges(queries, nprobe):
+            for start in range(range_start, range_end, SCAN_BLOCK_ROWS):
+                end = min(start + SCAN_BLOCK_ROWS, range_end)
+                scores = queries @ self._dense(start, end).T
+                if alive is not None:
+                    scores[:, ~alive[start:end]] = -np.inf
+                rows = np.broadcast_to(np.arange(start, end), scores.shape)
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                best_rows = np.concatenate([best_rows, rows], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([(self.rows[row][0], float(score))
+                            for row, score in zip(rows[order].tolist(), scores[order].tolist())
+                            if np.isfinite(score)])
+        return results
+
+    def stats(self) -> Dict:
+        size = sum(path.stat().st_size for path in (self.vectors_path, self.scales_path) if path.exists())
+        return {
+            'rows': len(self.rows) - self._deleted,
+            'deleted': self._deleted,
+            'dtype': self.dtype.name,
+            'clusters': 0 if self.centroids is None else len(self.centroids),
+            'unclustered': len(self.rows) - self.clustered_rows,
+            'size_mb': round(size / (1024 * 1024), 2)
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (f"{stats['rows']} vectors ({stats['dtype']}, {stats['size_mb']} MB), "
+                f"{stats['clusters']} clusters, {stats['unclustered']} unclustered")
+
+
+def _percentile(samples: List[float], p: float) -> float:
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(p * len(samples)))], 3) if samples else 0.0
+
+
+def benchmark(store: LocalVectorStore, n_queries: int = 100, k: int = 5, nprobe: int = VECTOR_STORE_NPROBE) -> Dict:
+    """Per-query latency and recall@k of the cluster-prefiltered search against a full scan"""
+    if not store.rows:
+        return {}
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(store.rows), min(n_queries, len(store.rows)), replace=False)
+    queries = store._dense()[sample] + rng.normal(0, 0.01, (len(sample), store.dimensions)).astype(np.float32)
+    latencies, recalls = [], []
+    exact = store.search(queries, k, nprobe=1 << 30)
+    for query, truth in zip(queries, exact):
+        started = time.perf_counter()
+        found = store.search(query[None, :], k, nprobe)[0]
+        latencies.append((time.perf_counter() - started) * 1000)
+        truth_ids = {row_id for row_id, _ in truth}
+        recalls.append(len(truth_ids & {row_id for row_id, _ in found}) / max(1, len(truth_ids)))
+    return {
+        'queries': len(sample),
+        'ms_p50': _percentile(latencies, 0.50),
+        'ms_p95': _percentile(latencies, 0.95),
+        'recall_at_k': round(float(np.mean(recalls)), 4)
+    }
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Local quantized vector store")
+    parser.add_argument('command', choices=('stats', 'cluster', 'bench'))
+    parser.add_argument('--clusters', type=int, help="k-means clusters (default sqrt(rows))")
+    parser.add_argument('--queries', type=int, default=100, help="bench queries")
+    parser.add_argument('--nprobe', type=int, default=VECTOR_STORE_NPROBE)
+    args = parser.parse_args()
+
+    store = LocalVectorStore(model=LOCAL_EMBEDDING_MODEL if EMBEDDING_PROVIDER == 'local' else EMBEDDING_MODEL)
+    if args.command == 'cluster':
+        started = time.perf_counter()
+        clusters = store.cluster(args.clusters)
+        print(f"🧭 Built {clusters} clusters in {time.perf_counter() - started:.2f}s")
+    if args.command == 'bench':
+        results = benchmark(store, args.queries, nprobe=args.nprobe)
+        if results:
+            print(f"⏱️  p50 {results['ms_p50']}ms / p95 {results['ms_p95']}ms, "
+                  f"recall@5 {results['recall_at_k']:.1%} over {results['queries']} queries")
+    print(f"📦 Vector store: {store.summary()}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,6 @@
+"""Make the flat scripts/ modules importable the way the scripts import each other"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'scripts'))
@@ -0,0 +1,83 @@
+import re
+
+import pytest
+
+from bulk_load import BulkWriter, _RowStream, batched, format_row, format_value
+
+COPY_ESCAPES = {'\\\\': '\\', '\\t': '\t', '\\n': '\n', '\\r': '\r'}
+
+
+def parse_field(field):
+    """What PostgreSQL reads back from one COPY text field"""
+    if field == '\\N':
+        return None
+    return re.sub(r'\\[\\tnr]', lambda match: COPY_ESCAPES[match.group()], field)
+
+
+class RecordingCursor:
+    def __init__(self):
+        self.copies = []
+
+    def copy_expert(self, sql, stream):
+        self.copies.append((sql, stream.read()))
+
+
+@pytest.mark.parametrize('text', ['plain', 'tab\there', 'line\nbreak\r\n', 'back\\slash \\N', ''])
+def test_text_round_trips_through_copy_escaping(text):
+    assert parse_field(format_value(text)) == text
+
+
+def test_nul_bytes_are_dropped():
+    assert format_value('a\x00b') == 'ab'
+
+
+def test_special_values():
+    assert format_value(None) == '\\N'
+    assert format_value(True) == 't' and format_value(False) == 'f'
+    assert format_value(42) == '42'
+    assert parse_field(format_value({'a': 'x\ny'})) == '{"a": "x\\ny"}'
+
+
+def test_arrays_quote_every_element():
+    assert parse_field(format_value(['sql', 'say "hi"', 'a\\b', None])) == '{"sql","say \\"hi\\"","a\\\\b",NULL}'
+
+
+def test_row_is_one_tab_separated_line():
+    assert format_row(['a\tb', None, 3]) == 'a\\tb\t\\N\t3\n'
+
+
+def test_row_stream_reads_in_pieces_and_counts_rows():
+    rows = [[f"row {i}", i] for i in range(50)]
+    stream = _RowStream(rows)
+    pieces = []
+    while True:
+        piece = stream.read(37)
+        if not piece:
+            break
+        assert len(piece) <= 37
+        pieces.append(piece)
+    assert ''.join(pieces) == ''.join(format_row(row) for row in rows)
+    assert stream.rows == 50
+
+
+def test_batched_keeps_the_remainder():
+    assert list(batched(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_writer_flushes_every_batch_and_on_demand():
+    cur = RecordingCursor()
+    writer = BulkWriter(cur, batch_size=2)
+    for i in range(3):
+        writer.add('knowledge_simple', ('id', 'title'), (str(i), f"t{i}"))
+    assert len(cur.copies) == 1
+    writer.flush()
+    assert [data.count('\n') for _, data in cur.copies] == [2, 1]
+    assert cur.copies[0][0] == 'COPY knowledge_simple (id, title) FROM STDIN WITH (FORMAT text)'
+    assert writer.stats.rows == {'knowledge_simple': 3}
+
+
+def test_writer_rejects_a_changed_column_list():
+    writer = BulkWriter(RecordingCursor())
+    writer.add('t', ('a',), (1,))
+    with pytest.raises(ValueError):
+        writer.add('t', ('a', 'b'), (1, 2))
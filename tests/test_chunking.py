@@ -0,0 +1,20 @@
+import pytest
+
+from ingest_knowledge_base import chunk_text, iter_chunks
+
+
+def list_chunks(words, chunk_size, overlap):
+    """The list-based splitter iter_chunks() replaced"""
+    return [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size - overlap)]
+
+
+@pytest.mark.parametrize('count', [0, 1, 9, 10, 11, 17, 18, 19, 100])
+def test_sliding_window_matches_the_list_splitter(count):
+    words = [f"w{i}" for i in range(count)]
+    assert list(iter_chunks(iter(words), chunk_size=10, overlap=2)) == list_chunks(words, 10, 2)
+
+
+def test_chunks_overlap_by_the_configured_words():
+    chunks = chunk_text(' '.join(str(i) for i in range(1500)))
+    assert len(chunks) == 2
+    assert chunks[0].split()[-100:] == chunks[1].split()[:100]
@@ -0,0 +1,57 @@
+from dedup import SKIPPED_COLUMNS, ChunkDeduplicator, DedupBatch, band_hashes, jaccard, minhash, shingles
+
+TEXT = ("Requirement 6.5.1 requires that applications are protected against injection flaws, "
+        "particularly SQL injection, by validating input and using parameterized queries everywhere")
+
+
+class FakeCursor:
+    """No stored chunks: every candidate comes from the batch itself"""
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return []
+
+
+class FakeWriter:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, table, columns, row):
+        self.rows.append((table, columns, row))
+
+
+def test_jaccard_of_identical_and_unrelated_text():
+    assert jaccard(shingles(TEXT), shingles(TEXT)) == 1.0
+    assert jaccard(shingles(TEXT), shingles("cardholder data must be encrypted at rest with strong keys")) == 0.0
+    assert jaccard(shingles(''), shingles(TEXT)) == 0.0
+
+
+def test_band_hashes_are_stable_for_equal_text():
+    assert band_hashes(minhash(shingles(TEXT))) == band_hashes(minhash(shingles(TEXT.upper())))
+
+
+def test_link_mode_stores_duplicates_without_embedding():
+    deduper = ChunkDeduplicator(mode='link')
+    deduper.start('policies/a.md')
+    batch = deduper.apply(FakeCursor(), ['id-1', 'id-2', 'id-3'], [TEXT, TEXT + ' too', 'unrelated text'],
+                          FakeWriter())
+    assert batch.duplicate_of == [None, 'id-1', None]
+    assert batch.stored == [0, 1, 2] and batch.canonical == [0, 2] and batch.skipped == 0
+    assert batch.row(1, ('id-2',)) == ('id-2', 'id-1', batch.bands[1])
+
+
+def test_skip_mode_drops_duplicates_and_records_each_reference_once():
+    deduper = ChunkDeduplicator(mode='skip')
+    deduper.start('policies/a.md')
+    writer = FakeWriter()
+    batch = deduper.apply(FakeCursor(), ['id-1', 'id-2', 'id-3'], [TEXT, TEXT, TEXT], writer)
+    assert batch.stored == [0] and batch.skipped == 2
+    assert writer.rows == [('knowledge_skipped_duplicates', SKIPPED_COLUMNS, ('policies/a.md', 'id-1'))]
+
+
+def test_unchecked_batch_keeps_rows_unchanged():
+    batch = DedupBatch.unchecked(2)
+    assert batch.stored == batch.canonical == [0, 1]
+    assert batch.row(0, ('id',)) == ('id',)
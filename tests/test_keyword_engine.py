@@ -0,0 +1,68 @@
+from keyword_engine import KeywordEngine, chunk_terms, sync_statistics
+
+CHUNKS = ["SQL injection is prevented with parameterized queries",
+          "Cross site scripting is prevented by output encoding",
+          "Parameterized queries keep SQL injection out of the database"]
+
+
+class FakeConnection:
+    """COUNT(*) plus the content rows read through the named rebuild cursor"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def cursor(self, name=None):
+        return FakeCursor(self.chunks, name)
+
+
+class FakeCursor:
+    def __init__(self, chunks, name):
+        self.chunks, self.name, self.done = chunks, name, False
+        self.itersize = 0
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchone(self):
+        return (len(self.chunks),)
+
+    def fetchmany(self, size):
+        if self.done:
+            return []
+        self.done = True
+        return [(chunk,) for chunk in self.chunks]
+
+    def close(self):
+        pass
+
+
+def test_chunk_terms_keep_adjacent_bigrams_only():
+    terms = chunk_terms("SQL injection, the attack")
+    assert 'sql injection' in terms and 'injection attack' not in terms
+
+
+def test_rollback_undoes_updates_and_removals():
+    engine = KeywordEngine(path=None)
+    engine.update(CHUNKS[:2])
+    before = (engine.n_docs, engine.df[:len(engine.terms)].copy())
+    engine.begin()
+    engine.update(CHUNKS[2:])
+    engine.remove(CHUNKS[:1])
+    engine.rollback()
+    assert engine.n_docs == before[0]
+    assert (engine.df[:len(before[1])] == before[1]).all()
+
+
+def test_distinctive_terms_rank_first():
+    engine = KeywordEngine(path=None)
+    top = engine.extract(CHUNKS)
+    assert top[1][0] in {'cross', 'site', 'scripting', 'output', 'encoding', 'cross site', 'site scripting',
+                         'output encoding'}
+
+
+def test_sync_recounts_only_when_the_database_differs():
+    engine = KeywordEngine(path=None)
+    engine.update(CHUNKS[:1])
+    assert sync_statistics(FakeConnection(CHUNKS), engine) == (1, 3)
+    assert engine.n_docs == 3
+    assert sync_statistics(FakeConnection(CHUNKS), engine) is None
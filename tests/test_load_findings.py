@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from load_findings import STAGING_COLUMNS, _merge_sql, load_findings, normalize
+
+SNYK_ISSUE = {
+    'id': 'SNYK-1',
+    'attributes': {
+        'title': 'SQL Injection',
+        'effective_severity_level': 'high',
+        'classes': [{'id': 'CWE-89'}],
+        'problems': [{'source': {'file_path': 'app/db.js', 'start_line': 12}}],
+        'project_name': 'shop-api'
+    }
+}
+ANALYZED = {
+    'finding_id': 'SNYK-1',
+    'severity': 'high',
+    'title': 'SQL Injection',
+    'description': 'User input reaches a raw query',
+    'fix_suggestion': 'Use parameterized queries',
+    'cwe_id': 'CWE-89',
+    'pci_requirement': '6.5.4',
+    'risk_score': 8,
+    'evidence': {'repo': 'shop-api', 'file': 'app/db.js', 'line': 12}
+}
+
+
+def as_dict(row):
+    return dict(zip(STAGING_COLUMNS, row))
+
+
+def test_snyk_issue_gets_cwe_fallback_and_source_flag():
+    row = as_dict(next(normalize({'data': [SNYK_ISSUE]})))
+    assert row['pci_requirement'] == '6.5.1'
+    assert row['from_snyk'] is True
+    assert (row['repo_name'], row['affected_file'], row['line_number']) == ('shop-api', 'app/db.js', 12)
+
+
+def test_partial_analyzed_item_leaves_missing_fields_null():
+    row = as_dict(next(normalize([{'json': {'finding_id': 'SNYK-1', 'fix_suggestion': 'Escape output'}}])))
+    assert row['from_snyk'] is False
+    assert row['title'] is None and row['affected_file'] is None and row['pci_requirement'] is None
+    assert row['fix_suggestion'] == 'Escape output'
+
+
+def test_items_without_id_are_skipped():
+    assert list(normalize([{'title': 'no id'}, 'not a dict'])) == []
+
+
+def test_snyk_merge_never_replaces_a_stored_requirement():
+    assert "pci_requirement = COALESCE(findings.pci_requirement, EXCLUDED.pci_requirement)" in _merge_sql(True)
+    assert "pci_requirement = COALESCE(EXCLUDED.pci_requirement, findings.pci_requirement)" in _merge_sql(False)
+    for from_snyk in (False, True):
+        assert "title = COALESCE(EXCLUDED.title, findings.title)" in _merge_sql(from_snyk)
+
+
+@pytest.fixture
+def cur():
+    if not os.getenv('DATABASE_URL'):
+        pytest.skip("needs DATABASE_URL pointing at a database with database/001_schema.sql")
+    from db import close_pool, connection
+    try:
+        with connection() as conn:
+            cur = conn.cursor()
+            yield cur
+            conn.rollback()
+    finally:
+        close_pool()
+
+
+def test_snyk_reload_keeps_the_ai_mapped_requirement(cur):
+    finding_id = f"TEST-LOAD-{os.getpid()}"
+    load_findings(cur, normalize([{**ANALYZED, 'finding_id': finding_id}]))
+    result = load_findings(cur, normalize({'data': [{**SNYK_ISSUE, 'id': finding_id}]}))
+    load_findings(cur, normalize([{'finding_id': finding_id, 'fix_suggestion': 'Use an ORM'}]))
+
+    cur.execute("SELECT pci_requirement, title, affected_file, fix_suggestion FROM findings WHERE finding_id = %s",
+                (finding_id,))
+    assert cur.fetchone() == ('6.5.4', 'SQL Injection', 'app/db.js', 'Use an ORM')
+    assert result['updated'] == 1 and result['inserted'] == 0
@@ -0,0 +1,67 @@
+from markdown_chunker import _Block, chunk_markdown, count_tokens, iter_blocks, split_block
+
+DOC = """# PCI DSS Requirement 6
+
+## 6.2 Bespoke Software
+
+### 6.2.4 Injection
+
+Use parameterized queries. Validate all input.
+
+```python
+# not a heading
+cursor.execute("SELECT 1")
+```
+
+- item one
+- item two
+
+## 6.4 Public Web Applications
+
+Protect public-facing web applications against attacks.
+"""
+
+
+def test_blocks_keep_fences_whole_and_track_the_section_path():
+    blocks = list(iter_blocks(DOC.splitlines(keepends=True)))
+    kinds = [block.kind for block in blocks]
+    assert kinds == ['heading', 'heading', 'heading', 'text', 'code', 'list', 'heading', 'text']
+    code = blocks[4]
+    assert code.text.startswith('```python') and code.text.endswith('```')
+    assert '# not a heading' in code.text
+    assert code.path == ('6.2 Bespoke Software', '6.2.4 Injection')
+    assert blocks[-1].path == ('6.4 Public Web Applications',)
+
+
+def test_unclosed_fence_runs_to_the_end():
+    blocks = list(iter_blocks(['```\n', '## inside\n']))
+    assert [block.kind for block in blocks] == ['code']
+
+
+def test_long_code_blocks_are_split_and_refenced():
+    body = '\n'.join(f"line_{i} = compute({i}) + another_call({i})" for i in range(60))
+    block = _Block('code', f"```python\n{body}\n```", ())
+    pieces = list(split_block(block, 60))
+    assert len(pieces) > 1
+    for piece in pieces:
+        lines = piece.split('\n')
+        assert lines[0] == '```python' and lines[-1] == '```'
+    assert [line for piece in pieces for line in piece.split('\n')[1:-1]] == body.split('\n')
+
+
+def test_chunks_stay_within_budget_and_repeat_the_heading():
+    section = ' '.join(f"Sentence number {i} about secure coding." for i in range(80))
+    chunks = chunk_markdown(f"# Doc\n\n## Secure Coding\n\n{section}\n", max_tokens=120)
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= 120 for chunk in chunks)
+    assert chunks[0].text.startswith('# Doc\n\n## Secure Coding')
+    assert all(chunk.text.startswith('## Secure Coding') for chunk in chunks[1:])
+    assert {chunk.section_path for chunk in chunks} == {'Secure Coding'}
+
+
+def test_small_sibling_sections_merge_under_their_parent():
+    chunks = chunk_markdown(DOC, max_tokens=400)
+    assert len(chunks) == 2
+    assert chunks[0].section_path == '6.2 Bespoke Software > 6.2.4 Injection'
+    assert chunks[1].section_path == '6.4 Public Web Applications'
+    assert chunks[0].tokens == count_tokens(chunks[0].text)
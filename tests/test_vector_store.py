@@ -0,0 +1,30 @@
+import numpy as np
+
+from vector_store import LocalVectorStore
+
+
+def make_store(tmp_path, rows=400, dimensions=8):
+    store = LocalVectorStore(path=str(tmp_path), dimensions=dimensions, model='test')
+    rng = np.random.default_rng(0)
+    for source in range(4):
+        ids = [f"{source}-{i}" for i in range(rows // 4)]
+        store.add(ids, rng.normal(size=(len(ids), dimensions)), source=f"doc-{source}.md")
+    store.save()
+    return store
+
+
+def test_compaction_keeps_the_requested_cluster_count(tmp_path):
+    store = make_store(tmp_path)
+    assert store.cluster(5) == 5
+    store.remove_sources(['doc-0.md'])
+    store.save()  # 25% tombstones > COMPACT_RATIO
+    assert len(store.rows) == 300 and store.alive.all()
+    assert len(store.centroids) == 5
+
+
+def test_search_skips_removed_rows(tmp_path):
+    store = make_store(tmp_path)
+    query = store._dense(0, 1)[0]
+    assert store.search(query[None, :], k=1)[0][0][0] == '0-0'
+    store.remove_sources(['doc-0.md'])
+    assert all(not row_id.startswith('0-') for row_id, _ in store.search(query[None, :], k=10)[0])